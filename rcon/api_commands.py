@@ -11,6 +11,7 @@ from rcon.cache_utils import RedisCached, get_redis_pool
 from rcon.commands import HLLCommandFailedError
 from rcon.discord import audit_user_config_differences
 from rcon.gtx import GTXFtp
+from rcon.logs.record import log_to_dict
 from rcon.message_templates import (
     add_message_template,
     delete_message_template,
@@ -652,7 +653,7 @@ class RconAPI(Rcon):
         exact_player_match: bool = True,
         exact_action: bool = False,
     ) -> ParsedLogsType:
-        return game_logs.get_recent_logs(
+        logs = game_logs.get_recent_logs(
             start=start,
             end=end,
             player_search=filter_player,
@@ -661,6 +662,8 @@ class RconAPI(Rcon):
             exact_action=exact_action,
             inclusive_filter=inclusive_filter,
         )
+        logs["logs"] = [log_to_dict(log) for log in logs["logs"]]
+        return logs
 
     def get_votemap_status(self):
         v = VoteMap()
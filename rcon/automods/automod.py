@@ -18,7 +18,8 @@ from rcon.discord import send_to_discord_audit
 from rcon.hooks import inject_player_ids
 from rcon.logs.loop import on_kill, on_connected
 from rcon.rcon import Rcon, get_rcon
-from rcon.types import GetDetailedPlayer, StructuredLogLineType
+from rcon.snapshot import get_snapshot
+from rcon.types import GetDetailedPlayer, ServerSnapshotType, StructuredLogLineType
 from rcon.user_config.auto_mod_level import AutoModLevelUserConfig
 from rcon.user_config.auto_mod_no_leader import AutoModNoLeaderUserConfig
 from rcon.user_config.auto_mod_seeding import AutoModSeedingUserConfig
@@ -26,12 +27,20 @@ from rcon.user_config.auto_mod_solo_tank import AutoModNoSoloTankUserConfig
 
 logger = logging.getLogger(__name__)
 first_run_done_key = "first_run_done"
+# Fall back to querying the server when the snapshot producer is lagging or disabled
+SNAPSHOT_MAX_AGE_SEC = 10
 
 
-def get_punitions_to_apply(rcon, moderators) -> PunitionsToApply:
+def get_punitions_to_apply(
+    rcon, moderators, snapshot: ServerSnapshotType | None = None
+) -> PunitionsToApply:
     logger.debug("Getting team info")
-    team_view = rcon.get_team_view()
-    gamestate = rcon.get_gamestate()
+    if snapshot is not None:
+        team_view = snapshot["team_view"]
+        gamestate = snapshot["gamestate"]
+    else:
+        team_view = rcon.get_team_view()
+        gamestate = rcon.get_gamestate()
     punitions_to_apply = PunitionsToApply()
 
     for team in ["allies", "axis"]:
@@ -185,7 +194,9 @@ def punish_squads(rcon: Rcon, r: Redis):
         logger.debug("No automod is enabled")
         return
 
-    punitions_to_apply = get_punitions_to_apply(rcon, mods)
+    punitions_to_apply = get_punitions_to_apply(
+        rcon, mods, get_snapshot(max_age=SNAPSHOT_MAX_AGE_SEC)
+    )
 
     do_punitions(rcon, punitions_to_apply)
     set_first_run_done(r)
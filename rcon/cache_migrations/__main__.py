@@ -3,6 +3,8 @@
 import logging
 import os
 
+from rcon.cache_migrations.log_dedupe import migrate_all_log_dedupes
+from rcon.cache_migrations.logs_history import migrate_all_logs_histories
 from rcon.cache_migrations.maps_history import migrate_all_maps_histories
 from rcon.cache_migrations.votemap import migrate_all_votemap_states
 
@@ -15,6 +17,8 @@ def main() -> None:
 
     migrate_all_maps_histories(redis_url)
     migrate_all_votemap_states(redis_url)
+    migrate_all_log_dedupes(redis_url)
+    migrate_all_logs_histories(redis_url)
 
 
 if __name__ == "__main__":
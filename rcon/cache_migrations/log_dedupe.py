@@ -0,0 +1,97 @@
+"""Move the legacy `unique_logs` set into the per-minute dedupe buckets."""
+
+import logging
+import os
+import time
+
+import redis
+
+from rcon.cache_migrations.redis_databases import (
+    populated_database_numbers,
+    redis_client_for_database,
+)
+from rcon.logs.dedupe import DEDUPE_KEY_PREFIX, DEFAULT_RETENTION_SEC, LogDedupeIndex
+
+logger = logging.getLogger(__name__)
+
+
+LEGACY_DEDUPE_KEY = "unique_logs"
+LOG_DEDUPE_MIGRATION_LOCK_KEY = "unique_logs:migration-lock"
+MIGRATION_BATCH_SIZE = 5000
+
+
+def migrate_log_dedupe(client: redis.Redis) -> int:
+    """Copy the still relevant ids of the legacy set into buckets, then drop it."""
+    if client.type(LEGACY_DEDUPE_KEY) != b"set":
+        return 0
+
+    with client.lock(LOG_DEDUPE_MIGRATION_LOCK_KEY, timeout=60, blocking_timeout=60):
+        if client.type(LEGACY_DEDUPE_KEY) != b"set":
+            return 0
+
+        index = LogDedupeIndex(client, prefix=DEDUPE_KEY_PREFIX)
+        oldest_ms = (time.time() - DEFAULT_RETENTION_SEC) * 1000
+        batch: list[tuple[int, str]] = []
+        migrated = 0
+        for member in client.sscan_iter(LEGACY_DEDUPE_KEY, count=MIGRATION_BATCH_SIZE):
+            if isinstance(member, bytes):
+                member = member.decode()
+            try:
+                timestamp_ms = int(member.split("|", 1)[0])
+            except ValueError:
+                logger.warning(
+                    "Dropping invalid %s member %s", LEGACY_DEDUPE_KEY, member
+                )
+                continue
+            if timestamp_ms < oldest_ms:
+                continue
+
+            batch.append((timestamp_ms, member))
+            if len(batch) >= MIGRATION_BATCH_SIZE:
+                index.add_ids(batch)
+                migrated += len(batch)
+                batch = []
+        if batch:
+            index.add_ids(batch)
+            migrated += len(batch)
+
+        client.delete(LEGACY_DEDUPE_KEY)
+
+    logger.info("Migrated %d log ids from %s", migrated, LEGACY_DEDUPE_KEY)
+    return migrated
+
+
+def migrate_all_log_dedupes(redis_url: str) -> tuple[int, int]:
+    """Migrate the log duplicate guard in every populated logical Redis database."""
+    discovery_client = redis.Redis.from_url(redis_url)
+    database_count = 0
+    id_count = 0
+    try:
+        for database in populated_database_numbers(discovery_client):
+            client = redis_client_for_database(discovery_client, database)
+            try:
+                database_count += 1
+                id_count += migrate_log_dedupe(client)
+            finally:
+                client.close()
+    finally:
+        discovery_client.close()
+
+    logger.info(
+        "unique_logs migration checked %d Redis database(s) and migrated %d id(s)",
+        database_count,
+        id_count,
+    )
+    return database_count, id_count
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    redis_url = os.environ.get("HLL_REDIS_URL")
+    if not redis_url:
+        raise RuntimeError("HLL_REDIS_URL is required to migrate unique_logs")
+    migrate_all_log_dedupes(redis_url)
+
+
+if __name__ == "__main__":
+    main()
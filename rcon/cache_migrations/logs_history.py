@@ -0,0 +1,131 @@
+"""Move the `logs_history` list into a redis stream.
+
+The log at index `i` of the list had the sequence number `seq - i`, it is added
+to the stream under the ID `<timestamp_ms>-<seq>` with its serialized value
+untouched. The log recorder cursor (a sequence number) becomes the position of
+its consumer group, the secondary index is dropped so the log loop rebuilds it
+with stream IDs and the `log_stream` copy of the logs is dropped.
+"""
+
+import logging
+import os
+
+import orjson
+import redis
+
+from rcon.cache_migrations.redis_databases import (
+    populated_database_numbers,
+    redis_client_for_database,
+)
+
+logger = logging.getLogger(__name__)
+
+
+LOGS_HISTORY_KEY = "logs_history"
+LOGS_HISTORY_SEQ_KEY = f"{LOGS_HISTORY_KEY}:seq"
+LOGS_HISTORY_INDEX_PREFIX = f"{LOGS_HISTORY_KEY}:idx"
+LOGS_HISTORY_MIGRATION_LOCK_KEY = f"{LOGS_HISTORY_KEY}:migration-lock"
+# Same as rcon.logs.recorder.RECORDER_GROUP
+RECORDER_GROUP = "log_recorder"
+LEGACY_RECORDER_CURSOR_KEY = "log_recorder:cursor"
+LEGACY_LOG_STREAM_KEY = "log_stream"
+MIGRATION_BATCH_SIZE = 5000
+
+
+def _timestamp_ms(raw: bytes) -> int:
+    try:
+        log = orjson.loads(raw)
+        # LogRecord arrays start with the version then the timestamp
+        return int(log[1] if isinstance(log, list) else log["timestamp_ms"])
+    except (orjson.JSONDecodeError, KeyError, IndexError, TypeError, ValueError):
+        return 0
+
+
+def migrate_logs_history(client: redis.Redis) -> int:
+    """Copy the logs of the list into a stream that replaces it"""
+    if client.type(LOGS_HISTORY_KEY) != b"list":
+        return 0
+
+    with client.lock(
+        LOGS_HISTORY_MIGRATION_LOCK_KEY, timeout=300, blocking_timeout=300
+    ):
+        if client.type(LOGS_HISTORY_KEY) != b"list":
+            return 0
+
+        raw_logs = client.lrange(LOGS_HISTORY_KEY, 0, -1)
+        # Logs cached before the sequence number existed are numbered after it
+        seq = max(int(client.get(LOGS_HISTORY_SEQ_KEY) or 0), len(raw_logs))
+        first_seq = seq - len(raw_logs) + 1
+        tmp_key = f"{LOGS_HISTORY_KEY}:migrating"
+        client.delete(tmp_key)
+
+        last_ms = 0
+        ids: dict[int, str] = {}
+        pipe = client.pipeline(transaction=False)
+        for log_seq, raw in enumerate(reversed(raw_logs), first_seq):
+            last_ms = max(last_ms, _timestamp_ms(raw))
+            ids[log_seq] = f"{last_ms}-{log_seq}"
+            pipe.xadd(tmp_key, {"log": raw}, id=ids[log_seq])
+            if len(pipe) >= MIGRATION_BATCH_SIZE:
+                pipe.execute()
+        pipe.execute()
+
+        pipe = client.pipeline()
+        if raw_logs:
+            pipe.rename(tmp_key, LOGS_HISTORY_KEY)
+        else:
+            pipe.delete(LOGS_HISTORY_KEY)
+        pipe.set(LOGS_HISTORY_SEQ_KEY, seq)
+        pipe.execute()
+
+        cursor = client.get(LEGACY_RECORDER_CURSOR_KEY)
+        if cursor is not None and int(cursor) in ids:
+            client.xgroup_create(LOGS_HISTORY_KEY, RECORDER_GROUP, id=ids[int(cursor)])
+        # Otherwise the recorder looks for the last log it stored on its own
+        client.delete(LEGACY_RECORDER_CURSOR_KEY, LEGACY_LOG_STREAM_KEY)
+        index_keys = list(
+            client.scan_iter(f"{LOGS_HISTORY_INDEX_PREFIX}:*", count=1000)
+        )
+        if index_keys:
+            client.delete(*index_keys)
+
+    logger.info(
+        "Moved %d logs from the %s list to a stream", len(raw_logs), LOGS_HISTORY_KEY
+    )
+    return len(raw_logs)
+
+
+def migrate_all_logs_histories(redis_url: str) -> tuple[int, int]:
+    """Migrate the logs history in every populated logical Redis database."""
+    discovery_client = redis.Redis.from_url(redis_url)
+    database_count = 0
+    log_count = 0
+    try:
+        for database in populated_database_numbers(discovery_client):
+            client = redis_client_for_database(discovery_client, database)
+            try:
+                database_count += 1
+                log_count += migrate_logs_history(client)
+            finally:
+                client.close()
+    finally:
+        discovery_client.close()
+
+    logger.info(
+        "logs_history migration checked %d Redis database(s) and moved %d log(s)",
+        database_count,
+        log_count,
+    )
+    return database_count, log_count
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    redis_url = os.environ.get("HLL_REDIS_URL")
+    if not redis_url:
+        raise RuntimeError("HLL_REDIS_URL is required to migrate logs_history")
+    migrate_all_logs_histories(redis_url)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,22 @@
 import functools
+import hashlib
 import logging
 import os
 import pickle
+import threading
 import time
 import uuid
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from typing import Callable
 
+import orjson
 import redis
 import redis.exceptions
 import simplejson
+from cachetools import LRUCache
 from cachetools.func import ttl_cache as cachetools_ttl_cache
 
 logger = logging.getLogger(__name__)
@@ -18,9 +25,182 @@ _REDIS_POOL = None
 # We use the redis database with db number 0 as a shared database amongst all the containers
 _GLOBAL_REDIS_POOL = None
 
+INVALIDATION_CHANNEL = "cache_invalidations"
+LISTEN_POLL_SECONDS = 1
+
+
+def _key_token(key: str | bytes) -> str:
+    return "b" + key.hex() if isinstance(key, bytes) else "s" + key
+
+
+class LocalCacheInvalidator:
+    """Drops local (L1) cache entries when any process clears the shared cache
+
+    Every RedisCached with a local cache registers here. Clearing a value
+    publishes its key prefix and key separated by a newline (only the prefix
+    to clear them all), a daemon thread per process applies the messages.
+    """
+
+    def __init__(self) -> None:
+        self.mu = threading.Lock()
+        self.caches: dict[str, list["RedisCached"]] = {}
+        self.thread: threading.Thread | None = None
+        self.pid: int | None = None
+
+    def register(self, cached: "RedisCached") -> None:
+        with self.mu:
+            self.caches.setdefault(cached.key_prefix, []).append(cached)
+
+    def publish(self, red: redis.StrictRedis, key_prefix: str, key=None) -> None:
+        message = key_prefix + "\n" + ("" if key is None else _key_token(key))
+        try:
+            red.publish(INVALIDATION_CHANNEL, message)
+        except redis.exceptions.RedisError:
+            logger.exception("Unable to broadcast cache invalidation")
+
+    def ensure_listening(self, red: redis.StrictRedis) -> None:
+        # The thread does not survive a fork, e.g. of gunicorn workers
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        with self.mu:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(
+                target=self.listen, args=(red,), name="cache-invalidations", daemon=True
+            )
+            self.thread.start()
+
+    def listen(self, red: redis.StrictRedis) -> None:
+        reconnecting = False
+        while True:
+            try:
+                pubsub = red.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                if reconnecting:
+                    # Invalidations may have been missed while not subscribed
+                    self.apply(None)
+                reconnecting = True
+                while True:
+                    # Wait less than the socket timeout of the shared pool so a
+                    # quiet channel is not mistaken for a dropped connection
+                    message = pubsub.get_message(timeout=LISTEN_POLL_SECONDS)
+                    if message is None:
+                        continue
+                    data = message["data"]
+                    self.apply(data.decode() if isinstance(data, bytes) else data)
+            except Exception:
+                logger.exception("Cache invalidation listener failed, resubscribing")
+                time.sleep(1)
+
+    def apply(self, message: str | None) -> None:
+        """Apply an invalidation message, None drops every local cache"""
+        if message is None:
+            with self.mu:
+                caches = [c for cs in self.caches.values() for c in cs]
+            for cached in caches:
+                cached.local_cache.clear()
+            return
+
+        key_prefix, _, token = message.partition("\n")
+        with self.mu:
+            caches = list(self.caches.get(key_prefix, ()))
+        for cached in caches:
+            if token:
+                cached.local_cache.pop(token, None)
+            else:
+                cached.local_cache.clear()
+
+
+LOCAL_CACHE_INVALIDATOR = LocalCacheInvalidator()
+
+# Arguments of these types have a stable repr() that is cheap to build a key from
+_KEY_PRIMITIVES = frozenset((str, int, float, bool, type(None)))
+MAX_PLAIN_KEY_PARAMS = 64
+
+
+class ValueCodec:
+    """Serializes cached values
+
+    Values are pickled, with `json` they are encoded with orjson instead as
+    long as they only hold JSON types (tuples come back as lists, so only use
+    it for functions returning lists and dicts). Payloads larger than
+    `compress_above` bytes are zlib compressed.
+    The first byte tags the format, values pickled before tags existed start
+    with the pickle protocol marker and are still read.
+    """
+
+    PICKLE = b"p"
+    JSON = b"j"
+    PICKLE_ZLIB = b"P"
+    JSON_ZLIB = b"J"
+    _ORJSON_OPTIONS = (
+        orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+        | orjson.OPT_PASSTHROUGH_SUBCLASS
+    )
+
+    def __init__(
+        self,
+        json: bool = False,
+        compress_above: int | None = None,
+        compress_level: int = 1,
+    ) -> None:
+        self.json = json
+        self.compress_above = compress_above
+        self.compress_level = compress_level
+
+    def dumps(self, value) -> bytes:
+        payload = None
+        if self.json:
+            try:
+                payload = orjson.dumps(value, option=self._ORJSON_OPTIONS)
+                tag = self.JSON
+            except TypeError:
+                pass
+        if payload is None:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            tag = self.PICKLE
+
+        if self.compress_above is not None and len(payload) > self.compress_above:
+            payload = zlib.compress(payload, self.compress_level)
+            tag = self.PICKLE_ZLIB if tag == self.PICKLE else self.JSON_ZLIB
+        return tag + payload
+
+    def loads(self, data: bytes):
+        tag = data[:1]
+        if tag == b"\x80":
+            return pickle.loads(data)
+
+        payload = memoryview(data)[1:]
+        if tag in (self.PICKLE_ZLIB, self.JSON_ZLIB):
+            payload = zlib.decompress(payload)
+        if tag in (self.JSON, self.JSON_ZLIB):
+            return orjson.loads(payload)
+        if tag in (self.PICKLE, self.PICKLE_ZLIB):
+            return pickle.loads(payload)
+        raise ValueError(f"Unknown cached value format {tag!r}")
+
+
+PICKLE_CODEC = ValueCodec()
+JSON_CODEC = ValueCodec(json=True)
+
+_REFRESH_EXECUTOR: ThreadPoolExecutor | None = None
+_REFRESH_EXECUTOR_PID: int | None = None
+
+
+def get_refresh_executor() -> ThreadPoolExecutor:
+    """Threads running background cache refreshes, recreated after a fork"""
+    global _REFRESH_EXECUTOR, _REFRESH_EXECUTOR_PID
+    if _REFRESH_EXECUTOR is None or _REFRESH_EXECUTOR_PID != os.getpid():
+        _REFRESH_EXECUTOR = ThreadPoolExecutor(4, thread_name_prefix="cache-refresh")
+        _REFRESH_EXECUTOR_PID = os.getpid()
+    return _REFRESH_EXECUTOR
+
 
 class RedisCached:
     PREFIX = "cached_"
+    HOT_KEY_HITS = 3
 
     def __init__(
         self,
@@ -33,7 +213,26 @@ class RedisCached:
         cache_falsy=True,
         serializer=simplejson.dumps,
         deserializer=simplejson.loads,
+        local_ttl_seconds: float | None = None,
+        local_maxsize: int = 256,
+        stale_ttl_seconds: int | None = None,
+        refresh_ahead: float | None = None,
+        key_func: Callable[..., str | bytes] | None = None,
     ):
+        """`local_ttl_seconds` enables an in-process cache in front of Redis
+
+        It holds serialized values for at most that long (and never longer
+        than `ttl_seconds`), clearing the cache in any process also clears it
+        in every other process.
+
+        With `stale_ttl_seconds` values are kept that much longer in Redis and
+        an expired value is still returned while a single background refresh
+        runs. `refresh_ahead` additionally refreshes keys read at least
+        `HOT_KEY_HITS` times once this fraction of `ttl_seconds` is left.
+
+        `key_func` builds the part of the key identifying the arguments
+        (without `self` for methods) instead of the default.
+        """
         # TODO: isinstance check ttl_seconds it must be an int
         # not a float or anything else
         if pool is None:
@@ -50,6 +249,21 @@ class RedisCached:
         self.ttl_seconds = ttl_seconds
         self.is_method = is_method
         self.cache_falsy = cache_falsy
+        self.key_func = key_func
+        self.stats: Counter[str] = Counter()
+        self.stale_ttl_seconds = stale_ttl_seconds
+        self.refresh_ahead = refresh_ahead
+        # Key token -> reads since the last refresh
+        self.access_counts: LRUCache[str, int] = LRUCache(maxsize=1024)
+        self.local_ttl_seconds = (
+            min(local_ttl_seconds, ttl_seconds) if local_ttl_seconds else None
+        )
+        # Key token -> (expires at, serialized value)
+        self.local_cache: LRUCache[str, tuple[float, bytes | str]] = LRUCache(
+            maxsize=local_maxsize
+        )
+        if self.local_ttl_seconds:
+            LOCAL_CACHE_INVALIDATOR.register(self)
 
     @staticmethod
     def clear_all_caches(pool) -> bool:
@@ -67,10 +281,38 @@ class RedisCached:
     def key(self, *args, **kwargs):
         if self.is_method:
             args = args[1:]
-        params = self.serializer({"args": args, "kwargs": kwargs})
-        if isinstance(params, bytes):
-            return self.key_prefix.encode() + b"__" + params
-        return f"{self.key_prefix}__{params}"
+
+        if self.key_func is not None:
+            params = self.key_func(*args, **kwargs)
+        elif not args and not kwargs:
+            return f"{self.key_prefix}__"
+        else:
+            params = self._primitive_params(args, kwargs)
+            if params is None:
+                params = self.serializer({"args": args, "kwargs": kwargs})
+
+        # Short keys are kept readable, long ones hashed to a fixed size
+        if isinstance(params, str) and len(params) <= MAX_PLAIN_KEY_PARAMS:
+            return f"{self.key_prefix}__{params}"
+        if isinstance(params, str):
+            params = params.encode()
+        return (
+            f"{self.key_prefix}__#{hashlib.blake2b(params, digest_size=16).hexdigest()}"
+        )
+
+    @staticmethod
+    def _primitive_params(args, kwargs) -> str | None:
+        for arg in args:
+            if type(arg) not in _KEY_PRIMITIVES:
+                return None
+        if not kwargs:
+            return repr(args)
+        for arg in kwargs.values():
+            if type(arg) not in _KEY_PRIMITIVES:
+                return None
+        if len(kwargs) > 1:
+            kwargs = dict(sorted(kwargs.items()))
+        return repr(args) + repr(kwargs)
 
     def lock_key(self, key):
         if isinstance(key, bytes):
@@ -101,15 +343,23 @@ class RedisCached:
 
     def __call__(self, *args, **kwargs):
         val = None
+        remaining_ms = None
         key = self.key(*args, **kwargs)
-        lock_key = self.lock_key(key)
-        lock_token = str(uuid.uuid4())
-        lock_acquired = False
         cache_available = True
-        refresh_without_lock = False
         func = self.function
+
+        if self.local_ttl_seconds:
+            val = self._get_local(key)
+            if val is not None:
+                self.stats["local_hits"] += 1
+                return self.deserializer(val)
+
         try:
-            val = self.red.get(key)
+            if self.stale_ttl_seconds:
+                with self.red.pipeline(transaction=False) as pipe:
+                    val, remaining_ms = pipe.get(key).pttl(key).execute()
+            else:
+                val = self.red.get(key)
         except redis.exceptions.RedisError as e:
             cache_available = False
             logger.exception("Unable to use cache: %s", e)
@@ -119,55 +369,172 @@ class RedisCached:
 
         if val is not None:
             # logger.debug("Cache HIT for %s", self.key(*args, **kwargs))
+            self.stats["hits"] += 1
+            if self.stale_ttl_seconds and self._should_refresh(key, remaining_ms):
+                self._refresh_in_background(key, args, kwargs)
+            else:
+                self._set_local(key, val)
             return self.deserializer(val)
 
+        self.stats["misses"] += 1
         if not cache_available:
             return func(*args, **kwargs)
 
         # logger.debug("Cache MISS for %s", self.key(*args, **kwargs))
+        lock_key = self.lock_key(key)
+        lock_token = str(uuid.uuid4())
+        lock_acquired = False
+        refresh_without_lock = False
         try:
-            lock_acquired = bool(
-                self.red.set(
-                    lock_key,
-                    lock_token,
-                    nx=True,
-                    ex=max(1, min(30, self.ttl_seconds)),
-                )
-            )
+            lock_acquired = self._acquire_lock(lock_key, lock_token)
         except redis.exceptions.RedisError:
             logger.exception("Unable to acquire cache refresh lock")
             refresh_without_lock = True
 
         if not lock_acquired and not refresh_without_lock:
-            deadline = time.monotonic() + max(0.25, min(5, self.ttl_seconds))
-            while time.monotonic() < deadline:
-                time.sleep(0.05)
-                try:
-                    val = self.red.get(key)
-                except redis.exceptions.RedisError:
-                    logger.exception("Unable to use cache while waiting for refresh")
-                    break
+            val = self._wait_for_refresh(key, max(0.25, min(5, self.ttl_seconds)))
+            if val is not None:
+                return self.deserializer(val)
+
+        return self._refresh(
+            key, lock_key, lock_token if lock_acquired else None, args, kwargs
+        )
+
+    def _acquire_lock(self, lock_key, lock_token) -> bool:
+        return bool(
+            self.red.set(
+                lock_key,
+                lock_token,
+                nx=True,
+                ex=max(1, min(30, self.ttl_seconds)),
+            )
+        )
+
+    def refresh_channel(self, key):
+        if isinstance(key, bytes):
+            return b"refreshed_" + key
+        return f"refreshed_{key}"
+
+    def _wait_for_refresh(self, key, timeout: float):
+        """Wait for the holder of the refresh lock to store a value
+
+        Returns None if it did not within `timeout` seconds or if it failed,
+        the caller then computes the value itself.
+        """
+        deadline = time.monotonic() + timeout
+        pubsub = self.red.pubsub(ignore_subscribe_messages=True)
+        try:
+            # Subscribe before checking so the notification can't be missed
+            pubsub.subscribe(self.refresh_channel(key))
+            while True:
+                val = self.red.get(key)
                 if val is not None:
-                    return self.deserializer(val)
+                    return val
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                if pubsub.get_message(timeout=remaining) is not None:
+                    # The refresh is done, if it stored nothing it failed
+                    return self.red.get(key)
+        except redis.exceptions.RedisError:
+            logger.exception("Unable to use cache while waiting for refresh")
+            return None
+        finally:
+            pubsub.close()
+
+    def _should_refresh(self, key, remaining_ms) -> bool:
+        """Whether a value read from Redis is stale or a hot key about to expire"""
+        if remaining_ms is None or remaining_ms < 0:
+            return False
+        remaining = remaining_ms / 1000
+        if remaining <= self.stale_ttl_seconds:
+            self.stats["stale_hits"] += 1
+            return True
+        if not self.refresh_ahead:
+            return False
+
+        token = _key_token(key)
+        self.access_counts[token] = hits = self.access_counts.get(token, 0) + 1
+        if (
+            hits >= self.HOT_KEY_HITS
+            and remaining - self.stale_ttl_seconds
+            <= self.ttl_seconds * self.refresh_ahead
+        ):
+            self.stats["refresh_ahead"] += 1
+            return True
+        return False
+
+    def _refresh_in_background(self, key, args, kwargs):
+        lock_key = self.lock_key(key)
+        lock_token = str(uuid.uuid4())
+        try:
+            if not self._acquire_lock(lock_key, lock_token):
+                # Somebody else is already refreshing it
+                return
+        except redis.exceptions.RedisError:
+            logger.exception("Unable to acquire cache refresh lock")
+            return
+
+        self.stats["background_refreshes"] += 1
+        get_refresh_executor().submit(
+            self._refresh_logged, key, lock_key, lock_token, args, kwargs
+        )
 
+    def _refresh_logged(self, *args):
         try:
-            val = func(*args, **kwargs)
+            self._refresh(*args)
+        except Exception:
+            logger.exception("Background refresh of %s failed", self.__name__)
+
+    def _refresh(self, key, lock_key, lock_token, args, kwargs):
+        """Compute and store the value, then wake up the callers waiting for it"""
+        try:
+            val = self.function(*args, **kwargs)
 
             if not val and not self.cache_falsy:
                 logger.debug("Caching falsy result is disabled for %s", self.__name__)
                 return val
 
             try:
-                self.red.setex(key, self.ttl_seconds, self.serializer(val))
+                serialized = self.serializer(val)
+                self.red.setex(
+                    key, self.ttl_seconds + (self.stale_ttl_seconds or 0), serialized
+                )
+                self._set_local(key, serialized)
                 # logger.debug("Cache SET for %s", self.key(*args, **kwargs))
             except redis.exceptions.RedisError:
                 logger.exception("Unable to set cache")
         finally:
-            if lock_acquired:
+            self.access_counts.pop(_key_token(key), None)
+            if lock_token is not None:
                 self._release_lock(lock_key, lock_token)
+                try:
+                    self.red.publish(self.refresh_channel(key), "1")
+                except redis.exceptions.RedisError:
+                    logger.exception("Unable to notify cache refresh")
 
         return val
 
+    def _get_local(self, key):
+        token = _key_token(key)
+        entry = self.local_cache.get(token)
+        if entry is None:
+            return None
+        expires_at, val = entry
+        if expires_at < time.monotonic():
+            self.stats["local_stale"] += 1
+            self.local_cache.pop(token, None)
+            return None
+        return val
+
+    def _set_local(self, key, val):
+        if self.local_ttl_seconds:
+            LOCAL_CACHE_INVALIDATOR.ensure_listening(self.red)
+            self.local_cache[_key_token(key)] = (
+                time.monotonic() + self.local_ttl_seconds,
+                val,
+            )
+
     def get_cached_value_for(self, *args, **kwargs):
         if self.is_method:
             key = self.key(None, *args, **kwargs)
@@ -183,14 +550,21 @@ class RedisCached:
         logger.debug("Invalidating cache for %s", key)
         if key:
             self.red.delete(key)
+            if self.local_ttl_seconds:
+                self.local_cache.pop(_key_token(key), None)
+                LOCAL_CACHE_INVALIDATOR.publish(self.red, self.key_prefix, key)
 
     def clear_all(self):
         try:
-            keys = list(self.red.scan_iter(match=f"{self.key_prefix}*"))
+            # Without the separator get_map would also clear get_maps
+            keys = list(self.red.scan_iter(match=f"{self.key_prefix}__*"))
             if keys:
                 self.red.delete(*keys)
         except redis.exceptions.RedisError:
             logger.exception("Unable to clear cache")
+        if self.local_ttl_seconds:
+            self.local_cache.clear()
+            LOCAL_CACHE_INVALIDATOR.publish(self.red, self.key_prefix)
         # else:
         #   logger.debug("Cache CLEARED for %s", keys)
 
@@ -264,8 +638,23 @@ def ttl_cache(
     is_method=True,
     cache_falsy=True,
     function_cache_unavailable=None,
+    local_ttl=None,
+    local_maxsize=256,
+    stale_ttl=None,
+    refresh_ahead=None,
+    codec: ValueCodec = PICKLE_CODEC,
+    key_func=None,
     **kwargs,
 ):
+    """Cache the result in Redis for `ttl` seconds
+
+    With `local_ttl` the serialized result is also kept in process for up to
+    that many seconds, only use it for values that rarely change.
+    With `stale_ttl` the previous result keeps being served for up to that
+    many seconds after expiring while it is refreshed in the background, see
+    RedisCached for `refresh_ahead` and `key_func`.
+    `codec` serializes the results, see ValueCodec.
+    """
     pool = get_redis_pool(decode_responses=False)
     # Allow use of in memory cache and not redis when running tests
     # but still use redis when running the development web server
@@ -289,8 +678,13 @@ def ttl_cache(
             function_cache_unavailable=function_cache_unavailable,
             is_method=is_method,
             cache_falsy=cache_falsy,
-            serializer=pickle.dumps,
-            deserializer=pickle.loads,
+            serializer=codec.dumps,
+            deserializer=codec.loads,
+            local_ttl_seconds=local_ttl,
+            local_maxsize=local_maxsize,
+            stale_ttl_seconds=stale_ttl,
+            refresh_ahead=refresh_ahead,
+            key_func=key_func,
         )
 
         def wrapper(*args, **kwargs):
@@ -302,6 +696,7 @@ def ttl_cache(
         wrapper.get_cached_value_for = cached_func.get_cached_value_for
         wrapper.clear_for = cached_func.clear_for
         wrapper.cache = cached_func
+        wrapper.cache_stats = cached_func.stats
         return wrapper
 
     return decorator
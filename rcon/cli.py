@@ -2,6 +2,7 @@ import inspect
 import json
 import logging
 import sys
+import time
 from datetime import datetime, timedelta
 from typing import Any, Set, Type
 
@@ -12,6 +13,7 @@ from sqlalchemy import select, text, update
 
 import rcon.expiring_vips.service
 import rcon.seed_vip.service
+import rcon.snapshot
 import rcon.user_config
 import rcon.user_config.utils
 import rcon.watch_killrate
@@ -22,13 +24,11 @@ from rcon.cache_utils import RedisCached, get_redis_client, get_redis_pool, inva
 from rcon.discord_chat import get_handler
 from rcon.logs.loop import LogLoop, load_generic_hooks
 from rcon.logs.recorder import LogRecorder
-from rcon.logs.stream import LogStream
 from rcon.models import PlayerID, enter_session, install_unaccent
 from rcon.player_stats import live_stats_loop
 from rcon.rcon import get_rcon
 from rcon.steam_utils import enrich_db_users
 from rcon.user_config.auto_settings import AutoSettingsConfig
-from rcon.user_config.log_stream import LogStreamUserConfig
 from rcon.user_config.webhooks import (
     BaseMentionWebhookUserConfig,
     BaseUserConfig,
@@ -77,19 +77,6 @@ def run_log_loop():
             sys.exit(1)
 
 
-@cli.command(name="log_stream")
-def run_log_stream():
-    try:
-        config = LogStreamUserConfig.load_from_db()
-        stream = LogStream()
-        stream.clear()
-        if config.enabled:
-            stream.run()
-    except:
-        logger.exception("Log stream stopped")
-        sys.exit(1)
-
-
 @cli.command(name="broadcast_loop")
 def run_broadcast_loop():
     broadcast.run()
@@ -128,6 +115,16 @@ def watch_killrate():
         sys.exit(1)
 
 
+@cli.command(name="snapshot")
+@click.option("-i", "--interval", default=rcon.snapshot.DEFAULT_INTERVAL_SEC, type=float)
+def run_snapshot(interval):
+    try:
+        rcon.snapshot.run(interval)
+    except:
+        logger.exception("Snapshot producer stopped")
+        sys.exit(1)
+
+
 @cli.command(name="automod")
 def run_automod():
     automod.run()
@@ -224,12 +221,28 @@ def do_print(func):
     default=False,
     help="Set this flag if you want the existing stats to be overriden. Otherwise they will just log an error and we move on to the next",
 )
-def process_games(start_day_offset, end_day_offset=0, force=False):
+@click.option(
+    "--workers",
+    type=int,
+    default=1,
+    help="The number of processes reprocessing games in parallel",
+)
+@click.option(
+    "--batch-size",
+    type=int,
+    default=20,
+    help="The number of games each process reprocesses at once",
+)
+def process_games(
+    start_day_offset, end_day_offset=0, force=False, workers=1, batch_size=20
+):
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
     from sqlalchemy import and_
-    from sqlalchemy.exc import IntegrityError
 
     from rcon.models import Maps, enter_session
-    from rcon.workers import record_stats_from_map
+    from rcon.utils import batched
+    from rcon.workers import init_reprocess_worker, reprocess_maps
 
     start_date = datetime.now() - timedelta(days=start_day_offset)
     start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -238,27 +251,44 @@ def process_games(start_day_offset, end_day_offset=0, force=False):
 
     print("Reprocessing date range: ", start_date, end_date)
     with enter_session() as sess:
-        all_maps = (
-            sess.query(Maps)
+        map_ids = [
+            map_id
+            for (map_id,) in sess.query(Maps.id)
             .filter(and_(Maps.start > start_date, Maps.start < end_date))
-            .all()
+            .order_by(Maps.start)
+        ]
+    print("Found %s games to reprocess" % len(map_ids))
+
+    started = time.perf_counter()
+    processed = saved = failed = 0
+
+    def report(result: tuple[int, int, int]):
+        nonlocal processed, saved, failed
+        processed += result[0]
+        saved += result[1]
+        failed += result[2]
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        print(
+            f"{processed + failed}/{len(map_ids)} games ({failed} failed), "
+            f"{saved} player stats - {processed / elapsed:.2f} games/s, "
+            f"{saved / elapsed:.1f} rows/s"
         )
-        print("Found %s games to reprocess" % len(all_maps))
-        for map_ in all_maps:
-            print("Reprocessing map: ", map_.to_dict())
-            try:
-                # TODO we could attempt to find the temporary cached stats in redis for the match 
-                record_stats_from_map(sess, map_, None, force=force)
-                sess.commit()
-                print("Done")
-            except IntegrityError as e:
-                sess.rollback()
-                # logger.exception("Failed")
-                print(
-                    "Can't re-process stats. Probably already exist. Set force flag to override. Error msg: ",
-                    repr(e),
-                )
-                continue
+
+    batches = [list(batch) for batch in batched(map_ids, max(batch_size, 1))]
+    if workers <= 1:
+        for batch in batches:
+            report(reprocess_maps(batch, force))
+    else:
+        # Each process uses its own database connections
+        with ProcessPoolExecutor(
+            workers, initializer=init_reprocess_worker
+        ) as executor:
+            futures = [
+                executor.submit(reprocess_maps, batch, force) for batch in batches
+            ]
+            for future in as_completed(futures):
+                report(future.result())
+    print("Done")
 
 
 def _models_to_exclude():
@@ -1,16 +1,39 @@
-from datetime import timedelta
+import asyncio
+import itertools
 import logging
+import math
 import threading
 import time
-from contextlib import contextmanager, nullcontext
+from contextlib import contextmanager
+from datetime import timedelta
 from functools import wraps
-from typing import Generator, Literal, Sequence, Any, List
-
-from rcon.connection import HLLCommandError, HLLConnection, Handle, Response
+from typing import Any, Generator, List, Literal, Sequence
+
+from rcon.connection import (
+    TIMEOUT_SEC,
+    AsyncHLLConnection,
+    ConnectionPool,
+    Handle,
+    HLLBrokenConnectionError,
+    HLLCommandError,
+    HLLConnection,
+    PipelinedHLLConnection,
+    Response,
+)
 from rcon.game import get_game_profile
 from rcon.maps import GameMode
 from rcon.perf_statistics import PerformanceStatistics
-from rcon.types import MapRotationResponse, MapSequenceResponse, PlayerInfoType, PublicConfig, ServerInfo, SlotsType, VipId, GameStateType, AdminType
+from rcon.types import (
+    AdminType,
+    GameStateType,
+    MapRotationResponse,
+    MapSequenceResponse,
+    PlayerInfoType,
+    PublicConfig,
+    ServerInfo,
+    SlotsType,
+    VipId,
+)
 from rcon.utils import exception_in_chain
 
 logger = logging.getLogger(__name__)
@@ -48,9 +71,6 @@ class HLLCommandFailedError(Exception):
     """Raised when a command fails"""
     pass
 
-class HLLBrokenConnectionError(Exception):
-    """Raised when the connection has broken and needs to be re-established"""
-
 
 class ServerCtl:
     """TODO: Use string format instead of interpolation as it could be a
@@ -60,91 +80,87 @@ class ServerCtl:
     """
 
     def __init__(
-        self, config: ServerInfo, perf_stats: PerformanceStatistics, auto_retry=1
+        self,
+        config: ServerInfo,
+        perf_stats: PerformanceStatistics,
+        auto_retry=1,
+        max_connections: int = 10,
+        min_connections: int = 1,
     ) -> None:
         self.config = config
         self.game_profile = get_game_profile(config.game)
         self.perf_stats = perf_stats
         self.auto_retry = auto_retry
         self.mu = threading.Lock()
-        self.conns: dict[int, HLLConnection] = {}
+        self.pool = ConnectionPool(
+            self._new_connection,
+            min_size=min_connections,
+            max_size=max_connections,
+            stats=perf_stats.increment,
+        )
+        self._pipelined_conn: PipelinedHLLConnection | None = None
 
     @contextmanager
     def with_connection(self) -> Generator[HLLConnection, None, None]:
-        # TODO: Cleanup connections from threads that no longer exist
+        logger.debug("Leasing connection in thread %s", threading.get_ident())
+        conn = self.pool.lease()
+        try:
+            yield conn
+        except Exception as e:
+            self._release(conn, e)
+            if exception_in_chain(e, HLLBrokenConnectionError) and e.__context__ is not None:
+                raise e.__context__
+            raise
+        else:
+            self._release(conn)
+
+    def _release(self, conn: HLLConnection, e: BaseException | None = None) -> None:
+        # All other errors, that might be caught (like UnicodeDecodeError) do not really qualify as an error of the
+        # connection itself. Instead of reconnecting the existing connection here (conditionally), we simply discard
+        # the connection, assuming it is broken. The pool will establish a new connection when needed.
+        broken = e is not None and (
+            isinstance(e.__context__, RuntimeError | OSError)
+            or exception_in_chain(e, OSError)
+            or exception_in_chain(e, HLLBrokenConnectionError)
+        )
+        if broken:
+            logger.warning(
+                "Connection (%s) errored in thread %s: %s, removing",
+                conn.id,
+                threading.get_ident(),
+                e,
+            )
+        self.pool.release(conn, broken=broken)
+
+    def _new_connection(self) -> HLLConnection:
+        conn = HLLConnection()
+        self._connect(conn)
+        return conn
 
-        thread_id = threading.get_ident()
-        logger.debug("Waiting to acquire lock %s", thread_id)
+    def get_pipelined_connection(self) -> PipelinedHLLConnection:
+        """Return the connection shared by all threads for batched commands"""
         if not self.mu.acquire(timeout=30):
             raise TimeoutError()
 
         try:
-            conn = self.conns.get(thread_id)
-            if conn is None:
-                conn = HLLConnection()
-                try:
-                    self._connect(conn)
-                except Exception:
-                    raise
-                self.conns[thread_id] = conn
-                self.perf_stats.increment("connection_established")
-            else:
+            conn = self._pipelined_conn
+            if conn is not None and conn.is_alive():
                 self.perf_stats.increment("connection_from_pool")
+                return conn
+
+            if conn is not None:
+                logger.warning("Pipelined connection (%s) is broken, replacing", conn.id)
+                conn.close()
+                self.perf_stats.increment("connection_closed")
+
+            conn = PipelinedHLLConnection()
+            self._connect(conn)
+            self._pipelined_conn = conn
+            self.perf_stats.increment("connection_established")
+            return conn
         finally:
             self.mu.release()
 
-        try:
-            yield conn
-        except Exception as e:
-            # All other errors, that might be caught (like UnicodeDecodeError) do not really qualify as an error of the
-            # connection itself. Instead of reconnecting the existing connection here (conditionally), we simply discard
-            # the connection, assuming it is broken. The pool will establish a new connection when needed.
-            if isinstance(e.__context__, RuntimeError | OSError) or exception_in_chain(
-                    e, OSError
-            ):
-                logger.warning(
-                    "Connection (%s) errored in thread %s: %s, removing",
-                    conn.id,
-                    thread_id,
-                    e,
-                )
-
-                if not self.mu.acquire(timeout=30):
-                    raise TimeoutError()
-
-                try:
-                    conn.close()
-                    self.conns.pop(thread_id, None)
-                    self.perf_stats.increment("connection_closed")
-                finally:
-                    self.mu.release()
-
-                raise
-
-            elif exception_in_chain(e, HLLBrokenConnectionError):
-                logger.warning(
-                    "Connection (%s) marked as broken in thread %s, removing",
-                    conn.id,
-                    thread_id,
-                )
-
-                if not self.mu.acquire(timeout=30):
-                    raise TimeoutError()
-
-                try:
-                    conn.close()
-                    self.conns.pop(thread_id, None)
-                    self.perf_stats.increment("connection_closed")
-                finally:
-                    self.mu.release()
-
-                if e.__context__ is not None:
-                    raise e.__context__
-                raise
-
-            else:
-                raise
-
     def _connect(self, conn: HLLConnection) -> None:
         try:
             conn.connect(
@@ -162,13 +178,6 @@ class ServerCtl:
             log_info=False,
             conn: HLLConnection | None = None,
     ) -> Handle:
-        if conn is None:
-            logger.debug("acquiring new connection")
-            connection = self.with_connection()
-        else:
-            logger.debug("using passed in connection")
-            connection = nullcontext(enter_result=conn)
-
         if log_info:
             logger.info("Sending command:", command, content)
         else:
@@ -176,21 +185,38 @@ class ServerCtl:
 
         self.perf_stats.increment("send")
         self.perf_stats.increment("send_size", len(content))
+
+        if conn is not None:
+            logger.debug("using passed in connection")
+            return conn.send(command, version, content)
+
         try:
-            with connection as conn:
-                return conn.send(command, version, content)
+            return self._send_leased(command, version, content)
         except (
                 RuntimeError,
                 UnicodeDecodeError,
         ):
-            if self.auto_retry is False or conn is not None:
+            if self.auto_retry is False:
                 raise
 
             logger.exception("Auto retrying send %s %s %s after 1 second", command, version, content)
             time.sleep(1)
 
-            with connection as conn:
-                return conn.send(command, version, content)
+            return self._send_leased(command, version, content)
+
+    def _send_leased(
+            self, command: str, version: int, content: dict[str, Any] | str
+    ) -> Handle:
+        """Send on a pooled connection, it stays leased until the response was received"""
+        conn = self.pool.lease()
+        try:
+            handle = conn.send(command, version, content)
+        except Exception as e:
+            self._release(conn, e)
+            raise
+
+        handle.release = lambda broken: self.pool.release(conn, broken=broken)
+        return handle
 
     def receive(
             self,
@@ -298,6 +324,66 @@ class ServerCtl:
         return self.receive_success(handle)
 
 
+    def exchange_many(
+            self,
+            commands: Sequence[tuple[str, int, dict[str, Any] | str]],
+            ignore_internal_errors: bool = False,
+    ) -> list[Response | None]:
+        """Send all commands before waiting on any of the responses
+
+        The commands are pipelined on a single connection and their responses are
+        matched back by request ID, so the whole batch costs roughly one round trip.
+        Responses are returned in the same order as `commands`, with `None` for
+        every command that failed. Internal (5xx) errors are only counted as
+        failures with `ignore_internal_errors`, they are raised otherwise.
+        """
+        if not commands:
+            return []
+
+        handles: list[Handle | None] = []
+        try:
+            conn = self.get_pipelined_connection()
+            for command, version, content in commands:
+                handles.append(self.send(command, version, content, conn=conn))
+        except (HLLBrokenConnectionError, OSError):
+            if not self.auto_retry:
+                raise
+            logger.exception("Pipelined connection broke, sending the rest of the batch on pooled connections")
+
+        responses: list[Response | None] = []
+        try:
+            for (command, version, content), handle in itertools.zip_longest(
+                commands, handles
+            ):
+                if handle is not None:
+                    try:
+                        responses.append(
+                            self.receive_optional(
+                                handle, ignore_internal_errors=ignore_internal_errors
+                            )
+                        )
+                        continue
+                    except HLLCommandError:
+                        if not ignore_internal_errors:
+                            raise
+                        logger.warning("Internal error for %s", handle.request)
+                        responses.append(None)
+                        continue
+                    except HLLBrokenConnectionError:
+                        if not self.auto_retry:
+                            raise
+                        logger.exception(
+                            "Failed %s, resending after 1 second", handle.request
+                        )
+                        time.sleep(1)
+                responses.append(self.exchange_optional(command, version, content))
+        finally:
+            # The responses of an aborted batch are not waited for anymore
+            for handle in handles:
+                if handle is not None:
+                    handle.discard()
+        return responses
+
     def get_profanities(self) -> list[str]:
         return self.exchange("GetServerInformation", 2, {"Name": "bannedwords", "Value": ""}).content_dict["bannedWords"]
 
@@ -333,6 +419,20 @@ class ServerCtl:
     def get_player_info(self, player_id: str) -> PlayerInfoType | None:
         return self.exchange("GetServerInformation", 2, {"Name": "player", "Value": player_id}).content_dict
 
+    def get_players_info(self, player_ids: Sequence[str]) -> dict[str, PlayerInfoType | None]:
+        """Fetch the info of every given player in a single pipelined batch"""
+        responses = self.exchange_many(
+            [
+                ("GetServerInformation", 2, {"Name": "player", "Value": player_id})
+                for player_id in player_ids
+            ],
+            ignore_internal_errors=True,
+        )
+        return {
+            player_id: response.content_dict if response is not None else None
+            for player_id, response in zip(player_ids, responses)
+        }
+
     def get_admin_ids(self) -> list[AdminType]:
         return [{
             "player_id": x["userId"],
@@ -397,14 +497,15 @@ class ServerCtl:
 
     def get_logs(
             self,
-            since_min_ago: int,
+            since_min_ago: float,
             filter_: str = "",
             conn: HLLConnection | None = None,
     ) -> list[str]:
         return [
             entry["message"]
             for entry in self.exchange("GetAdminLog", 2, {
-                "LogBackTrackTime": since_min_ago * 60,
+                # The server takes seconds, fractions of minutes allow for short windows
+                "LogBackTrackTime": math.ceil(since_min_ago * 60),
                 "Filters": filter_
             }, conn=conn).content_dict["entries"]
         ]
@@ -596,15 +697,17 @@ class ServerCtl:
         if len(player_ids) != len(messages):
             raise HLLCommandFailedError("Must have an equal amount of players and messages")
 
-        handles = [
-            self.send("MessagePlayer", 2, {"Message": message, "PlayerId": player_id})
-            for player_id, message in zip(player_ids, messages)
-        ]
-        responses = [
-            self.receive_success(handle)
-            for handle in handles
-        ]
-        return any(responses)
+        try:
+            responses = self.exchange_many(
+                [
+                    ("MessagePlayer", 2, {"Message": message, "PlayerId": player_id})
+                    for player_id, message in zip(player_ids, messages)
+                ]
+            )
+        except HLLBrokenConnectionError:
+            logger.exception("Failed to message %d players", len(player_ids))
+            return False
+        return any(response is not None for response in responses)
 
     def get_gamestate(self) -> GameStateType:
         s = self.exchange("GetServerInformation", 2, {"Name": "session", "Value": ""}).content_dict
@@ -721,6 +824,168 @@ class ServerCtl:
         self.exchange("SetDynamicWeatherEnabled", 2, {"MapId": map_name, "Enable": enabled})
 
 
+class AsyncServerCtl:
+    """asyncio RCON client for async code (ASGI consumers, webhook service...)
+
+    All commands share one auto-reconnecting `AsyncHLLConnection`, every
+    command is bounded by a timeout and at most `max_in_flight` commands are
+    awaiting a response at any time.
+    """
+
+    def __init__(
+        self,
+        config: ServerInfo,
+        auto_retry: int = 1,
+        timeout: float = TIMEOUT_SEC,
+        max_in_flight: int = 100,
+    ) -> None:
+        self.config = config
+        self.game_profile = get_game_profile(config.game)
+        self.auto_retry = auto_retry
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self._conn: AsyncHLLConnection | None = None
+        self._conn_mu: asyncio.Lock | None = None
+        self._in_flight: asyncio.Semaphore | None = None
+
+    async def get_connection(self) -> AsyncHLLConnection:
+        # asyncio primitives are bound to the running loop, create them lazily
+        if self._conn_mu is None:
+            self._conn_mu = asyncio.Lock()
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+
+        async with self._conn_mu:
+            if self._conn is not None and self._conn.is_alive():
+                return self._conn
+
+            if self._conn is not None:
+                logger.warning("Connection (%s) is broken, reconnecting", self._conn.id)
+                await self._conn.close()
+
+            conn = AsyncHLLConnection()
+            try:
+                await conn.connect(
+                    self.config.host,
+                    int(self.config.port),
+                    self.config.password,
+                    timeout=self.timeout,
+                )
+            except Exception:
+                await conn.close()
+                raise
+            self._conn = conn
+            return conn
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def exchange(
+        self,
+        command: str,
+        version: int,
+        content: dict[str, Any] | str = "",
+        timeout: float | None = None,
+    ) -> Response:
+        attempt = 0
+        while True:
+            conn = await self.get_connection()
+            try:
+                async with self._in_flight:
+                    response = await conn.exchange(
+                        command, version, content, timeout=timeout or self.timeout
+                    )
+            except TimeoutError:
+                # Resending would only wait as long again
+                raise
+            except (HLLBrokenConnectionError, OSError, asyncio.IncompleteReadError) as e:
+                if attempt >= self.auto_retry:
+                    raise
+                attempt += 1
+                logger.warning("Failed %s (%s), retrying on a new connection", command, e)
+                continue
+
+            response.raise_for_status()
+            return response
+
+    async def exchange_optional(
+        self,
+        command: str,
+        version: int,
+        content: dict[str, Any] | str = "",
+        timeout: float | None = None,
+    ) -> Response | None:
+        try:
+            return await self.exchange(command, version, content, timeout=timeout)
+        except HLLCommandError as e:
+            if e.status_code >= 500:
+                raise
+            return None
+
+    async def exchange_many(
+        self,
+        commands: Sequence[tuple[str, int, dict[str, Any] | str]],
+        timeout: float | None = None,
+    ) -> list[Response | None]:
+        """Run all commands concurrently, with `None` for every command that failed"""
+        return await asyncio.gather(
+            *(
+                self.exchange_optional(command, version, content, timeout=timeout)
+                for command, version, content in commands
+            )
+        )
+
+    async def get_name(self) -> str:
+        response = await self.exchange("GetServerInformation", 2, {"Name": "session", "Value": ""})
+        return response.content_dict["serverName"]
+
+    async def get_slots(self) -> SlotsType:
+        response = await self.exchange("GetServerInformation", 2, {"Name": "session", "Value": ""})
+        return SlotsType(
+            current_players=response.content_dict["playerCount"],
+            max_players=response.content_dict["maxPlayerCount"],
+        )
+
+    async def get_player_ids(self) -> dict[str, str]:
+        response = await self.exchange("GetServerInformation", 2, {"Name": "players", "Value": ""})
+        return {x["name"]: x["iD"] for x in response.content_dict["players"]}
+
+    async def get_all_player_info(self) -> list[PlayerInfoType]:
+        response = await self.exchange("GetServerInformation", 2, {"Name": "players", "Value": ""})
+        return response.content_dict["players"]
+
+    async def get_players_info(self, player_ids: Sequence[str]) -> dict[str, PlayerInfoType | None]:
+        responses = await self.exchange_many(
+            [
+                ("GetServerInformation", 2, {"Name": "player", "Value": player_id})
+                for player_id in player_ids
+            ]
+        )
+        return {
+            player_id: response.content_dict if response is not None else None
+            for player_id, response in zip(player_ids, responses)
+        }
+
+    async def get_logs(self, since_min_ago: float, filter_: str = "") -> list[str]:
+        response = await self.exchange("GetAdminLog", 2, {
+            # The server takes seconds, fractions of minutes allow for short windows
+            "LogBackTrackTime": math.ceil(since_min_ago * 60),
+            "Filters": filter_,
+        })
+        return [entry["message"] for entry in response.content_dict["entries"]]
+
+    @_escape_params
+    async def message_player(self, player_id: str, message: str) -> bool:
+        response = await self.exchange_optional("MessagePlayer", 2, {"Message": message, "PlayerId": player_id})
+        return response is not None
+
+    @_escape_params
+    async def message_all_players(self, message: str) -> bool:
+        response = await self.exchange_optional("MessageAllPlayers", 2, {"Message": message})
+        return response is not None
+
+
 class HLLServerCtl(ServerCtl):
     """Hell Let Loose controller extension point."""
 
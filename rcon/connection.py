@@ -1,26 +1,63 @@
-import array
+import asyncio
 import base64
 import itertools
 import json
 import logging
+import select
 import socket
 import struct
 import threading
+import time
 import uuid
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from contextlib import contextmanager
 from enum import IntEnum
 from threading import get_ident
-from typing import Any, ClassVar, Self
+from typing import Any, Callable, ClassVar, Self
 
+import orjson
 from cachetools import TTLCache
 
 TIMEOUT_SEC = 20
 HEADER_FORMAT = "<III"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
 MAGIC_HEADER_VALUE = 0xDE450508
+# Receive buffers grow up to this size and are then reused for every response,
+# larger responses get a one-off buffer
+MAX_RECV_BUFFER_SIZE = 4 * 1024 * 1024
 
 logger = logging.getLogger(__name__)
 
 
+def xor_bytes(data: bytes | bytearray | memoryview, key: bytes) -> bytes:
+    """XOR `data` with the repeating `key`
+
+    Works on whole machine words through Python integers instead of going
+    byte by byte, which matters for multi-hundred-KB log responses.
+    """
+    size = len(data)
+    if not key or not size:
+        return bytes(data)
+
+    repeats, remainder = divmod(size, len(key))
+    keystream = key * repeats + key[:remainder]
+    return (
+        int.from_bytes(data, "little") ^ int.from_bytes(keystream, "little")
+    ).to_bytes(size, "little")
+
+
+def xor_overwrite(buffer: bytearray | memoryview, key: bytes) -> None:
+    """Replace the content of `buffer` with its XOR with the repeating `key`
+
+    The result is computed in a new bytes object then copied back, the caller
+    keeps its buffer.
+    """
+    if key and len(buffer):
+        buffer[:] = xor_bytes(buffer, key)
+
+
 class HLLServerError(Exception):
     """Raised when the server failed to execute a command or responded unexpectedly"""
 
@@ -102,16 +139,40 @@ class ResponseStatus(IntEnum):
 
 
 class Handle:
-    def __init__(self, conn: "HLLConnection", request: "Request") -> None:
+    def __init__(
+        self,
+        conn: "HLLConnection",
+        request: "Request",
+        release: Callable[[bool], None] | None = None,
+    ) -> None:
         self.conn = conn
         self.request = request
+        # Called once the response was read, with whether the connection broke
+        self.release = release
         self._response: Response | None = None
 
     def receive(self) -> "Response":
         if self._response is None:
-            self._response = self.conn.receive(self.request.request_id)
+            try:
+                self._response = self.conn.receive(self.request.request_id)
+            except Exception as e:
+                self._release(broken=isinstance(e, OSError | HLLBrokenConnectionError))
+                raise
+            self._release(broken=False)
         return self._response
 
+    def discard(self) -> None:
+        """Stop waiting for the response if it wasn't received"""
+        if self._response is None:
+            self.conn.discard(self.request.request_id)
+            # Its response may still arrive, don't reuse the connection
+            self._release(broken=True)
+
+    def _release(self, broken: bool) -> None:
+        release, self.release = self.release, None
+        if release is not None:
+            release(broken)
+
 
 class Response:
     def __init__(
@@ -142,7 +203,7 @@ class Response:
 
     @property
     def content_dict(self) -> dict[str, Any]:
-        parsed_content = json.loads(self.content)
+        parsed_content = orjson.loads(self.content)
         if not isinstance(parsed_content, dict):
             msg = f"Expected JSON content to be a dict, got {type(parsed_content)}"
             raise TypeError(msg)
@@ -158,8 +219,10 @@ class Response:
         return f"{self.status_code} {self.name} {content}"
 
     @classmethod
-    def from_bytes(cls, request_id: int, body_encoded: bytes) -> Self:
-        body = json.loads(body_encoded)
+    def from_bytes(
+        cls, request_id: int, body_encoded: bytes | bytearray | memoryview
+    ) -> Self:
+        body = orjson.loads(body_encoded)
         return cls(
             request_id=request_id,
             command=str(body["name"]),
@@ -193,6 +256,14 @@ def set_timeout(sock: socket.socket, timeout: float):
 
 
 class HLLConnection:
+    # Payload codecs, swappable for a different implementation
+    xor_codec: ClassVar[Callable[[bytes | bytearray | memoryview, bytes], bytes]] = (
+        staticmethod(xor_bytes)
+    )
+    xor_overwrite_codec: ClassVar[Callable[[bytearray | memoryview, bytes], None]] = (
+        staticmethod(xor_overwrite)
+    )
+
     def __init__(self) -> None:
         self.xorkey = None
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -201,6 +272,8 @@ class HLLConnection:
         self.auth_token = None
         self.mu = threading.Lock()
         self._response_cache: TTLCache[int, Response] = TTLCache(maxsize=1024, ttl=60)
+        self._header_buffer = bytearray(HEADER_SIZE)
+        self._recv_buffer = bytearray()
 
     def connect(self, host, port, password: str):
         self.sock.connect((host, port))
@@ -247,28 +320,7 @@ class HLLConnection:
         self.mu.acquire()
         try:
             while request_id not in self._response_cache:
-                header_len = struct.calcsize(HEADER_FORMAT)
-                header_bytes = self.sock.recv(header_len)
-                try:
-                    magic, req_id, body_len = struct.unpack(HEADER_FORMAT, header_bytes)
-                except struct.error:
-                    raise HLLBrokenConnectionError(
-                        f"Failed to unpack response header: {header_bytes}"
-                    )
-
-                if magic != MAGIC_HEADER_VALUE:
-                    raise HLLBrokenConnectionError(
-                        f"Invalid magic value: {magic:#x} (expected {MAGIC_HEADER_VALUE:#x})"
-                    )
-
-                with set_timeout(self.sock, 3):
-                    raw = bytearray()
-                    while len(raw) < body_len:
-                        raw += self.sock.recv(body_len - len(raw))
-
-                msg = self._xor(raw)
-                response = Response.from_bytes(req_id, msg)
-
+                response = self._read_response()
                 self._response_cache[response.request_id] = response
         finally:
             self.mu.release()
@@ -276,15 +328,604 @@ class HLLConnection:
         response = self._response_cache.pop(request_id)
         return response
 
+    def discard(self, request_id: int) -> None:
+        with self.mu:
+            self._response_cache.pop(request_id, None)
+
+    def _recv_exactly_into(self, view: memoryview) -> None:
+        """Fill `view` from the socket, a single recv may return fewer bytes"""
+        received = 0
+        while received < len(view):
+            count = self.sock.recv_into(view[received:])
+            if not count:
+                raise HLLBrokenConnectionError(
+                    f"Connection closed by the server after {received}/{len(view)} bytes"
+                )
+            received += count
+
+    def _body_view(self, body_len: int) -> memoryview:
+        if body_len > MAX_RECV_BUFFER_SIZE:
+            return memoryview(bytearray(body_len))
+        if len(self._recv_buffer) < body_len:
+            self._recv_buffer = bytearray(body_len)
+        return memoryview(self._recv_buffer)[:body_len]
+
+    def _read_response(self) -> Response:
+        """Read and decode exactly one response frame from the socket"""
+        header_view = memoryview(self._header_buffer)
+        self._recv_exactly_into(header_view)
+        magic, req_id, body_len = struct.unpack_from(HEADER_FORMAT, header_view)
+
+        if magic != MAGIC_HEADER_VALUE:
+            raise HLLBrokenConnectionError(
+                f"Invalid magic value: {magic:#x} (expected {MAGIC_HEADER_VALUE:#x})"
+            )
+
+        body_view = self._body_view(body_len)
+        with body_view, set_timeout(self.sock, 3):
+            self._recv_exactly_into(body_view)
+            self._xor_overwrite(body_view)
+            return Response.from_bytes(req_id, body_view)
+
     def exchange(self, command: str, version: int, body: dict[str, Any] | str = ""):
         handle = self.send(command, version, body)
         return handle.receive()
 
+    def is_alive(self) -> bool:
+        """Probe an idle connection without blocking
+
+        Nothing is expected on the socket between requests, if it is readable
+        and a peek returns no data, the server closed the connection.
+        """
+        if self.sock.fileno() == -1:
+            return False
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+            if not readable:
+                return True
+            return self.sock.recv(1, socket.MSG_PEEK) != b""
+        except (OSError, ValueError):
+            return False
+
     def _xor(self, msg) -> bytes:
         if not self.xorkey:
             return msg
-        n = []
-        for i in range(len(msg)):
-            n.append(msg[i] ^ self.xorkey[i % len(self.xorkey)])
+        return self.xor_codec(msg, self.xorkey)
+
+    def _xor_overwrite(self, buffer: bytearray | memoryview) -> None:
+        if self.xorkey:
+            self.xor_overwrite_codec(buffer, self.xorkey)
+
+
+class PipelinedHLLConnection(HLLConnection):
+    """A connection that allows many requests to be in flight at the same time
+
+    Once authenticated, a dedicated reader thread owns the receiving side of the
+    socket and resolves a future per `request_id`, so any number of threads can
+    send on the same connection and responses may arrive in any order.
+    """
+
+    READER_POLL_SEC = 1
+
+    def __init__(self) -> None:
+        super().__init__()
+        # Futures are only removed once answered or failed, a waiting caller
+        # is never left without its response
+        self._pending: dict[int, Future[Response]] = {}
+        self._reader: threading.Thread | None = None
+        self._write_mu = threading.Lock()
+        self._closing = False
+        self._error: BaseException | None = None
+
+    def connect(self, host, port, password: str):
+        # The handshake uses the regular request/response path, the reader
+        # only takes over the socket once we are authenticated
+        super().connect(host, port, password)
+        self._reader = threading.Thread(
+            target=self._read_loop, name=f"hll-reader-{self.id}", daemon=True
+        )
+        self._reader.start()
+
+    def is_alive(self) -> bool:
+        return (
+            self._reader is not None
+            and self._reader.is_alive()
+            and self._error is None
+            and not self._closing
+        )
+
+    def close(self) -> None:
+        self._closing = True
+        super().close()
+        if self._reader is not None and self._reader is not threading.current_thread():
+            self._reader.join(timeout=self.READER_POLL_SEC * 2)
+        self._fail_pending(HLLBrokenConnectionError("Connection closed"))
+
+    def send(
+        self, command: str, version: int, body: dict[str, Any] | str = ""
+    ) -> Handle:
+        if self._reader is None:
+            # Still authenticating
+            return super().send(command, version, body)
+
+        request = Request(
+            command=command,
+            version=version,
+            auth_token=self.auth_token,
+            content=body,
+        )
+        future: Future[Response] = Future()
+
+        req_header, req_body = request.to_bytes()
+        message = req_header + self._xor(req_body)
+        with self.mu:
+            if self._error is not None or self._closing:
+                raise HLLBrokenConnectionError(
+                    f"Connection {self.id} is no longer usable"
+                ) from self._error
+            # Register before sending so a fast response can never miss its future
+            self._pending[request.request_id] = future
+
+        try:
+            with self._write_mu:
+                self.sock.sendall(message)
+        except OSError:
+            with self.mu:
+                self._pending.pop(request.request_id, None)
+            raise
 
-        return array.array("B", n).tobytes()
+        return Handle(self, request)
+
+    def receive(self, request_id: int) -> Response:
+        if self._reader is None:
+            return super().receive(request_id)
+
+        with self.mu:
+            future = self._pending.get(request_id)
+        if future is None:
+            raise HLLBrokenConnectionError(
+                f"Request #{request_id} is not in flight on connection {self.id}"
+            ) from self._error
+
+        try:
+            return future.result(timeout=TIMEOUT_SEC)
+        except FutureTimeoutError:
+            raise HLLBrokenConnectionError(
+                f"Timed out waiting for response to request #{request_id}"
+            )
+        finally:
+            with self.mu:
+                self._pending.pop(request_id, None)
+
+    def discard(self, request_id: int) -> None:
+        with self.mu:
+            self._pending.pop(request_id, None)
+
+    def _read_loop(self) -> None:
+        try:
+            while not self._closing:
+                readable, _, _ = select.select(
+                    [self.sock], [], [], self.READER_POLL_SEC
+                )
+                if not readable:
+                    continue
+
+                response = self._read_response()
+                with self.mu:
+                    future = self._pending.get(response.request_id)
+                if future is None:
+                    logger.debug(
+                        "Dropping response for unknown request #%s",
+                        response.request_id,
+                    )
+                    continue
+                future.set_result(response)
+        except Exception as e:
+            if not self._closing:
+                logger.warning("Reader of connection (%s) failed: %s", self.id, e)
+            self._error = e
+            self._fail_pending(e)
+
+    def _fail_pending(self, e: BaseException) -> None:
+        with self.mu:
+            futures = list(self._pending.values())
+            self._pending.clear()
+        for future in futures:
+            exc = HLLBrokenConnectionError(f"Connection {self.id} broke: {e}")
+            exc.__cause__ = e
+            try:
+                future.set_exception(exc)
+            except InvalidStateError:
+                # Answered in the meantime
+                pass
+
+
+class _PoolEntry:
+    __slots__ = ("conn", "last_used", "owner", "leases", "broken")
+
+    def __init__(self, conn: HLLConnection) -> None:
+        self.conn = conn
+        self.last_used = time.monotonic()
+        self.owner: threading.Thread | None = None
+        self.leases = 0
+        self.broken = False
+
+
+class ConnectionPool:
+    """A bounded pool of authenticated connections
+
+    A connection is leased by one thread at a time and handed back with
+    `release`. At most `max_size` connections exist at once, callers wait up to
+    `lease_timeout` seconds for one to become available. Idle connections are
+    probed before being handed out, closed once idle for longer than
+    `idle_timeout` (keeping `min_size` around), and connections still leased
+    by threads that no longer exist are reclaimed.
+
+    A thread that leases again before releasing its connection gets the same
+    one back, it is handed back once released as many times as leased.
+
+    `stats` receives `(metric, value)` for every pool event, e.g.
+    `PerformanceStatistics.increment`. It is called without holding the pool
+    lock and its errors are only logged.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], HLLConnection],
+        min_size: int = 1,
+        max_size: int = 10,
+        idle_timeout: float = 300,
+        lease_timeout: float = 30,
+        stats: Callable[[str, int], None] | None = None,
+    ) -> None:
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError(f"Invalid pool bounds: min={min_size} max={max_size}")
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.lease_timeout = lease_timeout
+        self.stats = stats or (lambda metric, value: None)
+        self._cond = threading.Condition()
+        # Most recently used last, so leases reuse warm connections
+        self._idle: deque[_PoolEntry] = deque()
+        self._leased: dict[int, _PoolEntry] = {}
+        self._connecting = 0
+        self._closed = False
+
+    @property
+    def size(self) -> int:
+        return len(self._idle) + len(self._leased) + self._connecting
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    @property
+    def leased(self) -> int:
+        return len(self._leased)
+
+    def lease(self) -> HLLConnection:
+        started = time.monotonic()
+        deadline = started + self.lease_timeout
+        saturated = False
+        to_close: list[HLLConnection] = []
+        # Recorded once the lock is released, stats may be a network round trip
+        metrics: list[tuple[str, int]] = []
+
+        try:
+            with self._cond:
+                owned = self._owned_entry()
+                if owned is not None:
+                    # Waiting for another connection could wait on ourselves
+                    owned.leases += 1
+                    metrics.append(("connection_lease_reused", 1))
+                    return owned.conn
+
+                while True:
+                    if self._closed:
+                        raise HLLBrokenConnectionError("Connection pool is closed")
+                    to_close.extend(self._reclaim_dead_leases(metrics))
+                    to_close.extend(self._evict_idle(metrics))
+
+                    while self._idle:
+                        entry = self._idle.pop()
+                        if entry.conn.is_alive():
+                            self._lease_entry(entry)
+                            metrics.append(("connection_from_pool", 1))
+                            self._record_wait(started, saturated, metrics)
+                            return entry.conn
+                        logger.warning(
+                            "Pooled connection (%s) failed its liveness probe, closing",
+                            entry.conn.id,
+                        )
+                        to_close.append(entry.conn)
+                        metrics.append(("connection_probe_failed", 1))
+
+                    if self.size < self.max_size:
+                        self._connecting += 1
+                        break
+
+                    if not saturated:
+                        saturated = True
+                        metrics.append(("pool_saturated", 1))
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._record_wait(started, saturated, metrics)
+                        raise TimeoutError(
+                            f"No connection available after {self.lease_timeout}s"
+                        )
+                    self._cond.wait(remaining)
+        finally:
+            self._close_all(to_close, metrics)
+            self._record_stats(metrics)
+
+        # Connecting takes a few round trips, don't block the other threads
+        self._record_wait(started, saturated, metrics)
+        try:
+            conn = self.factory()
+        except BaseException:
+            with self._cond:
+                self._connecting -= 1
+                self._cond.notify()
+            self._record_stats(metrics)
+            raise
+
+        with self._cond:
+            self._connecting -= 1
+            self._lease_entry(_PoolEntry(conn))
+        metrics.append(("connection_established", 1))
+        self._record_stats(metrics)
+        return conn
+
+    def release(self, conn: HLLConnection, broken: bool = False) -> None:
+        to_close: list[HLLConnection] = []
+        metrics: list[tuple[str, int]] = []
+        with self._cond:
+            entry = self._leased.get(id(conn))
+            if entry is None:
+                # Already reclaimed, the connection has been closed
+                return
+            entry.broken = entry.broken or broken
+            entry.leases -= 1
+            if entry.leases > 0:
+                # Still leased by the same thread
+                return
+            del self._leased[id(conn)]
+            if entry.broken or self._closed:
+                to_close.append(conn)
+            else:
+                entry.owner = None
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            to_close.extend(self._evict_idle(metrics))
+            self._cond.notify()
+        self._close_all(to_close, metrics)
+        self._record_stats(metrics)
+
+    def close(self) -> None:
+        """Close idle connections, leased ones are closed when released"""
+        metrics: list[tuple[str, int]] = []
+        with self._cond:
+            self._closed = True
+            to_close = [entry.conn for entry in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        self._close_all(to_close, metrics)
+        self._record_stats(metrics)
+
+    def _lease_entry(self, entry: _PoolEntry) -> None:
+        entry.owner = threading.current_thread()
+        entry.leases = 1
+        entry.broken = False
+        self._leased[id(entry.conn)] = entry
+
+    def _owned_entry(self) -> _PoolEntry | None:
+        thread = threading.current_thread()
+        for entry in self._leased.values():
+            if entry.owner is thread:
+                return entry
+        return None
+
+    def _record_wait(
+        self, started: float, saturated: bool, metrics: list[tuple[str, int]]
+    ) -> None:
+        if saturated:
+            metrics.append(("pool_wait_ms", int((time.monotonic() - started) * 1000)))
+
+    def _record_stats(self, metrics: list[tuple[str, int]]) -> None:
+        """Record the metrics and empty the list, never raises"""
+        for metric, value in metrics:
+            try:
+                self.stats(metric, value)
+            except Exception:
+                logger.exception("Unable to record pool metric %s", metric)
+        metrics.clear()
+
+    def _reclaim_dead_leases(
+        self, metrics: list[tuple[str, int]]
+    ) -> list[HLLConnection]:
+        dead = [
+            key
+            for key, entry in self._leased.items()
+            if entry.owner is not None and not entry.owner.is_alive()
+        ]
+        reclaimed = []
+        for key in dead:
+            entry = self._leased.pop(key)
+            # We can't know if a response is still due on it, so don't reuse it
+            logger.warning(
+                "Reclaiming connection (%s) leased by exited thread %s",
+                entry.conn.id,
+                entry.owner.name if entry.owner else None,
+            )
+            reclaimed.append(entry.conn)
+            metrics.append(("connection_evicted_dead_thread", 1))
+        return reclaimed
+
+    def _evict_idle(self, metrics: list[tuple[str, int]]) -> list[HLLConnection]:
+        evicted = []
+        now = time.monotonic()
+        while (
+            self._idle
+            and self.size > self.min_size
+            and now - self._idle[0].last_used > self.idle_timeout
+        ):
+            evicted.append(self._idle.popleft().conn)
+            metrics.append(("connection_evicted_idle", 1))
+        return evicted
+
+    def _close_all(
+        self, conns: list[HLLConnection], metrics: list[tuple[str, int]]
+    ) -> None:
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                logger.exception("Unable to close connection (%s)", conn.id)
+            metrics.append(("connection_closed", 1))
+
+
+class AsyncHLLConnection:
+    """asyncio counterpart of `PipelinedHLLConnection`
+
+    Uses the same v2 framing and handshake, a reader task resolves one future
+    per `request_id` so any number of commands can be awaited concurrently.
+    """
+
+    def __init__(self) -> None:
+        self.xorkey = None
+        self.id = f"async-{uuid.uuid4()}"
+        self.auth_token = None
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self._pending: dict[int, asyncio.Future[Response]] = {}
+        self._reader_task: asyncio.Task | None = None
+        self._write_mu = asyncio.Lock()
+        self._error: BaseException | None = None
+
+    xor_codec = staticmethod(xor_bytes)
+    xor_overwrite_codec = staticmethod(xor_overwrite)
+    _xor = HLLConnection._xor
+    _xor_overwrite = HLLConnection._xor_overwrite
+
+    async def connect(
+        self, host, port, password: str, timeout: float = TIMEOUT_SEC
+    ) -> None:
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout=timeout
+        )
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+        server_hello = await self.exchange("ServerConnect", 2, "", timeout=timeout)
+        server_hello.raise_for_status()
+
+        if not isinstance(server_hello.content, str):
+            raise HLLBrokenConnectionError(
+                "ServerConnect response content is not a string"
+            )
+        self.xorkey = base64.b64decode(server_hello.content)
+
+        auth_token_resp = await self.exchange("Login", 2, password, timeout=timeout)
+        auth_token_resp.raise_for_status()
+
+        self.auth_token = auth_token_resp.content
+
+    def is_alive(self) -> bool:
+        return (
+            self._reader_task is not None
+            and not self._reader_task.done()
+            and self._error is None
+        )
+
+    async def close(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                logger.debug("Unable to close connection %s cleanly", self.id)
+        self._fail_pending(HLLBrokenConnectionError("Connection closed"))
+
+    async def send(
+        self, command: str, version: int, body: dict[str, Any] | str = ""
+    ) -> "asyncio.Future[Response]":
+        if self.writer is None or not self.is_alive():
+            raise HLLBrokenConnectionError(
+                f"Connection {self.id} is no longer usable"
+            ) from self._error
+
+        request = Request(
+            command=command,
+            version=version,
+            auth_token=self.auth_token,
+            content=body,
+        )
+        future: asyncio.Future[Response] = asyncio.get_running_loop().create_future()
+        self._pending[request.request_id] = future
+        future.add_done_callback(lambda _: self._pending.pop(request.request_id, None))
+
+        req_header, req_body = request.to_bytes()
+        async with self._write_mu:
+            self.writer.write(req_header + self._xor(req_body))
+            await self.writer.drain()
+
+        return future
+
+    async def exchange(
+        self,
+        command: str,
+        version: int,
+        body: dict[str, Any] | str = "",
+        timeout: float = TIMEOUT_SEC,
+    ) -> Response:
+        future = await self.send(command, version, body)
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{command} timed out after {timeout}s")
+
+    async def _read_response(self) -> Response:
+        assert self.reader is not None
+        header_bytes = await self.reader.readexactly(HEADER_SIZE)
+        magic, req_id, body_len = struct.unpack(HEADER_FORMAT, header_bytes)
+        if magic != MAGIC_HEADER_VALUE:
+            raise HLLBrokenConnectionError(
+                f"Invalid magic value: {magic:#x} (expected {MAGIC_HEADER_VALUE:#x})"
+            )
+
+        raw = bytearray(await self.reader.readexactly(body_len))
+        self._xor_overwrite(raw)
+        return Response.from_bytes(req_id, raw)
+
+    async def _read_loop(self) -> None:
+        try:
+            while True:
+                response = await self._read_response()
+                future = self._pending.get(response.request_id)
+                if future is None or future.done():
+                    logger.debug(
+                        "Dropping response for unknown request #%s",
+                        response.request_id,
+                    )
+                    continue
+                future.set_result(response)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Reader of connection (%s) failed: %s", self.id, e)
+            self._error = e
+            self._fail_pending(e)
+
+    def _fail_pending(self, e: BaseException) -> None:
+        for future in list(self._pending.values()):
+            if not future.done():
+                exc = HLLBrokenConnectionError(f"Connection {self.id} broke: {e}")
+                exc.__cause__ = e
+                future.set_exception(exc)
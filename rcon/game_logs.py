@@ -1,21 +1,19 @@
 import datetime
 import logging
-
 import unicodedata
+from collections.abc import Mapping
+from functools import partial
+
 from dateutil import parser
 from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 
+from rcon.logs.index import LogsHistoryIndex
 from rcon.logs.loop import LogLoop
 from rcon.models import LogLine, PlayerID, enter_session
 from rcon.rcon import LOG_ACTIONS
-from rcon.types import (
-    ParsedLogsType,
-    StructuredLogLineWithMetaData,
-)
-from rcon.utils import (
-    strtobool,
-)
+from rcon.types import ParsedLogsType, StructuredLogLineWithMetaData
+from rcon.utils import LogsHistory, StreamID, stream_id_sequence, strtobool
 
 logger = logging.getLogger(__name__)
 
@@ -77,7 +75,6 @@ def get_recent_logs(
     # inclusive_filter=False will do the opposite, show all lines except what is passed in
     # `actions_filter`
     log_list = LogLoop.get_log_history_list()
-    all_logs = log_list
 
     if not isinstance(start, int):
         start = 0
@@ -92,19 +89,121 @@ def get_recent_logs(
     exact_action = strtobool(exact_action)
     inclusive_filter = strtobool(inclusive_filter)
 
+    if player_search and not isinstance(player_search, list):
+        player_search = [player_search]
+
+    index = LogsHistoryIndex(log_list)
+    seq = log_list.sequence()
+    # The logs from index `start` to `end` of the history, as sequence numbers
+    first_seq = max(seq - end + 1, seq - len(log_list) + 1)
+    last_seq = seq - start
+    scan = partial(
+        _scan_recent_logs,
+        log_list,
+        start,
+        end,
+        player_search,
+        action_filter,
+        min_timestamp,
+        exact_player_match,
+        exact_action,
+        inclusive_filter,
+    )
+    if not index.covers(first_seq):
+        return scan()
+
+    if min_timestamp:
+        first_since = log_list.range(since_ms=min_timestamp * 1000, count=1)
+        first_seq = max(
+            first_seq,
+            stream_id_sequence(first_since[0][0]) if first_since else last_seq + 1,
+        )
+
+    all_players: list[str] = []
+    actions = set(LOG_ACTIONS)
+    logs: list[StructuredLogLineWithMetaData] = []
+    if first_seq <= last_seq:
+        all_players = index.players_since(first_seq)
+        window_actions = index.actions_since(first_seq)
+        actions.update(window_actions)
+        matched_actions = [
+            a for a in window_actions if is_action(action_filter, a, exact_action)
+        ]
+
+        # Only read the postings of the matching names and actions
+        ids: set[StreamID] | None = None
+        if player_search:
+            names = [
+                name
+                for name in all_players
+                if any(
+                    is_player(search, name, exact_player_match)
+                    for search in player_search
+                )
+            ]
+            ids = index.ids_for_players(names, first_seq, last_seq)
+            if action_filter and ids is not None:
+                with_action = index.ids_for_actions(
+                    matched_actions, first_seq, last_seq
+                )
+                if with_action is None:
+                    ids = None
+                elif inclusive_filter:
+                    ids &= with_action
+                else:
+                    ids -= with_action
+        elif action_filter:
+            if not inclusive_filter:
+                matched_actions = [
+                    a for a in window_actions if a not in matched_actions
+                ]
+            ids = index.ids_for_actions(matched_actions, first_seq, last_seq)
+        if (player_search or action_filter) and ids is None:
+            # Some of the postings are missing, the index can't be trusted
+            return scan()
+
+        if ids is None:
+            logs = log_list[start : last_seq - first_seq + 1 + start]
+        else:
+            logs = log_list.get_ids(sorted(ids, key=stream_id_sequence, reverse=True))
+        logs = [
+            line
+            for line in logs
+            if isinstance(line, Mapping)
+            and not (min_timestamp and line["timestamp_ms"] / 1000 < min_timestamp)
+        ]
+
+    return {
+        "actions": sorted(list(actions)),
+        "players": all_players,
+        "logs": logs,
+    }
+
+
+def _scan_recent_logs(
+    log_list: LogsHistory,
+    start: int,
+    end: int,
+    player_search: list[str],
+    action_filter: list[str],
+    min_timestamp: float | None,
+    exact_player_match: bool,
+    exact_action: bool,
+    inclusive_filter: bool,
+) -> ParsedLogsType:
+    """`get_recent_logs` reading every log, for logs not covered by the index"""
+    all_logs = log_list
     if start != 0:
         all_logs = log_list[start : min(end, len(log_list))]
     logs: list[StructuredLogLineWithMetaData] = []
     all_players = set()
     actions = set(LOG_ACTIONS)
-    if player_search and not isinstance(player_search, list):
-        player_search = [player_search]
     # flatten that shit
     line: StructuredLogLineWithMetaData
     for idx, line in enumerate(all_logs):
         if idx >= end - start:
             break
-        if not isinstance(line, dict):
+        if not isinstance(line, Mapping):
             continue
         if min_timestamp and line["timestamp_ms"] / 1000 < min_timestamp:
             logger.debug("Stopping log read due to old timestamp at index %s", idx)
@@ -0,0 +1,63 @@
+"""Duplicate guard for log lines, partitioned into per-minute sets
+
+Each line goes into the set of the minute its timestamp falls in and every
+set expires on its own once all of its lines are older than the retention
+window, so stale lines never have to be looked for.
+"""
+
+import time
+from typing import Iterable
+
+import redis
+
+from rcon.types import StructuredLogLineWithMetaData
+
+DEDUPE_KEY_PREFIX = "unique_logs"
+BUCKET_SEC = 60
+DEFAULT_RETENTION_SEC = 180 * 60
+
+
+def log_id(log: StructuredLogLineWithMetaData) -> str:
+    return f"{log['timestamp_ms']}|{log['line_without_time']}"
+
+
+class LogDedupeIndex:
+    def __init__(
+        self,
+        red: redis.StrictRedis,
+        retention_sec: int = DEFAULT_RETENTION_SEC,
+        prefix: str = DEDUPE_KEY_PREFIX,
+    ) -> None:
+        self.red = red
+        self.retention_sec = retention_sec
+        self.prefix = prefix
+
+    def bucket_key(self, timestamp_ms: int) -> str:
+        return f"{self.prefix}:{int(timestamp_ms) // 1000 // BUCKET_SEC}"
+
+    def add_logs(self, logs: Iterable[StructuredLogLineWithMetaData]) -> list[bool]:
+        """Mark the logs as seen, return for each one whether it was new"""
+        return self.add_ids((log["timestamp_ms"], log_id(log)) for log in logs)
+
+    def add_ids(self, ids: Iterable[tuple[int, str]]) -> list[bool]:
+        """Same as add_logs for (timestamp_ms, log_id) pairs, in one round trip"""
+        now = time.time()
+        pipe = self.red.pipeline(transaction=False)
+        buckets: dict[str, int] = {}
+        count = 0
+        for timestamp_ms, id_ in ids:
+            key = self.bucket_key(timestamp_ms)
+            pipe.sadd(key, id_)
+            buckets.setdefault(key, timestamp_ms)
+            count += 1
+        if not count:
+            return []
+
+        for key, timestamp_ms in buckets.items():
+            bucket_end = (int(timestamp_ms) // 1000 // BUCKET_SEC + 1) * BUCKET_SEC
+            # Lines already past retention are kept for a bucket's length so a
+            # poll that returns them again still sees them as duplicates
+            pipe.expire(
+                key, max(BUCKET_SEC, int(bucket_end + self.retention_sec - now))
+            )
+        return [bool(added) for added in pipe.execute()[:count]]
@@ -0,0 +1,155 @@
+"""Secondary index of the logs history
+
+For each action and player name, the IDs (see `LogsHistory`) of the logs they
+appear in are kept in a sorted set scored by the sequence number of the log.
+The log loop adds to it as it caches logs, so filtered queries on the recent
+logs only have to read the postings of the matching names and actions and load
+the logs they point to.
+
+Postings older than the history are trimmed whenever their key is written to,
+and the postings of names and actions whose last log left the history are
+deleted along with them. A query that finds postings missing, e.g. evicted by
+Redis, scans the history instead.
+"""
+
+import logging
+from collections import defaultdict
+from typing import Callable, Iterable
+
+from rcon.types import StructuredLogLineWithMetaData
+from rcon.utils import LogsHistory, StreamID, stream_id_sequence
+
+logger = logging.getLogger(__name__)
+
+REBUILD_BATCH_SIZE = 10_000
+
+
+class LogsHistoryIndex:
+    def __init__(self, history: LogsHistory) -> None:
+        self.history = history
+        self.red = history.red
+        self.prefix = f"{history.key}:idx"
+        # Sequence number of the first indexed log
+        self.from_key = f"{self.prefix}:from"
+        # Every action and player name, scored by the last log they appear in
+        self.actions_key = f"{self.prefix}:actions"
+        self.players_key = f"{self.prefix}:players"
+
+    def action_key(self, action: str) -> str:
+        return f"{self.prefix}:action:{action}"
+
+    def player_key(self, player_name: str) -> str:
+        return f"{self.prefix}:player:{player_name}"
+
+    def add_logs(
+        self, entries: Iterable[tuple[StreamID, StructuredLogLineWithMetaData]]
+    ) -> None:
+        """Index logs just added to the history, oldest first, with their IDs"""
+        postings: defaultdict[str, dict[str, int]] = defaultdict(dict)
+        actions: dict[str, int] = {}
+        players: dict[str, int] = {}
+        first_seq = seq = None
+        for id_, log in entries:
+            seq = stream_id_sequence(id_)
+            if first_seq is None:
+                first_seq = seq
+            action = log["action"]
+            postings[self.action_key(action)][id_] = seq
+            actions[action] = seq
+            for player_name in (log["player_name_1"], log["player_name_2"]):
+                if player_name:
+                    postings[self.player_key(player_name)][id_] = seq
+                    players[player_name] = seq
+        if seq is None:
+            return
+
+        # Sequence numbers older than this one are no longer in the history
+        oldest = f"({seq - self.history.max_len + 1}"
+        pipe = self.red.pipeline(transaction=False)
+        pipe.set(self.from_key, first_seq, nx=True)
+        for key, members in postings.items():
+            pipe.zadd(key, members)
+            pipe.zremrangebyscore(key, "-inf", oldest)
+        # Position in the results of the names no longer in the history
+        gone: list[tuple[int, Callable[[str], str]]] = []
+        for key, last_seen, posting_key in (
+            (self.actions_key, actions, self.action_key),
+            (self.players_key, players, self.player_key),
+        ):
+            if last_seen:
+                pipe.zadd(key, last_seen)
+            gone.append((len(pipe), posting_key))
+            pipe.zrangebyscore(key, "-inf", oldest)
+            pipe.zremrangebyscore(key, "-inf", oldest)
+        results = pipe.execute()
+
+        # None of their postings are in the history anymore
+        stale = [
+            posting_key(name.decode())
+            for position, posting_key in gone
+            for name in results[position]
+        ]
+        if stale:
+            self.red.delete(*stale)
+
+    def clear(self) -> None:
+        keys = list(self.red.scan_iter(f"{self.prefix}:*", count=1000))
+        if keys:
+            self.red.delete(*keys)
+
+    def rebuild(self) -> None:
+        """Index the whole history again, e.g. logs cached before the index existed"""
+        self.clear()
+        count = 0
+        last_id = None
+        while entries := self.history.entries_after(last_id, REBUILD_BATCH_SIZE):
+            self.add_logs(entries)
+            count += len(entries)
+            last_id = entries[-1][0]
+        logger.info("Indexed %d cached logs", count)
+
+    def covers(self, sequence: int) -> bool:
+        """Whether the logs from `sequence` onwards are all indexed"""
+        from_ = self.red.get(self.from_key)
+        return from_ is not None and int(from_) <= sequence
+
+    def actions_since(self, sequence: int) -> list[str]:
+        """The actions of the logs from `sequence`, and possibly a few others"""
+        return [
+            a.decode()
+            for a in self.red.zrangebyscore(self.actions_key, sequence, "+inf")
+        ]
+
+    def players_since(self, sequence: int) -> list[str]:
+        """The player names of the logs from `sequence`, and possibly a few others"""
+        return [
+            p.decode()
+            for p in self.red.zrangebyscore(self.players_key, sequence, "+inf")
+        ]
+
+    def ids_for_actions(
+        self, actions: Iterable[str], start: int, end: int
+    ) -> set[StreamID] | None:
+        return self._ids(map(self.action_key, actions), start, end)
+
+    def ids_for_players(
+        self, player_names: Iterable[str], start: int, end: int
+    ) -> set[StreamID] | None:
+        return self._ids(map(self.player_key, player_names), start, end)
+
+    def _ids(self, keys: Iterable[str], start: int, end: int) -> set[StreamID] | None:
+        """Union of the postings of `keys` with a sequence number between `start` and `end`
+
+        None if the postings of one of the keys are missing.
+        """
+        keys = list(keys)
+        if not keys:
+            return set()
+        pipe = self.red.pipeline(transaction=False)
+        for key in keys:
+            pipe.zrangebyscore(key, start, end)
+        pipe.exists(*keys)
+        *postings, existing = pipe.execute()
+        if existing != len(keys):
+            return None
+        return {id_.decode() for ids in postings for id_ in ids}
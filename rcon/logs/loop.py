@@ -4,23 +4,40 @@ import re
 import sys
 import time
 from collections import defaultdict
+from collections.abc import Mapping
 from functools import partial
-from typing import Callable, Dict, Iterable, DefaultDict
+from typing import Callable, DefaultDict, Dict, Iterable
 
 import discord_webhook
-from discord.utils import escape_markdown
+import orjson
 from hllrcon.data import HLLRole, HLLTeam, HLLVRole, HLLVTeam
 
+from discord.utils import escape_markdown
 from rcon.cache_utils import get_redis_client, ttl_cache
 from rcon.connection import HLLServerError
 from rcon.discord import make_hook
-from rcon.maps import GameMode, Team as MapTeam, get_theoretical_match_time, parse_layer
+from rcon.logs.dedupe import LogDedupeIndex, log_id
+from rcon.logs.index import LogsHistoryIndex
+from rcon.maps import GameMode
+from rcon.maps import Team as MapTeam
+from rcon.maps import get_theoretical_match_time, parse_layer
 from rcon.rcon import get_rcon
-from rcon.types import AllLogTypes, GameEnum, GameStateType, GetDetailedPlayers, MapInfo, MapScore, UnitHistoryEntry, StructuredLogLineWithMetaData, PlayerStat, WorldPositionType
+from rcon.types import (
+    AllLogTypes,
+    GameEnum,
+    GameStateType,
+    GetDetailedPlayers,
+    MapInfo,
+    MapScore,
+    PlayerStat,
+    StructuredLogLineWithMetaData,
+    UnitHistoryEntry,
+    WorldPositionType,
+)
 from rcon.user_config.log_line_webhooks import LogLineWebhookUserConfig
 from rcon.user_config.rcon_server_settings import RconServerSettingsUserConfig
 from rcon.user_config.webhooks import DiscordMentionWebhook
-from rcon.utils import LogsHistory, MapsHistory
+from rcon.utils import LogsHistory, MapsHistory, batched, stream_id_sequence
 
 logger = logging.getLogger(__name__)
 
@@ -226,16 +243,25 @@ def load_generic_hooks():
 
 
 class LogLoop:
+    # Seconds of already fetched logs requested again on each delta fetch
+    LOG_FETCH_OVERLAP_SEC = 10
+    # Number of logs parsed and cached at once
+    LOG_BATCH_SIZE = 1000
+
     def __init__(self):
         self.rcon = get_rcon()
         self.red = get_redis_client()
-        self.duplicate_guard_key = "unique_logs"
         self.log_history = self.get_log_history_list()
+        self.log_index = LogsHistoryIndex(self.log_history)
         self.ACTIVE_MAP_INDEX = 0
         self.RECORD_STATS = 30 # 0.5 minute
         self.RECORD_PLAYER_STATS_DELAY = 120 # 2 minutes
         self.GET_LOGS_SINCE_MIN = 180 # 3 hours
         self.CLEANUP_MIN = 180 # 3 hours
+        self.dedupe = LogDedupeIndex(self.red, retention_sec=self.CLEANUP_MIN * 60)
+        # Server timestamp of the newest log fetched, None until the first fetch
+        self.log_watermark_ms: int | None = None
+        self.last_log_fetch = 0.0
         self.CURR_MAP_END = 0
         self.now = 0
         logger.info("Registered hooks: %s", HOOKS)
@@ -244,10 +270,11 @@ class LogLoop:
     def get_log_history_list():
         return LogsHistory()
 
-    def run(self, loop_frequency_secs=2, cleanup_frequency_minutes=10):
+    def run(self, loop_frequency_secs=2):
         self.GET_LOGS_SINCE_MIN = 180
-        last_cleanup_time = datetime.datetime.now()
+        self.log_watermark_ms = None
         prev_map_time_elapsed = 0
+        self.ensure_log_index()
 
         while True:
             load_generic_hooks()
@@ -260,7 +287,6 @@ class LogLoop:
                 # which in turn restarts this service
                 # Let's log it and prevent restarting the service
                 logger.warning("Connection error: %s", str(e))
-            last_cleanup_time = self.cleanup(last_cleanup_time, cleanup_frequency_minutes)
             time.sleep(loop_frequency_secs)
 
     # GENERAL
@@ -346,19 +372,38 @@ class LogLoop:
 
     def process_logs(self):
         started = time.perf_counter()
-        logs = self.rcon.get_structured_logs(since_min_ago=self.GET_LOGS_SINCE_MIN)
-        logger.info(
-            "RCON log fetch completed in %.3fs (%d logs)",
-            time.perf_counter() - started,
-            len(logs["logs"]),
-        )
+        if self.log_watermark_ms is None:
+            logs = self.rcon.iter_structured_logs(since_min_ago=self.GET_LOGS_SINCE_MIN)
+        else:
+            # Only ask for the time elapsed since the previous fetch, the
+            # overlap covers lines the server had not written yet back then
+            window_sec = started - self.last_log_fetch + self.LOG_FETCH_OVERLAP_SEC
+            logs = self.rcon.iter_structured_logs_since(self.log_watermark_ms, window_sec)
+        logger.info("RCON log fetch completed in %.3fs", time.perf_counter() - started)
+        self.last_log_fetch = started
         self.GET_LOGS_SINCE_MIN = 5
-        current_map = MapsHistory().get_current_map()
-        name_to_id = self._get_name_to_id(current_map) if current_map else {} 
-        for log in reversed(logs["logs"]):
-            line = self.record_line(log, name_to_id)
-            if line:
+        maps_history = MapsHistory()
+        current_map = maps_history.get_current_map()
+        name_to_id = (
+            self._get_name_to_id(
+                maps_history.get_player_stats(current_map, with_units=False)
+            )
+            if current_map
+            else {}
+        )
+
+        # Logs are parsed lazily, oldest first, a batch at a time so a long
+        # backfill never holds all of them at once
+        count = 0
+        for batch in batched(logs, self.LOG_BATCH_SIZE):
+            count += len(batch)
+            # Hooks run after the batch is cached, still in log order
+            for line in self.record_lines(list(batch), name_to_id, current_map):
                 self.process_hooks(line)
+            self.log_watermark_ms = max(
+                self.log_watermark_ms or 0, max(log["timestamp_ms"] for log in batch)
+            )
+        logger.info("Processed %d logs in %.3fs", count, time.perf_counter() - started)
 
     def get_detailed_players(self) -> GetDetailedPlayers:
         started = time.perf_counter()
@@ -420,7 +465,15 @@ class LogLoop:
         all_roles = {r.name.lower(): r.id for r in role_type.all()}
         all_teams = {t.name.lower(): t.id for t in team_type.all()}
 
-        map_cached_stats = current_map.setdefault("player_stats", dict())
+        # Without their units history, the units added are the new ones
+        maps_history = MapsHistory()
+        map_cached_stats = maps_history.get_player_stats(current_map, with_units=False)
+        cached_before = {
+            player_id: orjson.dumps(player_stats)
+            for player_id, player_stats in map_cached_stats.items()
+        }
+        # Stats still cached in the map entry are all moved, changed or not
+        moving_map_entry_stats = bool(current_map.get("player_stats"))
 
         # Compare cached player stats with live player stats
         # if player not online, append UNASSIGNED role
@@ -561,6 +614,19 @@ class LogLoop:
             map_cached_stats[player_id] = cached
             # logger.debug("Updated cached stats for player %s", current["name"])
 
+        # Only the players whose stats changed are written
+        maps_history.save_player_stats(
+            current_map,
+            {
+                player_id: player_stats
+                for player_id, player_stats in map_cached_stats.items()
+                if moving_map_entry_stats
+                or orjson.dumps(player_stats) != cached_before.get(player_id)
+            },
+        )
+        # Stats cached in the map entry were moved along
+        current_map["player_stats"] = {}
+
     def _is_log_player_related(self, log: StructuredLogLineWithMetaData) -> bool:
         return bool(log["player_id_1"] or log["player_id_2"] or log["player_name_1"] or log["player_name_2"])
 
@@ -574,12 +640,12 @@ class LogLoop:
         map_end = datetime.datetime.fromtimestamp(map["end"])
         return map_start <= log_time and log_time <= map_end
         
-    def _get_name_to_id(self, map: MapInfo) -> dict[str, str]:
+    def _get_name_to_id(self, player_stats: dict[str, PlayerStat]) -> dict[str, str]:
         # if one player with name 'foo' disconnects and another player with
         # the same name connects the online player takes preference
         # when name collision happens
         name_to_id: dict[str, str] = {}
-        for id, player in map["player_stats"].items():
+        for id, player in player_stats.items():
             for name in player["names"]:
                 existing_id = name_to_id.get(name)
                 if not existing_id:
@@ -592,70 +658,87 @@ class LogLoop:
         return name_to_id
 
     def record_line(self, log: StructuredLogLineWithMetaData, name_to_id: dict[str, str] = {}):
-        id_ = f"{log['timestamp_ms']}|{log['line_without_time']}"
-        if not self.red.sadd(self.duplicate_guard_key, id_):
-            # logger.debug("Skipping duplicate: %s", id_)
-            return None
+        recorded = self.record_lines([log], name_to_id)
+        return recorded[0] if recorded else None
+
+    def record_lines(
+        self,
+        logs: list[StructuredLogLineWithMetaData],
+        name_to_id: dict[str, str] = {},
+        current_map: MapInfo | None = None,
+    ) -> list[StructuredLogLineWithMetaData]:
+        """Cache new logs (oldest first) and return those that were not seen before
+
+        The whole batch costs a fixed number of redis round trips: one pipeline
+        for the duplicate guard, one read of the last cached line and one for
+        pushing the new lines.
+        """
+        if not logs:
+            return []
+
+        added = self.dedupe.add_logs(logs)
 
-        logger.info("Caching line: %s", id_)
         try:
             last_line = self.log_history[0]
         except IndexError:
             last_line = None
 
-        if not isinstance(last_line, dict):
-            logger.error("Can't check against last_line, invalid_format\nLast line: %s\nCurrent log: %s", last_line, log)
-        elif last_line and last_line["timestamp_ms"] > log["timestamp_ms"]:
-            logger.warning("Received old log record, ignoring\nLast line: %s\nCurrent log: %s", last_line, log)
-            return None
-
-        if self._is_log_player_related(log):
-            current_map = MapsHistory().get_current_map()
-            if current_map and self._is_log_from_map(log, current_map):
-                for slot in (1, 2):
-                    player_name: str | None = log.get(f"player_name_{slot}", None)
-                    player_id: str | None = log.get(f"player_id_{slot}", None)
-
-                    if not player_id and not player_name:
-                        continue
-                    
-                    if not player_id and player_name:
-                        # Let's try to backtrack the player_id from cached player stats(redis)
-                        player_id = name_to_id.get(player_name)
-                        if player_id:
-                            logger.debug("Updated player_id: %s by player_name: %s - %s", player_id, player_name, log["raw"])
-
-                    if not player_id:
-                        logger.info("Unable to link player %s to any player_id - %s", player_name, log)
-                        continue
-
-                    if player_name and player_id:
-                        prev_key = name_to_id.setdefault(player_name, player_id)
-                        if prev_key != player_id:
-                            logger.warning("This log potentialy belonging to 1 or more players\nName: %s, ID: %s, Log: %s", player_name, prev_key, log["raw"])
-                    log[f"player_id_{slot}"] = player_id
-                    
-        self.log_history.add(log)
-        return log
-
-    def cleanup(self, last_cleanup_time: datetime.datetime, cleanup_frequency_minutes: int) -> datetime.datetime:
-        now = datetime.datetime.now()
-        if (now - last_cleanup_time).total_seconds() < cleanup_frequency_minutes * 60:
-            return last_cleanup_time
-
-        logger.info("Starting cleanup")
-        for k in self.red.sscan_iter(self.duplicate_guard_key):
-            try:
-                ts, _ = k.decode().split("|", 1)
-            except ValueError:
-                logger.exception("Invalid key %s", k)
+        recorded: list[StructuredLogLineWithMetaData] = []
+        for log, is_new in zip(logs, added):
+            if not is_new:
+                # logger.debug("Skipping duplicate: %s", log_id(log))
+                continue
+
+            logger.info("Caching line: %s", log_id(log))
+            if not isinstance(last_line, Mapping):
+                logger.error("Can't check against last_line, invalid_format\nLast line: %s\nCurrent log: %s", last_line, log)
+            elif last_line and last_line["timestamp_ms"] > log["timestamp_ms"]:
+                logger.warning("Received old log record, ignoring\nLast line: %s\nCurrent log: %s", last_line, log)
+                continue
+
+            if self._is_log_player_related(log):
+                if current_map is None:
+                    current_map = MapsHistory().get_current_map()
+                if current_map and self._is_log_from_map(log, current_map):
+                    self._link_player_ids(log, name_to_id)
+
+            recorded.append(log)
+            last_line = log
+
+        ids = self.log_history.add_many(recorded)
+        self.log_index.add_logs(zip(ids, recorded))
+        return recorded
+
+    def ensure_log_index(self):
+        """Index the cached logs if they were not all indexed as they were added"""
+        oldest = self.log_history.entries_after(None, count=1)
+        if oldest and not self.log_index.covers(stream_id_sequence(oldest[0][0])):
+            logger.info("Logs history index is missing logs, rebuilding it")
+            self.log_index.rebuild()
+
+    def _link_player_ids(self, log: StructuredLogLineWithMetaData, name_to_id: dict[str, str]):
+        for slot in (1, 2):
+            player_name: str | None = log.get(f"player_name_{slot}", None)
+            player_id: str | None = log.get(f"player_id_{slot}", None)
+
+            if not player_id and not player_name:
                 continue
-            t = datetime.datetime.fromtimestamp(int(ts) / 1000)
-            if (datetime.datetime.now() - t).total_seconds() > self.CLEANUP_MIN * 60:
-                logger.debug("Older than %d min, removing: %s", self.CLEANUP_MIN, k)
-                self.red.srem(self.duplicate_guard_key, k)
-        logger.info("Cleanup done")
-        return now
+            
+            if not player_id and player_name:
+                # Let's try to backtrack the player_id from cached player stats(redis)
+                player_id = name_to_id.get(player_name)
+                if player_id:
+                    logger.debug("Updated player_id: %s by player_name: %s - %s", player_id, player_name, log["raw"])
+
+            if not player_id:
+                logger.info("Unable to link player %s to any player_id - %s", player_name, log)
+                continue
+
+            if player_name and player_id:
+                prev_key = name_to_id.setdefault(player_name, player_id)
+                if prev_key != player_id:
+                    logger.warning("This log potentialy belonging to 1 or more players\nName: %s, ID: %s, Log: %s", player_name, prev_key, log["raw"])
+            log[f"player_id_{slot}"] = player_id
 
     def process_hooks(self, log: StructuredLogLineWithMetaData):
         logger.debug("Processing %s", f"{log['action']} | {log['message']}")
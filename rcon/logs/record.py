@@ -0,0 +1,225 @@
+"""Compact in-memory representation of a parsed log line
+
+A `LogRecord` holds the same data as `StructuredLogLineWithMetaData` with
+`__slots__` instead of a dict: `raw` and `event_time` are derived from the other
+fields instead of being stored, and the few distinct actions, weapons and player
+names are shared between records instead of being copied in each of them.
+
+It behaves as a read only mapping (plus item assignment of the existing keys)
+so code written against the dict works unchanged. Use `to_dict` where the log
+leaves the process (API responses, JSON), orjson can't serialize it as is.
+"""
+
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Any, Iterator
+
+import orjson
+
+from rcon.types import StructuredLogLineWithMetaData
+
+LOG_KEYS = tuple(StructuredLogLineWithMetaData.__annotations__)
+_LOG_KEY_SET = frozenset(LOG_KEYS)
+
+# Shared copies of the repeated strings, bounded since player names are not
+_INTERNED_MAX_SIZE = 50_000
+_interned: dict[str, str] = {}
+
+
+def _intern(value: str | None) -> str | None:
+    if value is None:
+        return None
+    try:
+        return _interned[value]
+    except KeyError:
+        if len(_interned) >= _INTERNED_MAX_SIZE:
+            _interned.clear()
+        _interned[value] = value
+        return value
+
+
+class LogRecord(Mapping):
+    __slots__ = (
+        "version",
+        "timestamp_ms",
+        "relative_time_ms",
+        "raw_prefix",
+        "line_without_time",
+        "action",
+        "player_name_1",
+        "player_id_1",
+        "player_name_2",
+        "player_id_2",
+        "weapon",
+        "message",
+        "sub_content",
+        # Only set when they can't be derived from the other fields
+        "_raw",
+        "_event_time",
+    )
+
+    def __init__(
+        self,
+        version: int,
+        timestamp_ms: int,
+        relative_time_ms: float | None,
+        raw_prefix: str,
+        line_without_time: str,
+        action: str,
+        player_name_1: str | None,
+        player_id_1: str | None,
+        player_name_2: str | None,
+        player_id_2: str | None,
+        weapon: str | None,
+        message: str,
+        sub_content: str | None,
+        _raw: str | None = None,
+        _event_time: datetime | None = None,
+    ) -> None:
+        self.version = version
+        self.timestamp_ms = timestamp_ms
+        self.relative_time_ms = relative_time_ms
+        self.raw_prefix = raw_prefix
+        self.line_without_time = line_without_time
+        self.action = _intern(action)
+        self.player_name_1 = _intern(player_name_1)
+        self.player_id_1 = _intern(player_id_1)
+        self.player_name_2 = _intern(player_name_2)
+        self.player_id_2 = _intern(player_id_2)
+        self.weapon = _intern(weapon)
+        self.message = message
+        self.sub_content = sub_content
+        self._raw = _raw
+        self._event_time = _event_time
+
+    @property
+    def raw(self) -> str:
+        if self._raw is not None:
+            return self._raw
+        return self.raw_prefix + self.line_without_time
+
+    @property
+    def event_time(self) -> datetime:
+        if self._event_time is not None:
+            return self._event_time
+        return datetime.fromtimestamp(self.timestamp_ms // 1000)
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _LOG_KEY_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key == "raw":
+            self._raw = value
+        elif key == "event_time":
+            self._event_time = value
+        elif key in _LOG_KEY_SET:
+            if key == "line_without_time" and self._raw is None:
+                self._raw = self.raw
+            setattr(self, key, value)
+        else:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(LOG_KEYS)
+
+    def __len__(self) -> int:
+        return len(LOG_KEYS)
+
+    def __repr__(self) -> str:
+        return f"LogRecord({self.raw!r})"
+
+    @classmethod
+    def from_dict(cls, log: Mapping[str, Any]) -> "LogRecord":
+        timestamp_ms = int(log["timestamp_ms"])
+        raw = log.get("raw") or ""
+        line = log.get("line_without_time")
+        if line is not None and raw.endswith(line):
+            raw_prefix, raw_override = raw[: len(raw) - len(line)], None
+        else:
+            raw_prefix, raw_override = "", raw
+            line = line or ""
+
+        event_time = log.get("event_time")
+        if event_time == datetime.fromtimestamp(timestamp_ms // 1000):
+            event_time = None
+
+        return cls(
+            log.get("version", 1),
+            timestamp_ms,
+            log.get("relative_time_ms"),
+            raw_prefix,
+            line,
+            log.get("action"),
+            log.get("player_name_1"),
+            log.get("player_id_1"),
+            log.get("player_name_2"),
+            log.get("player_id_2"),
+            log.get("weapon"),
+            log.get("message"),
+            log.get("sub_content"),
+            raw_override,
+            event_time,
+        )
+
+    def to_dict(self) -> StructuredLogLineWithMetaData:
+        return {
+            "version": self.version,
+            "timestamp_ms": self.timestamp_ms,
+            "event_time": self.event_time,
+            "relative_time_ms": self.relative_time_ms,
+            "raw": self.raw,
+            "line_without_time": self.line_without_time,
+            "action": self.action,
+            "player_name_1": self.player_name_1,
+            "player_id_1": self.player_id_1,
+            "player_name_2": self.player_name_2,
+            "player_id_2": self.player_id_2,
+            "weapon": self.weapon,
+            "message": self.message,
+            "sub_content": self.sub_content,
+        }
+
+    def to_compact(self) -> list[Any]:
+        """The fields as a JSON array, in `__init__` order"""
+        compact = [
+            self.version,
+            self.timestamp_ms,
+            self.relative_time_ms,
+            self.raw_prefix,
+            self.line_without_time,
+            self.action,
+            self.player_name_1,
+            self.player_id_1,
+            self.player_name_2,
+            self.player_id_2,
+            self.weapon,
+            self.message,
+            self.sub_content,
+        ]
+        if self._raw is not None or self._event_time is not None:
+            compact.append(self._raw)
+            compact.append(self._event_time and self._event_time.isoformat())
+        return compact
+
+    @classmethod
+    def from_compact(cls, compact: list[Any]) -> "LogRecord":
+        if len(compact) > 14 and compact[14] is not None:
+            compact[14] = datetime.fromisoformat(compact[14])
+        return cls(*compact)
+
+
+def log_to_dict(
+    log: LogRecord | StructuredLogLineWithMetaData,
+) -> StructuredLogLineWithMetaData:
+    """The dict form of a log, whether it is a record or already a dict"""
+    if isinstance(log, LogRecord):
+        return log.to_dict()
+    return log
+
+
+def serialize_log(log: LogRecord | StructuredLogLineWithMetaData) -> bytes:
+    if isinstance(log, LogRecord):
+        return orjson.dumps(log.to_compact())
+    return orjson.dumps(log)
@@ -2,6 +2,7 @@ import datetime
 import logging
 import os
 import time
+from collections.abc import Mapping
 from typing import Callable, Iterable
 
 from sqlalchemy import desc
@@ -14,19 +15,75 @@ from rcon.logs.loop import LogLoop
 from rcon.models import LogLine, PlayerID, enter_session
 from rcon.player_history import _get_set_player
 from rcon.types import StructuredLogLineWithMetaData
-from rcon.utils import get_server_number
+from rcon.utils import LogsHistory, StreamID, get_server_number
 
 logger = logging.getLogger(__name__)
 
+# Consumer group of the logs history, logs are acknowledged once stored in the database
+RECORDER_GROUP = "log_recorder"
+RECORDER_CONSUMER = "recorder"
+CHUNK_SIZE = 5000
+
+
 class LogRecorder:
-    def __init__(self, dump_frequency_seconds=10, log_history_fn: Callable[[], Iterable[StructuredLogLineWithMetaData]] = LogLoop.get_log_history_list):
+    def __init__(
+        self,
+        dump_frequency_seconds=10,
+        log_history_fn: Callable[
+            [], Iterable[StructuredLogLineWithMetaData]
+        ] = LogLoop.get_log_history_list,
+        chunk_size=CHUNK_SIZE,
+    ):
         self.dump_frequency_seconds = dump_frequency_seconds
         self.server_id = get_server_number()
         self.log_history_fn = log_history_fn
+        self.chunk_size = chunk_size
+        # To acknowledge once the logs returned by _get_new_logs are committed
+        self._to_ack: tuple[LogsHistory, list[StreamID]] | None = None
+        # Where to create the consumer group once the scanned logs are committed
+        self._group_start: tuple[LogsHistory, StreamID] | None = None
+        self._has_more = False
         if not self.server_id:
             raise ValueError("SERVER_NUMBER is not set, can't record logs")
 
-    def _get_new_logs(self, sess: Session):
+    def _get_new_logs(self, sess: Session) -> list[StructuredLogLineWithMetaData]:
+        self._to_ack = None
+        self._group_start = None
+        self._has_more = False
+        history = self.log_history_fn()
+        if not isinstance(history, LogsHistory):
+            return self._scan_new_logs(sess, history)
+
+        if history.has_group(RECORDER_GROUP):
+            entries = history.read_group(
+                RECORDER_GROUP, RECORDER_CONSUMER, self.chunk_size
+            )
+            self._to_ack = (history, [id_ for id_, _ in entries])
+            self._has_more = len(entries) == self.chunk_size
+            return [log for _, log in entries]
+
+        # No consumer group (first run or history flushed): find the last stored
+        # log in the whole history. Logs added while scanning are read again
+        # next time, the database ignores the duplicates.
+        logger.info(
+            "No %s consumer group on the logs history, resyncing", RECORDER_GROUP
+        )
+        self._group_start = (history, history.last_id() or "0")
+        return self._scan_new_logs(sess, history)
+
+    def _acknowledge(self):
+        if self._group_start is not None:
+            history, start_id = self._group_start
+            history.ensure_group(RECORDER_GROUP, start_id)
+        if self._to_ack is not None:
+            history, ids = self._to_ack
+            history.ack(RECORDER_GROUP, ids)
+        self._to_ack = None
+        self._group_start = None
+
+    def _scan_new_logs(
+        self, sess: Session, history: Iterable[StructuredLogLineWithMetaData]
+    ):
         to_store: list[StructuredLogLineWithMetaData] = []
         last_log = (
             sess.query(LogLine)
@@ -37,8 +94,8 @@ class LogRecorder:
         )
         logger.info("Getting new logs from %s", last_log.event_time if last_log else 0)
         log: StructuredLogLineWithMetaData
-        for log in self.log_history_fn():
-            if not isinstance(log, dict):
+        for log in history:
+            if not isinstance(log, Mapping):
                 logger.warning("Log is invalid, not a dict: %s", log)
                 continue
             if last_log and int(log["timestamp_ms"]) / 1000 == last_log.event_time.timestamp() and '] ' + log["line_without_time"] in last_log.raw:
@@ -133,12 +190,17 @@ class LogRecorder:
                 logger.debug("Not due for recording yet")
                 time.sleep(5)
                 continue
-            with enter_session() as sess:
-                to_store = self._get_new_logs(sess)
-                logger.info("%s log lines to record", len(to_store))
-
-                self._save_logs(sess, to_store)
-
-                last_run = datetime.datetime.now()
+            while True:
+                with enter_session() as sess:
+                    to_store = self._get_new_logs(sess)
+                    logger.info("%s log lines to record", len(to_store))
+
+                    self._save_logs(sess, to_store)
+                # Only acknowledge the logs once they are committed
+                self._acknowledge()
+                if not self._has_more:
+                    break
+
+            last_run = datetime.datetime.now()
             if one_off:
                 break
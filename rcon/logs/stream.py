@@ -1,117 +1,120 @@
-import datetime
+import asyncio
 import logging
-import time
-from collections import defaultdict
 
-import redis
+import orjson
 
-from rcon.cache_utils import get_redis_client
-from rcon.rcon import Rcon, get_rcon
+from rcon.logs.record import log_to_dict
 from rcon.types import StructuredLogLineWithMetaData
 from rcon.user_config.log_stream import LogStreamUserConfig
-from rcon.utils import Stream, StreamOlderElement, StreamID, StreamNoElements
+from rcon.utils import LogsHistory, StreamID
 
 logger = logging.getLogger(__name__)
 
-class LogStream:
-    # Each CRCON uses its own redis database, no need for keys to be unique across servers
-    def __init__(
-            self,
-            rcon: Rcon | None = None,
-            red: redis.StrictRedis | None = None,
-            key="log_stream",
-            maxlen: int | None = None,
-    ) -> None:
-        config = LogStreamUserConfig.load_from_db()
-        self.rcon = rcon or get_rcon()
-        self.red = red or get_redis_client()
-        self.log_history_key = key
-        self.log_stream = Stream(key=key, maxlen=maxlen or config.stream_size)
-
-    def clear(self):
-        logger.info("Clearing stream")
-        self.red.delete(self.log_history_key)
-
-    def bucket_by_timestamp(self, logs: list[StructuredLogLineWithMetaData]):
-        """Organize logs by their game server timestamp
-
-        Redis streams must be in sequential order, we use custom keys that are the
-        unix timestamp of the time the log occurred on the game server, but each
-        timestamp can have multiple logs.
-
-        Return each unique timestamp and the logs that occured at that time
-        """
-        # logs has the newest logs first, oldest last
-        buckets: dict[datetime.datetime, list[StructuredLogLineWithMetaData]] = (
-            defaultdict(list)
-        )
-
-        ordered_logs: list[
-            tuple[datetime.datetime, list[StructuredLogLineWithMetaData]]
-        ] = []
-
-        for log in reversed(logs):
-            timestamp = datetime.datetime.fromtimestamp(log["timestamp_ms"] / 1000)
-            buckets[timestamp].append(log)
+# Batches of new logs, None once the log stream is disabled
+LogsBatch = list[tuple[StreamID, StructuredLogLineWithMetaData]] | None
 
-        for timestamp in buckets.keys():
-            ordered_logs.append((timestamp, buckets[timestamp]))
+_FANOUT: "LogStreamFanout | None" = None
 
-        return ordered_logs
+class LogStream:
+    """Live logs for the log stream websocket, read from the logs history
 
-    def run(
-            self,
-            loop_frequency_secs: int | None = None,
-            initial_since_min: int | None = None,
-            active_since_min: int | None = None,
-    ):
-        """Poll the game server and add new logs to the stream"""
+    The logs history is a redis stream cached by the log loop, the IDs it
+    returns are the history IDs.
+    """
 
+    def __init__(self, maxlen: int | None = None) -> None:
         config = LogStreamUserConfig.load_from_db()
+        self.log_history = LogsHistory()
+        self.maxlen = maxlen or config.stream_size
 
-        since_min = initial_since_min or config.startup_since_mins
-        logs = self.rcon.get_structured_logs(since_min_ago=since_min)["logs"]
-        since_min = active_since_min or config.refresh_since_mins
+    def logs_since(
+            self,
+            last_seen: StreamID | None = None,
+            block_ms=500,
+            count: int | None = None,
+    ) -> list[tuple[StreamID, StructuredLogLineWithMetaData]]:
+        """Return a list of logs more recent than the last_seen ID
 
-        last_seen_id = None
-        while True:
-            config = LogStreamUserConfig.load_from_db()
+        At most `count` logs (the configured stream size by default) are
+        returned at once. Logs are converted to their JSON form.
+        """
+        if last_seen is None:
+            logs = self.log_history.range(count=1, newest_first=True)
+        else:
+            logs = self.log_history.read(
+                last_id=last_seen, count=count or self.maxlen, block_ms=block_ms
+            )
+        return [(id_, orjson.loads(orjson.dumps(log_to_dict(log)))) for id_, log in logs]
+
+
+class LogStreamFanout:
+    """Reads the new logs once per process for all the log stream websockets
+
+    Every subscriber gets a queue that each batch of new logs is put in, the
+    reader runs while there are subscribers.
+    """
+
+    def __init__(self, log_stream_fn=LogStream, block_ms=500) -> None:
+        self.log_stream_fn = log_stream_fn
+        self.block_ms = block_ms
+        self._log_stream: LogStream | None = None
+        self._queues: set[asyncio.Queue[LogsBatch]] = set()
+        self._task: asyncio.Task | None = None
+
+    def _get_log_stream(self) -> LogStream:
+        if self._log_stream is None:
+            self._log_stream = self.log_stream_fn()
+        return self._log_stream
+
+    def subscribe(self) -> asyncio.Queue[LogsBatch]:
+        """Return a queue of the logs added from now on"""
+        queue: asyncio.Queue[LogsBatch] = asyncio.Queue()
+        self._queues.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue[LogsBatch]) -> None:
+        self._queues.discard(queue)
+
+    async def logs_since(
+        self, last_seen: StreamID | None, count: int | None = None
+    ) -> list[tuple[StreamID, StructuredLogLineWithMetaData]]:
+        """The logs after last_seen without waiting, to catch up before reading a queue"""
+        log_stream = await asyncio.to_thread(self._get_log_stream)
+        return await asyncio.to_thread(log_stream.logs_since, last_seen, None, count)
+
+    def _publish(self, batch: LogsBatch) -> None:
+        for queue in self._queues:
+            queue.put_nowait(batch)
+
+    async def _run(self) -> None:
+        log_stream = await asyncio.to_thread(self._get_log_stream)
+        last_id = await asyncio.to_thread(log_stream.log_history.last_id) or "0-0"
+        while self._queues:
+            config = await asyncio.to_thread(LogStreamUserConfig.load_from_db)
             if not config.enabled:
-                break
-            ordered_logs = self.bucket_by_timestamp(logs)
-            new_logs = 0
-            for timestamp, log_bucket in ordered_logs:
-                for idx, log in enumerate(log_bucket):
-                    timestamp_ms = log["timestamp_ms"] // 1000
-                    stream_id = f"{timestamp_ms}-{idx}"
-                    try:
-                        last_seen_id = self.log_stream.add(custom_id=stream_id, obj=log)
-                        new_logs += 1
-                    except StreamOlderElement:
-                        continue
-
-            if new_logs:
-                logger.info(f"Added {new_logs} new logs {last_seen_id=}")
-            time.sleep(loop_frequency_secs or config.refresh_frequency_sec)
-            logs = self.rcon.get_structured_logs(since_min_ago=since_min)["logs"]
+                self._publish(None)
+                self._queues.clear()
+                return
 
-    def logs_since(
-            self, last_seen: StreamID | None = None, block_ms=500
-    ) -> list[tuple[StreamID, StructuredLogLineWithMetaData]]:
-        """Return a list of logs more recent than the last_seen ID"""
-        try:
-            if last_seen is None:
-                logs: list[tuple[StreamID, StructuredLogLineWithMetaData]] = []
-                tail_log: tuple[StreamID, StructuredLogLineWithMetaData] = (
-                    self.log_stream.tail()
-                )
-                if tail_log:
-                    logs.append(tail_log)
-            else:
-                logs: list[tuple[StreamID, StructuredLogLineWithMetaData]] = (
-                    self.log_stream.read(last_id=last_seen, block_ms=block_ms)
+            try:
+                logs = await asyncio.to_thread(
+                    log_stream.logs_since, last_id, self.block_ms
                 )
-            return logs
-        except StreamNoElements:
-            response: list[tuple[StreamID, StructuredLogLineWithMetaData]] = []
-            return response
+            except Exception:
+                logger.exception("Unable to read the logs history")
+                await asyncio.sleep(1)
+                continue
+
+            if logs:
+                last_id = logs[-1][0]
+                self._publish(logs)
+
+
+def get_log_stream_fanout() -> LogStreamFanout:
+    """Singleton instance of the log stream reader of this process"""
+    global _FANOUT
+    if _FANOUT is None:
+        _FANOUT = LogStreamFanout()
+    return _FANOUT
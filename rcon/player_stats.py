@@ -1,10 +1,13 @@
+import copy
 import datetime
 import logging
 import os
 import pickle
 import re
 import time
-from dataclasses import dataclass
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field
 from typing import Callable, Iterable, Mapping, TypeAlias, TypedDict
 
 from hllrcon import HLLTeam
@@ -30,34 +33,42 @@ from rcon.types import (
     StructuredLogLineWithMetaData,
 )
 from rcon.user_config.rcon_server_settings import RconServerSettingsUserConfig
-from rcon.utils import MapsHistory, get_default_player_stats
+from rcon.utils import (
+    LogsHistory,
+    MapsHistory,
+    StreamID,
+    get_default_player_stats,
+    stream_id_sequence,
+)
 
 logger = logging.getLogger(__name__)
 
 PLAYER_ID = "player_id"
 NAME_KEY_PREFIX = "name:"
+# Stats accumulated from the logs history, kept a bit longer than the longest match
+LIVE_STATS_STATE_KEY = "LIVE_STATS:state"
+LIVE_GAME_STATS_STATE_KEY = "LIVE_GAME_STATS:state"
+LIVE_STATS_STATE_TTL_SEC = 3 * 60 * 60
+LIVE_STATS_BATCH_SIZE = 5000
 
 class PlayerSessions(TypedDict):
     start: list[datetime.datetime]
     end: list[datetime.datetime]
     total: int
 
-def update_player_name_map(
-    id_to_name: dict[str, str],
-    player_id: str | None,
-    player_name: str | None,
-) -> None:
-    if player_id and player_name:
-        id_to_name[player_id] = player_name
-
-
 def is_same_log_player(
     player: GetPlayersType,
     log: StructuredLogLineWithMetaData,
     slot: int,
 ) -> bool:
-    log_id = log.get(f"player_id_{slot}")
-    log_name = log.get(f"player_name_{slot}")
+    return is_same_player(
+        player, log.get(f"player_id_{slot}"), log.get(f"player_name_{slot}")
+    )
+
+
+def is_same_player(
+    player: GetPlayersType, log_id: str | None, log_name: str | None
+) -> bool:
     player_id = player.get(PLAYER_ID)
     if player_id and log_id:
         return player_id == log_id
@@ -71,6 +82,82 @@ class Streaks:
     teamkills: int = 0
     deaths_by_tk: int = 0
 
+
+@dataclass
+class PlayerStatsAccumulator:
+    player: GetPlayersType
+    stats: PlayerStatsType
+    streaks: Streaks = field(default_factory=Streaks)
+
+
+@dataclass
+class LogStatsAccumulator:
+    """Players stats folded from the logs history one new log at a time
+
+    `since_ms` is the oldest log considered and `last_id` the history ID of
+    the last log folded in, the next refresh only reads the logs after it.
+    """
+
+    since_ms: int
+    last_id: StreamID | None = None
+    players: dict[str, PlayerStatsAccumulator] = field(default_factory=dict)
+    sessions: dict[str, PlayerSessions] = field(default_factory=dict)
+    name_to_id: dict[str, str] = field(default_factory=dict)
+
+    def reset(self):
+        self.last_id = None
+        self.players.clear()
+        self.sessions.clear()
+
+class LogColumns:
+    """The player related logs of a time window, stored column by column
+
+    Strings are interned: the columns hold their index in `values`, 0 being
+    None. `rows_by_player` lists the rows of each player in log order, a log
+    is listed twice for a player found in both slots.
+    """
+
+    def __init__(self) -> None:
+        self.values: list[str | None] = [None]
+        self._codes: dict[str | None, int] = {None: 0}
+        self.timestamp_ms = array("q")
+        self.action = array("I")
+        self.player_id_1 = array("I")
+        self.player_id_2 = array("I")
+        self.player_name_1 = array("I")
+        self.player_name_2 = array("I")
+        self.weapon = array("I")
+        # Only the votes need their raw line
+        self.vote_raw: dict[int, str] = {}
+        self.rows_by_player: dict[str, array] = {}
+
+    def __len__(self) -> int:
+        return len(self.timestamp_ms)
+
+    def code(self, value: str | None) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def append(self, log: StructuredLogLineWithMetaData) -> int:
+        row = len(self.timestamp_ms)
+        self.timestamp_ms.append(int(log["timestamp_ms"]))
+        self.action.append(self.code(log["action"]))
+        self.player_id_1.append(self.code(log.get("player_id_1")))
+        self.player_id_2.append(self.code(log.get("player_id_2")))
+        self.player_name_1.append(self.code(log.get("player_name_1")))
+        self.player_name_2.append(self.code(log.get("player_name_2")))
+        self.weapon.append(self.code(log.get("weapon")))
+        if log["action"] == AllLogTypes.vote:
+            self.vote_raw[row] = log["raw"]
+        return row
+
+    def add_player_row(self, player_key: str, row: int) -> None:
+        self.rows_by_player.setdefault(player_key, array("I")).append(row)
+
+
 StatsUpdateHandler: TypeAlias = Callable[
     [PlayerStatsType, GetPlayersType, StructuredLogLineWithMetaData], None
 ]
@@ -118,18 +205,8 @@ class BaseStats:
         for player in list(unique_players_by_id.values()) + legacy_name_only_players:
             logger.debug("Crunching stats for %s", player)
 
-            profile = profiles_by_id.get(player.get(PLAYER_ID))
-            soldier = profile.soldier if profile else None
-
-            # Initialise stats and populate them with values based on player's profile and session
-            player_stats = PlayerStatsType(get_default_player_stats())
-            player_stats.update(
-                player=player["name"],
-                player_id=player["player_id"],
-                platform=player.get("platform") or (soldier.platform if soldier else None),
-                steaminfo=profile.steaminfo.to_dict() if profile and profile.steaminfo else None,
-                last_spawn=self._get_player_first_appearance(player),
-                time_seconds=int(self._get_player_session_time(player)),
+            player_stats = self._initial_player_stats(
+                player, profiles_by_id.get(player.get(PLAYER_ID))
             )
 
             # Update stats based on game logs
@@ -146,6 +223,113 @@ class BaseStats:
 
         return stats_by_player
 
+    def get_stats_by_player_from_columns(
+        self,
+        columns: LogColumns,
+        players: list[GetPlayersType],
+        profiles_by_id: dict[str, PlayerProfileType],
+    ) -> dict[str, PlayerStatsType]:
+        """Same as `get_stats_by_player` with the logs stored as columns
+
+        The kills and deaths are counted straight from the columns, without
+        building a log for them, the rates are computed once per player.
+        """
+        unique_players_by_id: dict[str, GetPlayersType] = {}
+        legacy_name_only_players: list[GetPlayersType] = []
+        for p in players:
+            pid = p.get(PLAYER_ID)
+            if pid:
+                unique_players_by_id[pid] = p
+            else:
+                legacy_name_only_players.append(p)
+
+        stats_by_player: dict[str, PlayerStatsType] = {}
+        for player in list(unique_players_by_id.values()) + legacy_name_only_players:
+            player_stats = self._initial_player_stats(
+                player, profiles_by_id.get(player.get(PLAYER_ID))
+            )
+            rows = columns.rows_by_player.get(player["player_id"])
+            if rows:
+                self._add_columns_stats(player_stats, player, columns, rows)
+                self._calc_computed_stats(player_stats)
+
+            pid_key = player.get("player_id") or player.get("name")
+            stats_by_player[pid_key] = player_stats
+
+        return stats_by_player
+
+    def _initial_player_stats(
+        self, player: GetPlayersType, profile: PlayerProfileType | None
+    ) -> PlayerStatsType:
+        """Stats populated with values based on player's profile and session"""
+        soldier = profile.soldier if profile else None
+        player_stats = PlayerStatsType(get_default_player_stats())
+        player_stats.update(
+            player=player["name"],
+            player_id=player["player_id"],
+            platform=player.get("platform") or (soldier.platform if soldier else None),
+            steaminfo=profile.steaminfo.to_dict() if profile and profile.steaminfo else None,
+            last_spawn=self._get_player_first_appearance(player),
+            time_seconds=int(self._get_player_session_time(player)),
+        )
+        return player_stats
+
+    def _add_columns_stats(
+        self,
+        stats: PlayerStatsType,
+        player: GetPlayersType,
+        columns: LogColumns,
+        rows: array,
+    ) -> None:
+        c = columns
+        values = c.values
+        kill, team_kill = c.code(AllLogTypes.kill), c.code(AllLogTypes.team_kill)
+        streaks = Streaks()
+        not_player = Counter()
+        for row in rows:
+            action = c.action[row]
+            is_kill = is_death = False
+            if action == kill or action == team_kill:
+                killer_id = values[c.player_id_1[row]]
+                victim_id = values[c.player_id_2[row]]
+                is_kill = is_same_player(
+                    player, killer_id, values[c.player_name_1[row]]
+                )
+                is_death = is_same_player(
+                    player, victim_id, values[c.player_name_2[row]]
+                )
+                if action == kill:
+                    if not self._count_kd("kills", "deaths", stats, is_kill, is_death):
+                        not_player["kills"] += 1
+                    self._count_weapons(
+                        stats,
+                        is_kill,
+                        is_death,
+                        values[c.weapon[row]],
+                        killer_id,
+                        victim_id,
+                    )
+                elif not self._count_kd(
+                    "teamkills", "deaths_by_tk", stats, is_kill, is_death
+                ):
+                    not_player["teamkills"] += 1
+            elif values[action] in self._stat_handlers:
+                # Only the votes are left, they need their raw line
+                self._process_log(
+                    stats, player, {"action": values[action], "raw": c.vote_raw.get(row)}
+                )
+            self._update_streaks(
+                stats, streaks, values[action], is_kill, is_death, c.timestamp_ms[row]
+            )
+
+        for key, count in not_player.items():
+            logger.warning(
+                "%s %s log lines do not belong to player '%s'",
+                count,
+                key,
+                player["name"],
+            )
+
     # STATS PROCESSORS
     def _process_log(
         self,
@@ -173,28 +357,47 @@ class BaseStats:
         streaks: Streaks,
         ) -> None:
         action = log["action"]
+        is_kd = action in (AllLogTypes.kill, AllLogTypes.team_kill)
+        self._update_streaks(
+            stats,
+            streaks,
+            action,
+            is_kd and self._is_player_kill(player, log),
+            is_kd and self._is_player_death(player, log),
+            log["timestamp_ms"],
+        )
 
-        log_time = datetime.datetime.fromtimestamp(log["timestamp_ms"] / 1000)
+    def _update_streaks(
+        self,
+        stats: PlayerStatsType,
+        streaks: Streaks,
+        action: str,
+        is_kill: bool,
+        is_death: bool,
+        timestamp_ms: int,
+    ) -> None:
         if action == AllLogTypes.kill:
-            if self._is_player_kill(player, log):
+            if is_kill:
                 streaks.kill += 1
                 streaks.death = 0
                 streaks.teamkills = 0
-            elif self._is_player_death(player, log):
+            elif is_death:
                 streaks.kill = 0
                 streaks.deaths_by_tk = 0
                 streaks.death += 1
-                self._process_death_time(log_time, stats)
+                self._process_death_time(self._log_time(timestamp_ms), stats)
         if action == AllLogTypes.team_kill:
-            if self._is_player_kill(player, log):
+            if is_kill:
                 streaks.teamkills += 1
-            if self._is_player_death(player, log):
+            if is_death:
                 streaks.deaths_by_tk += 1
-                self._process_death_time(log_time, stats)
+                self._process_death_time(self._log_time(timestamp_ms), stats)
         if action == AllLogTypes.connected:
-            stats["last_spawn"] = log_time
+            stats["last_spawn"] = self._log_time(timestamp_ms)
         if action == AllLogTypes.disconnected:
-            self._process_death_time(log_time, stats, save_spawn=False)
+            self._process_death_time(
+                self._log_time(timestamp_ms), stats, save_spawn=False
+            )
 
         stats["kills_streak"] = max(streaks.kill, stats["kills_streak"])
         stats["deaths_without_kill_streak"] = max(
@@ -208,18 +411,14 @@ class BaseStats:
     # LOG HANDLERS
     def _add_kill_handler(self, stats: PlayerStatsType, player: GetPlayersType, log: StructuredLogLineWithMetaData):
         self._add_kd("kills", "deaths", stats, player, log)
-        if self._is_player_kill(player, log):
-            stats["weapons"][log["weapon"]] = stats["weapons"].get(log["weapon"], 0) + 1
-            stats["most_killed"][log["player_id_2"]] = (
-                stats["most_killed"].get(log["player_id_2"], 0) + 1
-            )
-        if self._is_player_death(player, log):
-            stats["death_by_weapons"][log["weapon"]] = (
-                stats["death_by_weapons"].get(log["weapon"], 0) + 1
-            )
-            stats["death_by"][log["player_id_1"]] = (
-                stats["death_by"].get(log["player_id_1"], 0) + 1
-            )
+        self._count_weapons(
+            stats,
+            self._is_player_kill(player, log),
+            self._is_player_death(player, log),
+            log["weapon"],
+            log["player_id_1"],
+            log["player_id_2"],
+        )
 
     def _add_tk_handler(self, stats: PlayerStatsType, player: GetPlayersType, log: StructuredLogLineWithMetaData):
         self._add_kd("teamkills", "deaths_by_tk", stats, player, log)
@@ -265,19 +464,133 @@ class BaseStats:
         if save_spawn:
             stats["last_spawn"] = log_time
 
+    def _log_time(self, timestamp_ms: int) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(timestamp_ms / 1000)
+
     def _add_kd(self, attacker_key, victim_key, stats, player, log: StructuredLogLineWithMetaData):
-        if self._is_player_kill(player, log):
-            stats[attacker_key] += 1
-        elif self._is_player_death(player, log):
-            stats[victim_key] += 1
-        else:
+        if not self._count_kd(
+            attacker_key,
+            victim_key,
+            stats,
+            self._is_player_kill(player, log),
+            self._is_player_death(player, log),
+        ):
             logger.warning(
                 "Log line does not belong to player '%s' line: '%s'",
                 player["name"],
                 log["raw"],
             )
 
+    def _count_kd(
+        self, attacker_key, victim_key, stats, is_kill: bool, is_death: bool
+    ) -> bool:
+        """Count the kill or death of the player, False if the log is neither"""
+        if is_kill:
+            stats[attacker_key] += 1
+        elif is_death:
+            stats[victim_key] += 1
+        else:
+            return False
+        return True
+
+    def _count_weapons(
+        self,
+        stats: PlayerStatsType,
+        is_kill: bool,
+        is_death: bool,
+        weapon: str,
+        killer_id: str,
+        victim_id: str,
+    ) -> None:
+        if is_kill:
+            stats["weapons"][weapon] = stats["weapons"].get(weapon, 0) + 1
+            stats["most_killed"][victim_id] = stats["most_killed"].get(victim_id, 0) + 1
+        if is_death:
+            stats["death_by_weapons"][weapon] = (
+                stats["death_by_weapons"].get(weapon, 0) + 1
+            )
+            stats["death_by"][killer_id] = stats["death_by"].get(killer_id, 0) + 1
+
+    # ACCUMULATORS
+    def fold_new_logs(
+        self,
+        acc: LogStatsAccumulator,
+        history: LogsHistory,
+        batch_size=LIVE_STATS_BATCH_SIZE,
+    ) -> int:
+        """Fold the logs cached since the previous call into `acc`, return how many"""
+        last_id = history.last_id()
+        if acc.last_id and (
+            last_id is None
+            or stream_id_sequence(last_id) < stream_id_sequence(acc.last_id)
+        ):
+            logger.warning("Logs history was reset, accumulating stats from scratch")
+            acc.reset()
+
+        count = 0
+        while True:
+            if acc.last_id is None:
+                entries = history.range(since_ms=acc.since_ms, count=batch_size)
+            else:
+                entries = history.entries_after(acc.last_id, count=batch_size)
+            for id_, log in entries:
+                if log["timestamp_ms"] >= acc.since_ms:
+                    self._fold_log(acc, log)
+                acc.last_id = id_
+            count += len(entries)
+            if len(entries) < batch_size:
+                return count
+
+    def _new_player_accumulator(
+        self, player: GetPlayersType, last_spawn: datetime.datetime | None
+    ) -> PlayerStatsAccumulator:
+        stats = PlayerStatsType(get_default_player_stats())
+        stats.update(
+            player=player["name"],
+            player_id=player["player_id"],
+            last_spawn=last_spawn,
+        )
+        return PlayerStatsAccumulator(player=player, stats=stats)
+
+    def _fold_player_log(
+        self, player_acc: PlayerStatsAccumulator, log: StructuredLogLineWithMetaData
+    ) -> None:
+        self._process_log(player_acc.stats, player_acc.player, log)
+        self._calc_streaks(player_acc.stats, player_acc.player, log, player_acc.streaks)
+
+    def _player_stats_snapshot(
+        self,
+        player_acc: PlayerStatsAccumulator,
+        player: GetPlayersType,
+        profile: PlayerProfileType | None,
+        time_seconds: int,
+        first_appearance: datetime.datetime | None,
+    ) -> PlayerStatsType:
+        soldier = profile.soldier if profile else None
+        stats = copy.deepcopy(player_acc.stats)
+        stats.update(
+            player=player["name"],
+            player_id=player["player_id"],
+            platform=player.get("platform") or (soldier.platform if soldier else None),
+            steaminfo=profile.steaminfo.to_dict() if profile and profile.steaminfo else None,
+            time_seconds=int(time_seconds),
+        )
+        if not stats["last_spawn"]:
+            stats["last_spawn"] = first_appearance
+        self._calc_computed_stats(stats)
+        return stats
+
+    def _load_accumulator(self, key: str) -> LogStatsAccumulator | None:
+        raw = self.red.get(key)
+        return pickle.loads(raw) if raw else None
+
+    def _save_accumulator(self, key: str, acc: LogStatsAccumulator) -> None:
+        self.red.set(key, pickle.dumps(acc), ex=LIVE_STATS_STATE_TTL_SEC)
+
     # ABSTRACT METHODS
+    def _fold_log(self, acc: LogStatsAccumulator, log: StructuredLogLineWithMetaData) -> None:
+        raise NotImplementedError("_fold_log")
+
     def _get_player_session_time(self, player: GetPlayersType) -> int:
         raise NotImplementedError("_get_player_session_time")
 
@@ -312,42 +625,22 @@ class LiveStats(BaseStats):
 
         return session_start.replace(tzinfo=datetime.UTC)
 
-    def _is_log_from_current_session(self, now, player, log: StructuredLogLineWithMetaData):
-        return (
-            log["timestamp_ms"]
-            >= (now.timestamp() - self._get_player_session_time(player)) * 1000
-        )
-
-    def _get_indexed_logs_by_player_for_session(
-        self, now, indexed_players_by_id, indexed_players_by_name, logs: list[StructuredLogLineWithMetaData]
-    ) -> tuple[dict[str, list[StructuredLogLineWithMetaData]], dict[str, str]]:
-        logs_indexed: dict[str, list[StructuredLogLineWithMetaData]] = {}
-        id_to_name: dict[str, str] = {}
-        for l in logs:
-            update_player_name_map(id_to_name, l.get("player_id_1"), l.get("player_name_1"))
-            update_player_name_map(id_to_name, l.get("player_id_2"), l.get("player_name_2"))
-
-            player = indexed_players_by_id.get(l.get("player_id_1")) or indexed_players_by_name.get(
-                l.get("player_name_1")
-            )
-            player2 = indexed_players_by_id.get(l.get("player_id_2")) or indexed_players_by_name.get(
-                l.get("player_name_2")
-            )
-
-            try:
-                # Only consider stats for a player from his last connection (so a disconnect reconnect should reset stats) otherwise multiple sessions could be blended into one, even if they are far apart
-                if player and self._is_log_from_current_session(now, player, l):
-                    key = l["player_id_1"]
-                    if key:
-                        logs_indexed.setdefault(key, []).append(l)
-                if player2 and self._is_log_from_current_session(now, player2, l):
-                    key = l["player_id_2"]
-                    if key:
-                        logs_indexed.setdefault(key, []).append(l)
-            except KeyError:
-                logger.exception("Invalid log line %s", l)
-
-        return logs_indexed, id_to_name
+    def _fold_log(self, acc: LogStatsAccumulator, log: StructuredLogLineWithMetaData) -> None:
+        action = log["action"]
+        for slot in (1, 2):
+            player_id = log.get(f"player_id_{slot}")
+            if not player_id:
+                continue
+            # Only consider stats for a player from his last connection (so a disconnect reconnect should reset stats) otherwise multiple sessions could be blended into one, even if they are far apart
+            if action == AllLogTypes.connected:
+                acc.players.pop(player_id, None)
+            player_acc = acc.players.get(player_id)
+            if player_acc is None:
+                player = dict(name=log.get(f"player_name_{slot}"), player_id=player_id)
+                player_acc = acc.players[player_id] = self._new_player_accumulator(player, None)
+            self._fold_player_log(player_acc, log)
+            if action == AllLogTypes.disconnected:
+                acc.players.pop(player_id, None)
 
     def get_current_players_stats(self):
         players: list[GetPlayersType]  = self.rcon.get_players()
@@ -372,44 +665,53 @@ class LiveStats(BaseStats):
             logger.info(
                 "%s players, %s profiles loaded", len(players), len(id_to_PlayerID)
             )
-            oldest_session_seconds = self._get_player_session_time(
-                max(players, key=self._get_player_session_time)
-            )
-            logger.debug("Oldest session: %s", oldest_session_seconds)
-            now = datetime.datetime.now()
-            min_timestamp = (
-                now - datetime.timedelta(seconds=oldest_session_seconds)
-            ).timestamp()
-            logger.debug("Min timestamp: %s", min_timestamp)
-            logs = get_recent_logs(min_timestamp=min_timestamp)
-
-            logger.info("%s log lines to process", len(logs["logs"]))
-
-            id_to_player = {
-                p[PLAYER_ID]: p for p in players if p.get(PLAYER_ID)
-            }
-            name_to_player = {p["name"]: p for p in players}
-            indexed_logs, id_to_name = self._get_indexed_logs_by_player_for_session(
-                now, id_to_player, name_to_player, list(reversed(logs["logs"]))
-            )
-
-            for p in players:
-                update_player_name_map(id_to_name, p.get(PLAYER_ID), p.get("name"))
 
-            stats = self.get_stats_by_player(
-                indexed_logs, players, id_to_PlayerID
-            )
+            # The logs of the sessions are folded in as they get cached, only
+            # the ones cached since the last refresh are read
+            acc = self._load_accumulator(LIVE_STATS_STATE_KEY)
+            if acc is None:
+                oldest_session_seconds = self._get_player_session_time(
+                    max(players, key=self._get_player_session_time)
+                )
+                logger.debug("Oldest session: %s", oldest_session_seconds)
+                min_timestamp = (
+                    datetime.datetime.now()
+                    - datetime.timedelta(seconds=oldest_session_seconds)
+                ).timestamp()
+                logger.debug("Min timestamp: %s", min_timestamp)
+                acc = LogStatsAccumulator(since_ms=int(min_timestamp * 1000))
+            count = self.fold_new_logs(acc, LogsHistory())
+            self._save_accumulator(LIVE_STATS_STATE_KEY, acc)
+            logger.info("%s log lines processed", count)
+
+            stats: dict[str, PlayerStatsType] = {}
+            for player in players:
+                player_acc = acc.players.get(
+                    player[PLAYER_ID]
+                ) or self._new_player_accumulator(player, None)
+                stats[player[PLAYER_ID]] = self._player_stats_snapshot(
+                    player_acc,
+                    player,
+                    id_to_PlayerID.get(player[PLAYER_ID]),
+                    time_seconds=self._get_player_session_time(player),
+                    first_appearance=self._get_player_first_appearance(player),
+                )
 
             # Enrich the log-derived stats with the richer per-unit stats stored on the current map.
             # This mirrors the behavior of `current_game_stats()`.
+            maps_history = MapsHistory()
             try:
-                current_map = MapsHistory()[0]
+                current_map = maps_history[0]
             except IndexError:
                 logger.error("No maps information available")
                 return stats
 
             _apply_current_map_player_stats(
-                stats=stats, current_map=current_map
+                stats=stats,
+                current_map=current_map,
+                player_stats=maps_history.get_player_stats(
+                    current_map, with_units=False
+                ),
             )
             return stats
 
@@ -481,6 +783,41 @@ class TimeWindowStats(BaseStats):
             return None
         return self.times[player_key]["start"][0]
 
+    def _set_sessions_total(
+        self,
+        players_times: dict[str, PlayerSessions],
+        until: datetime.datetime,
+        offset_cooldown_time_seconds: int,
+    ) -> None:
+        # Here we massage the session times for a player. 1 session should be a pair of times a start and an end
+        for player, times in players_times.items():
+            starts = times["start"]
+            ends = times["end"]
+            times["total"] = 0
+            # This is an error check, it should never happend to not have a start time
+            # If the player connected prior to the time window we're computing the start for, then the start time should be the start of that window
+            if len(starts) == 0:
+                logger.error("No start time for  %s - %s", player, times)
+            # If there's 1 start more that there are ends, it means that the player did not leave the game, and therefore we add the end of the session as the end of the window we're computing the stats for
+            # We discount the cooldown time at the end of the game to get a more accurate kill / min
+            elif len(starts) == len(ends) + 1:
+                logger.debug("Adding end time to end of range for %s", player)
+                ends.append(
+                    until - datetime.timedelta(seconds=offset_cooldown_time_seconds)
+                )
+            # If starts and ends don't match something's probably wrong the the code
+            if len(starts) != len(ends):
+                logger.error("Sessions time don't match for %s - %s", player, times)
+                continue
+
+            # We loop over the pairs of start and ends (chronologically in the order we encountered them)
+            # and we compute the total play time of the player for the window we're looking at
+            for pair in zip(starts, ends):
+                start, end = pair
+                # logger.debug("\nstart: %s - %s\nend: %s - %s", start, type(start), end, type(end))
+                sess_time = end - start
+                times["total"] += int(sess_time.total_seconds())
+
     def _get_players_stats_from_logs(
         self,
         logs: Iterable[StructuredLogLineWithMetaData],
@@ -490,11 +827,12 @@ class TimeWindowStats(BaseStats):
         offset_cooldown_time_seconds=100,
         cached_players: dict[str, PlayerStat] = {}
     ):
-        indexed_logs: dict[str, list[StructuredLogLineWithMetaData]] = {}
+        columns = LogColumns()
         unique_players = set[tuple[str, str]]()
         players_times: dict[str, PlayerSessions] = {}
         name_to_id = {name: id for id, player in cached_players.items() for name in player["names"]} 
         for log in logs:
+            row = None
             for slot in (1, 2):
                 player_name: str | None = log.get(f"player_name_{slot}")
                 player_id: str | None = log.get(f"player_id_{slot}")
@@ -521,42 +859,16 @@ class TimeWindowStats(BaseStats):
                         logger.warning("A log with the same player_name belonging to 1 or more players\nName: %s, ID: %s\n, Log: %s", player_name, prev_key, log)
 
                 self._set_start_end_times(player_key, players_times, log, from_)
-                indexed_logs.setdefault(player_key, []).append(log)
+                if row is None:
+                    row = columns.append(log)
+                columns.add_player_row(player_key, row)
 
         # Convert the unique set of players into a list of dict for compatibility with parent class
         players = [
             dict(name=player_name, player_id=player_id)
             for player_name, player_id in unique_players
         ]
-        # Here we massage the session times for a player. 1 session should be a pair of times a start and an end
-        for player, times in players_times.items():
-            starts = times["start"]
-            ends = times["end"]
-            times["total"] = 0
-            # This is an error check, it should never happend to not have a start time
-            # If the player connected prior to the time window we're computing the start for, then the start time should be the start of that window
-            if len(starts) == 0:
-                logger.error("No start time for  %s - %s", player, times)
-            # If there's 1 start more that there are ends, it means that the player did not leave the game, and therefore we add the end of the session as the end of the window we're computing the stats for
-            # We discount the cooldown time at the end of the game to get a more accurate kill / min
-            elif len(starts) == len(ends) + 1:
-                logger.debug("Adding end time to end of range for %s", player)
-                ends.append(
-                    until - datetime.timedelta(seconds=offset_cooldown_time_seconds)
-                )
-            # If starts and ends don't match something's probably wrong the the code
-            if len(starts) != len(ends):
-                logger.error("Sessions time don't match for %s - %s", player, times)
-                continue
-
-            # We loop over the pairs of start and ends (chronologically in the order we encountered them)
-            # and we compute the total play time of the player for the window we're looking at
-            for pair in zip(starts, ends):
-                start, end = pair
-                # logger.debug("\nstart: %s - %s\nend: %s - %s", start, type(start), end, type(end))
-                sess_time = end - start
-                times["total"] += int(sess_time.total_seconds())
-
+        self._set_sessions_total(players_times, until, offset_cooldown_time_seconds)
         self.times = players_times
 
         logger.debug("Indexing profiles by id")
@@ -571,10 +883,10 @@ class TimeWindowStats(BaseStats):
                 )
             }
 
-            logger.debug("Computing stats")
+            logger.debug("Computing stats from %s logs", len(columns))
             # we delegate the stats computation to the parent class
-            return self.get_stats_by_player(
-                indexed_logs=indexed_logs,
+            return self.get_stats_by_player_from_columns(
+                columns=columns,
                 players=players,
                 profiles_by_id=profiles_by_id,
             )
@@ -625,6 +937,80 @@ class TimeWindowStats(BaseStats):
             cached_players=cached_players
         )
 
+    def _fold_log(self, acc: LogStatsAccumulator, log: StructuredLogLineWithMetaData) -> None:
+        from_ = datetime.datetime.fromtimestamp(acc.since_ms / 1000, datetime.UTC)
+        for slot in (1, 2):
+            player_name: str | None = log.get(f"player_name_{slot}")
+            player_key: str | None = log.get(f"player_id_{slot}")
+            if not player_key and player_name:
+                # Backtrack the player_id from previous logs or cached player stats(redis)
+                player_key = acc.name_to_id.get(player_name)
+            if not player_key:
+                if player_name:
+                    logger.info("Unable to determine who this log belongs to\n%s", log)
+                continue
+
+            if player_name:
+                prev_key = acc.name_to_id.setdefault(player_name, player_key)
+                if prev_key != player_key:
+                    logger.warning("A log with the same player_name belonging to 1 or more players\nName: %s, ID: %s\n, Log: %s", player_name, prev_key, log)
+
+            self._set_start_end_times(player_key, acc.sessions, log, from_)
+            player_acc = acc.players.get(player_key)
+            if player_acc is None:
+                player = dict(name=player_name, player_id=player_key)
+                player_acc = acc.players[player_key] = self._new_player_accumulator(
+                    player, acc.sessions[player_key]["start"][0]
+                )
+            elif player_name:
+                player_acc.player["name"] = player_name
+            self._fold_player_log(player_acc, log)
+
+    def get_current_game_stats(
+        self,
+        current_map: MapInfo,
+        player_stats: Mapping[str, PlayerStat],
+        until: datetime.datetime | None = None,
+    ) -> dict[str, PlayerStatsType]:
+        """Same as `get_players_stats_from_time` for the current map
+
+        The logs are folded in as they get cached, only the ones cached since
+        the last refresh are read.
+        """
+        key = f"{LIVE_GAME_STATS_STATE_KEY}:{current_map['start']}"
+        acc = self._load_accumulator(key) or LogStatsAccumulator(
+            since_ms=int(current_map["start"] * 1000)
+        )
+        # The names of the cached player stats win over the ones seen in the logs
+        for player_id, player in player_stats.items():
+            for name in player["names"]:
+                acc.name_to_id[name] = player_id
+        count = self.fold_new_logs(acc, LogsHistory())
+        self._save_accumulator(key, acc)
+        logger.debug("%s log lines processed", count)
+
+        # The open sessions last until now, on a copy as they keep going
+        self.times = copy.deepcopy(acc.sessions)
+        self._set_sessions_total(
+            self.times, until or datetime.datetime.now(datetime.UTC), 0
+        )
+        with enter_session() as sess:
+            profiles_by_id = {
+                profile.player_id: profile
+                for profile in get_player_profile_by_player_ids(sess, list(acc.players))
+            }
+
+        return {
+            player_id: self._player_stats_snapshot(
+                player_acc,
+                player_acc.player,
+                profiles_by_id.get(player_id),
+                time_seconds=self._get_player_session_time(player_acc.player),
+                first_appearance=self._get_player_first_appearance(player_acc.player),
+            )
+            for player_id, player_acc in acc.players.items()
+        }
+
 
 def live_stats_loop():
     live = LiveStats()
@@ -677,7 +1063,8 @@ def live_stats_loop():
 
 
 def current_game_stats():
-    current_map = MapsHistory().get_current_map()
+    maps_history = MapsHistory()
+    current_map = maps_history.get_current_map()
     if not current_map:
         logger.error("Unable to get current game stats [no map information available]")
         return {}
@@ -685,9 +1072,10 @@ def current_game_stats():
         logger.error("Unable to get current game stats [missing map start information]")
         return {}
 
-    stats = TimeWindowStats().get_players_stats_from_time(current_map["start"], current_map["player_stats"])
+    player_stats = maps_history.get_player_stats(current_map, with_units=False)
+    stats = TimeWindowStats().get_current_game_stats(current_map, player_stats)
     _apply_current_map_player_stats(
-        stats=stats, current_map=current_map
+        stats=stats, current_map=current_map, player_stats=player_stats
     )
     return stats
 
@@ -695,12 +1083,12 @@ def current_game_stats():
 def _apply_current_map_player_stats(
     stats: Mapping[str, PlayerStatsType],
     current_map: MapInfo,
+    player_stats: Mapping[str, PlayerStat],
 ) -> None:
     """Override/augment stats using the richer per-unit values stored on map history.
 
-    `player_stats` is `MapsHistory()[0]["player_stats"]` and keys are player IDs.
+    `player_stats` are the `MapsHistory` live stats of the map, keys are player IDs.
     """
-    player_stats = current_map.get("player_stats", dict())
     map_layer = parse_layer(current_map["name"])
 
     for stat in stats.values():
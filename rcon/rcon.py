@@ -2,18 +2,35 @@ import json
 import logging
 import random
 import re
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
 from datetime import UTC, datetime, timezone
 from functools import cached_property
 from itertools import chain
-from typing import Iterable, List, Literal, Optional, Sequence, overload
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    overload,
+)
 
 from dateutil import parser
 
-from rcon.connection import HLLCommandError
+import rcon.settings
 import rcon.steam_utils
-from rcon.cache_utils import get_redis_client, invalidates, ttl_cache
+from rcon.cache_utils import (
+    JSON_CODEC,
+    ValueCodec,
+    get_redis_client,
+    invalidates,
+    ttl_cache,
+)
 from rcon.commands import (
     HLLCommandFailedError,
     HLLServerCtl,
@@ -21,15 +38,21 @@ from rcon.commands import (
     ServerCtl,
     VipId,
 )
+from rcon.connection import HLLCommandError
+from rcon.logs.record import LogRecord
 from rcon.maps import UNKNOWN_MAP_NAME, Layer, is_server_loading_map
-from rcon.models import PlayerID, PlayerVIP, enter_session, GameLayout
+from rcon.models import GameLayout, PlayerID, PlayerVIP, enter_session
 from rcon.perf_statistics import PerformanceStatistics
-from rcon.player_history import get_profiles, safe_save_player_action, save_player, get_player_profile
-import rcon.settings
+from rcon.player_history import (
+    get_player_profile,
+    get_profiles,
+    safe_save_player_action,
+    save_player,
+)
 from rcon.types import (
     AdminType,
-    GameLayoutRandomConstraints,
     GameEnum,
+    GameLayoutRandomConstraints,
     GameServerBanType,
     GameStateType,
     GetDetailedPlayer,
@@ -69,6 +92,9 @@ TEMP_BAN = "temp"
 PERMA_BAN = "perma"
 
 USER_CONFIG_NAME_PATTERN = re.compile(r"set_.*_config")
+POOL_THREAD_PREFIX = "rcon-pool"
+# A few minutes of logs of a full server pickle to several MB
+LOGS_CODEC = ValueCodec(compress_above=256 * 1024)
 
 # The base level of actions that will always show up in the Live view
 # actions filter from the call to `get_recent_logs`
@@ -169,6 +195,28 @@ def is_user_config_func(name: str) -> bool:
     return re.match(USER_CONFIG_NAME_PATTERN, name) is not None
 
 
+def _structured_log_line(
+        action: str,
+        message: str,
+        player_name_1: str | None = None,
+        player_id_1: str | None = None,
+        player_name_2: str | None = None,
+        player_id_2: str | None = None,
+        weapon: str | None = None,
+        sub_content: str | None = None,
+) -> StructuredLogLineType:
+    return {
+        "action": action,
+        "player_name_1": player_name_1,
+        "player_id_1": player_id_1,
+        "player_name_2": player_name_2,
+        "player_id_2": player_id_2,
+        "weapon": weapon,
+        "message": message,
+        "sub_content": sub_content,
+    }
+
+
 class Rcon(ServerCtl):
     """Shared high-level RCON behavior composed with a game controller."""
     settings = (
@@ -210,16 +258,25 @@ class Rcon(ServerCtl):
     message_pattern = re.compile(
         r"MESSAGE: player \[(.+)\((.*)\)\], content \[(.+)\]", re.DOTALL
     )
+    raw_log_line_regexp = re.compile(r"^(\[.+? \((\d+)\)\]) ([\w\W]*)$", flags=re.M)
+    # The prefix identifying the type of a log line, see parse_log_line
+    log_type_regexp = re.compile(
+        r"TEAM KILL|KILL|DISCONNECTED|CONNECTED|CHAT|KICK|BAN|VOTE"
+        r"|(?i:TEAMSWITCH|PLAYER|MATCH START|MATCH ENDED|MESSAGE)"
+    )
 
     def __init__(self, *args, pool_size: bool | None = None, **kwargs):
         config = RconConnectionSettingsUserConfig.load_from_db()
-        super().__init__(
-            *args, **kwargs, perf_stats=PerformanceStatistics("rcon", config.performance_statistics_enabled)
-        )
         if pool_size is not None:
             self.pool_size = pool_size
         else:
             self.pool_size = config.thread_pool_size
+        # Request threads lease from the same pool as the thread pool workers,
+        # so it is sized on its own
+        kwargs.setdefault("max_connections", config.max_connections)
+        super().__init__(
+            *args, **kwargs, perf_stats=PerformanceStatistics("rcon", config.performance_statistics_enabled)
+        )
 
         self._config = config
         self._current_map = self.game_profile.parse_layer(UNKNOWN_MAP_NAME)
@@ -251,29 +308,65 @@ class Rcon(ServerCtl):
 
     @cached_property
     def thread_pool(self):
-        return ThreadPoolExecutor(self.pool_size)
+        return ThreadPoolExecutor(self.pool_size, thread_name_prefix=POOL_THREAD_PREFIX)
 
     def run_in_pool(self, function_name: str, *args, **kwargs):
         return self.thread_pool.submit(getattr(self, function_name), *args, **kwargs)
 
+    def fetch_concurrently(self, sources: dict[str, Callable[[], Any]]) -> dict[str, Any]:
+        """Run independent data sources in the thread pool and wait for all of them
+
+        The latency of each source is reported to the performance statistics as
+        `fetch_<source>_ms` and `fetch_<source>_count`.
+        When called from a pool thread the sources run sequentially instead, so
+        the pool can never end up waiting on itself.
+        """
+
+        def timed(name: str, source: Callable[[], Any]):
+            started = time.perf_counter()
+            try:
+                return source()
+            finally:
+                elapsed_ms = int((time.perf_counter() - started) * 1000)
+                self.perf_stats.increment(f"fetch_{name}_ms", elapsed_ms)
+                self.perf_stats.increment(f"fetch_{name}_count")
+                logger.debug("Fetched %s in %dms", name, elapsed_ms)
+
+        if threading.current_thread().name.startswith(POOL_THREAD_PREFIX):
+            return {name: timed(name, source) for name, source in sources.items()}
+
+        futures = {
+            name: self.thread_pool.submit(timed, name, source)
+            for name, source in sources.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
     # TODO
     # When returns value from the cache it is always {}
     @ttl_cache(ttl=5)
     def get_players(self) -> list[GetPlayersType]:
+        return self._get_players(self.get_player_ids())
+
+    def _get_players(self, player_ids_list: list[tuple[str, str]]) -> list[GetPlayersType]:
         player_ids = {
             player_id: {NAME: name, PLAYER_ID: player_id}
-            for name, player_id in self.get_player_ids()
+            for name, player_id in player_ids_list
         }
         # can't pickle dict keys object
-        steam_profiles = rcon.steam_utils.get_steam_profiles_mult_players(
-            steam_id_64s=[k for k in player_ids.keys()]
+        ids = [k for k in player_ids.keys()]
+        sources = self.fetch_concurrently(
+            {
+                "steam_profiles": lambda: rcon.steam_utils.get_steam_profiles_mult_players(
+                    steam_id_64s=ids
+                ),
+                # Raw list, the cached override also hits the database
+                "vip_ids": super().get_vip_ids,
+                "profiles": lambda: get_profiles(ids),
+            }
         )
-
-        vip_player_ids = set(v[PLAYER_ID] for v in super().get_vip_ids())
-        profiles = {
-            p[PLAYER_ID]: p
-            for p in get_profiles([player_id for player_id in player_ids.keys()])
-        }
+        steam_profiles = sources["steam_profiles"]
+        vip_player_ids = set(v[PLAYER_ID] for v in sources["vip_ids"])
+        profiles = {p[PLAYER_ID]: p for p in sources["profiles"]}
 
         players: dict[str, GetPlayersType] = {}
         for player_id in player_ids.keys():
@@ -289,26 +382,28 @@ class Rcon(ServerCtl):
 
         return [p for p in players.values()]
 
+    @ttl_cache(ttl=2, cache_falsy=False)
     def get_detailed_players(self) -> GetDetailedPlayers:
-        try:
-            current_map_start = MapsHistory()[0]["start"]
-            if not current_map_start:
-                current_map_start = datetime.now(timezone.utc).timestamp()
-        except IndexError:
-            logger.error("No maps information available")
-            current_map_start = datetime.now(timezone.utc).timestamp()
-
+        """A snapshot of all connected players, shared by every consumer for one log loop tick"""
+        sources = self.fetch_concurrently(
+            {
+                "player_ids": self.get_player_ids,
+                "player_info": super().get_all_player_info,
+                "map_start": self._get_current_map_start,
+            }
+        )
+        current_map_start = sources["map_start"]
         map_time_seconds = (
             int(datetime.now(timezone.utc).timestamp() - current_map_start)
         )
 
-        players = self.get_players()
+        players = self._get_players(sources["player_ids"])
         fail_count = 0
         players_by_id: dict[str, GetDetailedPlayer] = {}
 
         all_player_info = {
             p["iD"]: p
-            for p in super().get_all_player_info()
+            for p in sources["player_info"]
         }
 
         for player in players:
@@ -340,10 +435,22 @@ class Rcon(ServerCtl):
             "fail_count": fail_count,
         }
 
-    @ttl_cache(ttl=2, cache_falsy=False)
+    def _get_current_map_start(self) -> float:
+        try:
+            current_map_start = MapsHistory()[0]["start"]
+            if current_map_start:
+                return current_map_start
+        except IndexError:
+            logger.error("No maps information available")
+        return datetime.now(timezone.utc).timestamp()
+
+    @ttl_cache(ttl=2, cache_falsy=False, stale_ttl=5, refresh_ahead=0.5)
     def get_team_view(self):
+        return self.build_team_view(self.get_detailed_players())
+
+    def build_team_view(self, detailed_players: GetDetailedPlayers):
+        """Group detailed players by team and squad"""
         teams = {}
-        detailed_players = self.get_detailed_players()
         players_by_id = detailed_players["players"]
         fail_count = detailed_players["fail_count"]
 
@@ -406,7 +513,7 @@ class Rcon(ServerCtl):
 
         return dict(fail_count=fail_count, **game)
 
-    @ttl_cache(ttl=1)
+    @ttl_cache(ttl=1, codec=LOGS_CODEC)
     def get_structured_logs(
             self,
             since_min_ago: int,
@@ -416,6 +523,24 @@ class Rcon(ServerCtl):
         raw = super().get_logs(since_min_ago)
         return self.parse_logs(raw, filter_action, filter_player)
 
+    def iter_structured_logs(
+            self, since_min_ago: int, newest_first: bool = False
+    ) -> Iterator[LogRecord]:
+        """Fetch the logs and parse them lazily, see `iter_parsed_logs`"""
+        raw = super().get_logs(since_min_ago)
+        return self.iter_parsed_logs(raw, newest_first=newest_first)
+
+    def iter_structured_logs_since(
+            self, since_ms: int, window_sec: float, newest_first: bool = False
+    ) -> Iterator[LogRecord]:
+        """Logs of the last `window_sec` seconds that are not older than `since_ms`
+
+        `since_ms` is a game server timestamp, usually that of the newest log
+        already processed, so only the lines past it are parsed.
+        """
+        raw = super().get_logs(since_min_ago=window_sec / 60)
+        return self.iter_parsed_logs(raw, since_ms=since_ms, newest_first=newest_first)
+
     def get_admin_groups(self) -> list[str]:
         # Defined here to avoid circular imports with commands.py
         return super().get_admin_groups()
@@ -547,13 +672,13 @@ class Rcon(ServerCtl):
         with invalidates(Rcon.get_admin_ids):
             return super().remove_admin(player_id)
 
-    @ttl_cache(ttl=60)
+    @ttl_cache(ttl=60, stale_ttl=60, refresh_ahead=0.2)
     def get_perma_bans(self) -> list[GameServerBanType]:
         return [
             self._struct_ban(ban=x, type_=PERMA_BAN) for x in super().get_perma_bans()
         ]
 
-    @ttl_cache(ttl=60)
+    @ttl_cache(ttl=60, stale_ttl=60, refresh_ahead=0.2)
     def get_temp_bans(self) -> list[GameServerBanType]:
         return [
             self._struct_ban(ban=x, type_=TEMP_BAN) for x in super().get_temp_bans()
@@ -823,7 +948,7 @@ class Rcon(ServerCtl):
         with invalidates(Rcon.get_map, Rcon.get_next_map):
             super().set_map(map_name)
 
-    @ttl_cache(ttl=10)
+    @ttl_cache(ttl=10, local_ttl=2)
     def get_map(self) -> Layer:
         current_map = super().get_map()
         if not self.map_regexp.match(current_map):
@@ -845,7 +970,7 @@ class Rcon(ServerCtl):
         ):
             return super().set_map_shuffle_enabled(enabled)
 
-    @ttl_cache(ttl=60 * 30)
+    @ttl_cache(ttl=60 * 30, local_ttl=60, codec=JSON_CODEC)
     def get_name(self) -> str:
         name = super().get_name()
         if len(name) > self.MAX_SERV_NAME_LEN:
@@ -966,7 +1091,7 @@ class Rcon(ServerCtl):
         super().set_broadcast(formatted)
         return prev.decode() if prev else ""
 
-    @ttl_cache(ttl=5)
+    @ttl_cache(ttl=5, codec=JSON_CODEC)
     def get_slots(self) -> SlotsType:
         """Return the current number of connected players and max players allowed"""
         return super().get_slots()
@@ -986,7 +1111,7 @@ class Rcon(ServerCtl):
             "server_number": int(get_server_number()),
         }
 
-    @ttl_cache(ttl=60 * 60 * 24)
+    @ttl_cache(ttl=60 * 60 * 24, local_ttl=60 * 5)
     def get_maps(self) -> list[Layer]:
         return [self.game_profile.parse_layer(m) for m in super().get_maps()]
 
@@ -1389,155 +1514,176 @@ class Rcon(ServerCtl):
     @staticmethod
     def parse_log_line(raw_line: str) -> StructuredLogLineType:
         """Parse a single raw RCON log event or raise a ValueError"""
+        # A single match on the prefix identifies the type of line
+        if match := Rcon.log_type_regexp.match(raw_line):
+            return Rcon._log_line_parsers[match.group().upper()](raw_line)
+        raise ValueError(f"Unknown type line: '{raw_line}'")
 
-        player: str | None = None
-        player2: str | None = None
-        player_id_1: str | None = None
-        player_id_2: str | None = None
-        weapon: str | None = None
-        action: str | None = None
-        content: str = raw_line
-        sub_content: str | None = None
-
-        if raw_line.startswith("KILL") or raw_line.startswith("TEAM KILL"):
-            # KILL: Muctar(Axis/71234567891234567) -> Chris(Allies/71234567891234576) with GEWEHR 43
-            # TEAM KILL: SonofJack(Allies/71234567891234567) -> Joseph Cannon(Allies/71234567891234576) with M1 GARAND
-            action, content = raw_line.split(": ", 1)
-            if match := re.match(Rcon.kill_teamkill_pattern, content):
-                player, player_id_1, player2, player_id_2, weapon = match.groups()
-            else:
-                raise ValueError(f"Unable to parse line: {raw_line}")
-        elif raw_line.startswith("DISCONNECTED") or raw_line.startswith("CONNECTED"):
-            action, name_and_player_id = raw_line.split(" ", 1)
-            if match := re.match(Rcon.connect_disconnect_pattern, name_and_player_id):
-                player, player_id_1 = match.groups()
-                content = name_and_player_id
-            else:
-                raise ValueError(f"Unable to parse line: {raw_line}")
-        elif raw_line.startswith("CHAT"):
-            # CHAT[Team][Azure(Allies/71234567891234567)]: supply truck bot hq for nodes
-            # CHAT[Unit][dominguez1987(Axis/71234567891234567)]: back
-            if match := Rcon.chat_regexp.match(raw_line):
-                scope, player, side, player_id_1, sub_content = match.groups()
-                action = f"CHAT[{side}][{scope}]"
-                content = f"{player}: {sub_content} ({player_id_1})"
-        elif raw_line.upper().startswith("TEAMSWITCH"):
-            # TEAMSWITCH Plebs_23 (Axis > None)
-            # TEAMSWITCH SupremeOneechan (None > Allies)
-            action = "TEAMSWITCH"
-            if match := re.match(Rcon.teamswitch_pattern, raw_line):
-                player, sub_content = match.groups()
-            else:
-                raise ValueError(f"Unable to parse line: {raw_line}")
-        elif raw_line.startswith("KICK") or raw_line.startswith("BAN"):
-            if match := re.match(Rcon.kick_ban_pattern, raw_line):
-                _action, player, sub_content, type_ = match.groups()
-            else:
-                raise ValueError(f"Unable to parse line: {raw_line}")
-
-            if type_ == "PERMANENTLY":
-                type_ = "PERMA BANNED"
-            elif type_ == "YOU":
-                type_ = "IDLE"
-            elif type_ == "Host":
-                type_ = ""
-            elif type_ == "Anti-Cheat":
-                type_ = "ANTI-CHEAT"
-            elif type_ == "KICKED":
-                type_ = "KICKED"
-            elif type_ == "BANNED":
-                type_ = "BANNED"
-            else:
-                type_ = "MISC"
+    @staticmethod
+    def _parse_kill_line(raw_line: str) -> StructuredLogLineType:
+        # KILL: Muctar(Axis/71234567891234567) -> Chris(Allies/71234567891234576) with GEWEHR 43
+        # TEAM KILL: SonofJack(Allies/71234567891234567) -> Joseph Cannon(Allies/71234567891234576) with M1 GARAND
+        action, content = raw_line.split(": ", 1)
+        if match := Rcon.kill_teamkill_pattern.match(content):
+            player, player_id_1, player2, player_id_2, weapon = match.groups()
+            return _structured_log_line(
+                action, content, player, player_id_1, player2, player_id_2, weapon
+            )
+        raise ValueError(f"Unable to parse line: {raw_line}")
+
+    @staticmethod
+    def _parse_connection_line(raw_line: str) -> StructuredLogLineType:
+        action, name_and_player_id = raw_line.split(" ", 1)
+        if match := Rcon.connect_disconnect_pattern.match(name_and_player_id):
+            player, player_id_1 = match.groups()
+            return _structured_log_line(action, name_and_player_id, player, player_id_1)
+        raise ValueError(f"Unable to parse line: {raw_line}")
+
+    @staticmethod
+    def _parse_chat_line(raw_line: str) -> StructuredLogLineType:
+        # CHAT[Team][Azure(Allies/71234567891234567)]: supply truck bot hq for nodes
+        # CHAT[Unit][dominguez1987(Axis/71234567891234567)]: back
+        if match := Rcon.chat_regexp.match(raw_line):
+            scope, player, side, player_id_1, sub_content = match.groups()
+            return _structured_log_line(
+                f"CHAT[{side}][{scope}]",
+                f"{player}: {sub_content} ({player_id_1})",
+                player,
+                player_id_1,
+                sub_content=sub_content,
+            )
+        raise ValueError(f"Unknown type line: '{raw_line}'")
+
+    @staticmethod
+    def _parse_teamswitch_line(raw_line: str) -> StructuredLogLineType:
+        # TEAMSWITCH Plebs_23 (Axis > None)
+        # TEAMSWITCH SupremeOneechan (None > Allies)
+        if match := Rcon.teamswitch_pattern.match(raw_line):
+            player, sub_content = match.groups()
+            return _structured_log_line(
+                "TEAMSWITCH", raw_line, player, sub_content=sub_content
+            )
+        raise ValueError(f"Unable to parse line: {raw_line}")
+
+    @staticmethod
+    def _parse_kick_ban_line(raw_line: str) -> StructuredLogLineType:
+        if match := Rcon.kick_ban_pattern.match(raw_line):
+            _action, player, sub_content, type_ = match.groups()
+        else:
+            raise ValueError(f"Unable to parse line: {raw_line}")
+
+        type_ = Rcon._kick_ban_types.get(type_, "MISC")
+        action = f"ADMIN {type_}".strip()
 
-            action = f"ADMIN {type_}".strip()
+        if "FOR TEAM KILLING" in raw_line:
+            action = f"TK AUTO {type_}"
 
-            if "FOR TEAM KILLING" in raw_line:
-                action = f"TK AUTO {type_}"
+        # Reconstruct the log line without the newlines and tack on the trailing ] we lose
+        content = f"{_action}: [{player}] {sub_content}"
+        if content[-1] != "]":
+            content += "]"
+            sub_content = sub_content + "]" if sub_content else ""
+        return _structured_log_line(action, content, player, sub_content=sub_content)
 
-            # Reconstruct the log line without the newlines and tack on the trailing ] we lose
-            content = f"{_action}: [{player}] {sub_content}"
-            if content[-1] != "]":
-                content += "]"
-                sub_content = sub_content + "]" if sub_content else ""
-        elif raw_line.startswith("VOTE"):
+    @staticmethod
+    def _parse_vote_line(raw_line: str) -> StructuredLogLineType:
+        _, sub_content = raw_line.split("VOTESYS: ", 1)
+        content = sub_content
+        player = player2 = None
+
+        # VOTESYS: Player [Dingbat252] voted [PV_Favour] for VoteID[2]
+        if match := Rcon.vote_pattern.match(raw_line):
             action = "VOTE"
+            player = match.groups()[0]
+        # VOTESYS: Player [NoodleArms] Started a vote of type (PVR_Kick_Abuse) against [buscÃ´O-sensei]. VoteID: [2]
+        elif match := Rcon.vote_started_pattern.match(raw_line):
+            action = "VOTE STARTED"
+            player, player2 = match.groups()
+        # VOTESYS: Vote [2] completed. Result: PVR_Passed
+        elif Rcon.vote_complete_pattern.match(raw_line):
+            action = "VOTE COMPLETED"
+        # VOTESYS: Vote [1] expired before completion.
+        elif Rcon.vote_expired_pattern.match(raw_line):
+            action = "VOTE EXPIRED"
+        # VOTESYS: Vote Kick {buscÃ´O-sensei} successfully passed. [For: 2/1 - Against: 0]
+        elif match := Rcon.vote_passed_pattern.match(raw_line):
+            action = "VOTE PASSED"
+            content, player, sub_content = match.groups()
+        else:
+            raise ValueError(f"Unable to parse line: {raw_line}")
 
-            _, sub_content = raw_line.split("VOTESYS: ", 1)
-            content = sub_content
-
-            # VOTESYS: Player [Dingbat252] voted [PV_Favour] for VoteID[2]
-            if match := re.match(Rcon.vote_pattern, raw_line):
-                player = match.groups()[0]
-            # VOTESYS: Player [NoodleArms] Started a vote of type (PVR_Kick_Abuse) against [buscÃ´O-sensei]. VoteID: [2]
-            elif match := re.match(
-                    Rcon.vote_started_pattern,
-                    raw_line,
-            ):
-                action = "VOTE STARTED"
-                player, player2 = match.groups()
-            # VOTESYS: Vote [2] completed. Result: PVR_Passed
-            elif match := re.match(Rcon.vote_complete_pattern, raw_line):
-                action = "VOTE COMPLETED"
-            # VOTESYS: Vote [1] expired before completion.
-            elif match := re.match(Rcon.vote_expired_pattern, raw_line):
-                action = "VOTE EXPIRED"
-            # VOTESYS: Vote Kick {buscÃ´O-sensei} successfully passed. [For: 2/1 - Against: 0]
-            elif match := re.match(Rcon.vote_passed_pattern, raw_line):
-                action = "VOTE PASSED"
-                content, player, sub_content = match.groups()
-            else:
-                raise ValueError(f"Unable to parse line: {raw_line}")
+        return _structured_log_line(
+            action, content, player, player_name_2=player2, sub_content=sub_content
+        )
 
-        elif raw_line.upper().startswith("PLAYER"):
-            # Player [Fachi (71234567891234567)] Entered Admin Camera
-            action = "CAMERA"
-            _, content = raw_line.split(" ", 1)
+    @staticmethod
+    def _parse_camera_line(raw_line: str) -> StructuredLogLineType:
+        # Player [Fachi (71234567891234567)] Entered Admin Camera
+        _, content = raw_line.split(" ", 1)
+        if match := Rcon.camera_pattern.match(content):
+            player, player_id_1, sub_content = match.groups()
+            return _structured_log_line(
+                "CAMERA", content, player, player_id_1, sub_content=sub_content
+            )
+        raise ValueError(f"Unable to parse line: {raw_line}")
 
-            if match := re.match(Rcon.camera_pattern, content):
-                player, player_id_1, sub_content = match.groups()
-            else:
-                raise ValueError(f"Unable to parse line: {raw_line}")
-
-        elif raw_line.upper().startswith("MATCH START"):
-            # MATCH START UTAH BEACH WARFARE
-            action = "MATCH START"
-            _, sub_content = raw_line.split("MATCH START ")
-            content = raw_line
-        elif raw_line.upper().startswith("MATCH ENDED"):
-            # MATCH ENDED `Kharkov WARFARE` ALLIED (0 - 5) AXIS
-            action = "MATCH ENDED"
-            _, sub_content = raw_line.split("MATCH ENDED ")
-        elif raw_line.upper().startswith("MESSAGE"):
-            action = "MESSAGE"
-            raw_line = raw_line.replace("\n", " ")
-            content = raw_line
-            if match := re.match(Rcon.message_pattern, raw_line):
-                player, player_id_1, message_content = match.groups()
-                content = f"{player}({player_id_1}): {message_content}"
-                sub_content = message_content
-            else:
-                raise ValueError(f"Unable to parse line: {raw_line}")
+    @staticmethod
+    def _parse_match_start_line(raw_line: str) -> StructuredLogLineType:
+        # MATCH START UTAH BEACH WARFARE
+        _, sub_content = raw_line.split("MATCH START ")
+        return _structured_log_line("MATCH START", raw_line, sub_content=sub_content)
 
-        if action is None:
-            raise ValueError(f"Unknown type line: '{raw_line}'")
+    @staticmethod
+    def _parse_match_ended_line(raw_line: str) -> StructuredLogLineType:
+        # MATCH ENDED `Kharkov WARFARE` ALLIED (0 - 5) AXIS
+        _, sub_content = raw_line.split("MATCH ENDED ")
+        return _structured_log_line("MATCH ENDED", raw_line, sub_content=sub_content)
 
-        return {
-            "action": action,
-            "player_name_1": player,
-            "player_id_1": player_id_1,
-            "player_name_2": player2,
-            "player_id_2": player_id_2,
-            "weapon": weapon,
-            "message": content,
-            "sub_content": sub_content,
-        }
+    @staticmethod
+    def _parse_message_line(raw_line: str) -> StructuredLogLineType:
+        raw_line = raw_line.replace("\n", " ")
+        if match := Rcon.message_pattern.match(raw_line):
+            player, player_id_1, message_content = match.groups()
+            return _structured_log_line(
+                "MESSAGE",
+                f"{player}({player_id_1}): {message_content}",
+                player,
+                player_id_1,
+                sub_content=message_content,
+            )
+        raise ValueError(f"Unable to parse line: {raw_line}")
+
+    _kick_ban_types = {
+        "PERMANENTLY": "PERMA BANNED",
+        "YOU": "IDLE",
+        "Host": "",
+        "Anti-Cheat": "ANTI-CHEAT",
+        "KICKED": "KICKED",
+        "BANNED": "BANNED",
+    }
+    # Keyed by the upper cased match of log_type_regexp
+    _log_line_parsers: dict[str, Callable[[str], StructuredLogLineType]] = {
+        "KILL": _parse_kill_line,
+        "TEAM KILL": _parse_kill_line,
+        "CONNECTED": _parse_connection_line,
+        "DISCONNECTED": _parse_connection_line,
+        "CHAT": _parse_chat_line,
+        "TEAMSWITCH": _parse_teamswitch_line,
+        "KICK": _parse_kick_ban_line,
+        "BAN": _parse_kick_ban_line,
+        "VOTE": _parse_vote_line,
+        "PLAYER": _parse_camera_line,
+        "MATCH START": _parse_match_start_line,
+        "MATCH ENDED": _parse_match_ended_line,
+        "MESSAGE": _parse_message_line,
+    }
 
     @staticmethod
     def split_raw_log_lines(raw_logs: list[str]) -> Iterable[tuple[str, str, str]]:
         """Split raw game server logs into the relative time, timestamp and content"""
+        match_line = Rcon.raw_log_line_regexp.match
         for raw_log in raw_logs:
-            log = re.match(r"^(\[.+? \((\d+)\)\]) ([\w\W]*)$", raw_log, flags=re.M)
+            log = match_line(raw_log)
             if log is None:
                 logger.error(f"Unable to parse log line: '{raw_log}'")
                 continue
@@ -1546,67 +1692,99 @@ class Rcon(ServerCtl):
             yield raw_relative_time, raw_timestamp, raw_log_line.strip()
 
     @staticmethod
-    def parse_logs(
+    def iter_parsed_logs(
             raw_logs: list[str],
             filter_action: str | None = None,
             filter_player: str | None = None,
-    ) -> ParsedLogsType:
-        """Parse a chunk of raw gameserver RCON logs"""
-        synthetic_actions = LOG_ACTIONS
+            since_ms: int | None = None,
+            newest_first: bool = False,
+            players: set[str] | None = None,
+            actions: set[str] | None = None,
+    ) -> Iterator[LogRecord]:
+        """Lazily parse raw gameserver RCON logs, one log at a time
+
+        Lines with a timestamp older than `since_ms` are skipped without being parsed.
+        The names of the players and the actions of the yielded logs are added to
+        `players` and `actions` when given.
+        """
         now = datetime.now(tz=UTC)
-        parsed_log_lines: list[StructuredLogLineWithMetaData] = []
-        actions: set[str] = set()
-        players: set[str] = set()
+        if newest_first:
+            raw_logs = reversed(raw_logs)
 
         for raw_relative_time, raw_timestamp, raw_log_line in Rcon.split_raw_log_lines(
                 raw_logs
         ):
+            if since_ms is not None and raw_timestamp.isdigit() and int(raw_timestamp) * 1000 < since_ms:
+                continue
             time = Rcon._extract_time(raw_timestamp)
             try:
                 log_line = Rcon.parse_log_line(raw_log_line)
-
-                if filter_action and not log_line["action"].startswith(filter_action):
-                    continue
-
-                if filter_player and filter_player not in raw_log_line:
-                    continue
-
-                parsed_log_lines.append(
-                    {
-                        "version": 1,
-                        "timestamp_ms": int(time.timestamp() * 1000),
-                        "event_time": datetime.fromtimestamp(int(raw_timestamp)),
-                        "relative_time_ms": (time - now).total_seconds() * 1000,
-                        "raw": raw_relative_time + " " + raw_log_line,
-                        "line_without_time": raw_log_line,
-                        "action": log_line["action"],
-                        "player_name_1": log_line["player_name_1"],
-                        "player_id_1": log_line["player_id_1"],
-                        "player_name_2": log_line["player_name_2"],
-                        "player_id_2": log_line["player_id_2"],
-                        "weapon": log_line["weapon"],
-                        "message": log_line["message"],
-                        "sub_content": log_line["sub_content"],
-                    }
-                )
             except ValueError:
                 logger.error(
                     f"Unable to parse line: '{raw_relative_time} {raw_timestamp} {raw_log_line}'"
                 )
                 continue
 
-            if player := log_line["player_name_1"]:
-                players.add(player)
+            if filter_action and not log_line["action"].startswith(filter_action):
+                continue
+
+            if filter_player and filter_player not in raw_log_line:
+                continue
 
-            if player2 := log_line["player_name_2"]:
-                players.add(player2)
+            if players is not None:
+                if player := log_line["player_name_1"]:
+                    players.add(player)
+
+                if player2 := log_line["player_name_2"]:
+                    players.add(player2)
+
+            if actions is not None:
+                actions.add(log_line["action"])
+
+            yield LogRecord(
+                1,
+                int(time.timestamp() * 1000),
+                (time - now).total_seconds() * 1000,
+                raw_relative_time + " ",
+                raw_log_line,
+                log_line["action"],
+                log_line["player_name_1"],
+                log_line["player_id_1"],
+                log_line["player_name_2"],
+                log_line["player_id_2"],
+                log_line["weapon"],
+                log_line["message"],
+                log_line["sub_content"],
+            )
 
-            actions.add(log_line["action"])
+    @staticmethod
+    def parse_logs(
+            raw_logs: list[str],
+            filter_action: str | None = None,
+            filter_player: str | None = None,
+            since_ms: int | None = None,
+    ) -> ParsedLogsType:
+        """Parse a chunk of raw gameserver RCON logs, newest first
 
-        parsed_log_lines.reverse()
+        Lines with a timestamp older than `since_ms` are skipped without being parsed.
+        """
+        actions: set[str] = set()
+        players: set[str] = set()
+        parsed_log_lines = [
+            log.to_dict()
+            for log in Rcon.iter_parsed_logs(
+                raw_logs,
+                filter_action,
+                filter_player,
+                since_ms,
+                newest_first=True,
+                players=players,
+                actions=actions,
+            )
+        ]
 
         return {
-            "actions": list(actions | set(synthetic_actions)),
+            "actions": list(actions | set(LOG_ACTIONS)),
             "players": list(players),
             "logs": parsed_log_lines,
         }
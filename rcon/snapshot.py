@@ -0,0 +1,97 @@
+"""A single producer polls the game server and publishes versioned snapshots
+
+Every published snapshot gets the next value of a monotonic sequence number
+and is stored as a whole under `SNAPSHOT_KEY`, so a consumer reading it gets
+the gamestate, players and team view of the same moment. The producer is an
+opt-in service, consumers fall back to querying the server when there is no
+recent snapshot.
+"""
+
+import logging
+import pickle
+import time
+from datetime import datetime, timezone
+
+import redis
+
+from rcon.cache_utils import get_redis_client
+from rcon.rcon import Rcon, get_rcon
+from rcon.types import ServerSnapshotType
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = "server_snapshot"
+SNAPSHOT_VERSION_KEY = "server_snapshot:version"
+# A snapshot older than this is considered stale, the producer is likely down
+SNAPSHOT_TTL_SEC = 30
+DEFAULT_INTERVAL_SEC = 2
+
+
+class SnapshotProducer:
+    def __init__(
+        self,
+        rcon: Rcon | None = None,
+        red: redis.StrictRedis | None = None,
+        interval: float = DEFAULT_INTERVAL_SEC,
+    ) -> None:
+        self.rcon = rcon or get_rcon()
+        self.red = red or get_redis_client(decode_responses=False)
+        self.interval = interval
+
+    def take(self) -> ServerSnapshotType:
+        sources = self.rcon.fetch_concurrently(
+            {
+                "gamestate": self.rcon.get_gamestate,
+                "players": self.rcon.get_detailed_players,
+            }
+        )
+        return {
+            "version": 0,
+            "timestamp": datetime.now(timezone.utc).timestamp(),
+            "gamestate": sources["gamestate"],
+            "players": sources["players"],
+            # Built from the same players so both views always agree
+            "team_view": self.rcon.build_team_view(sources["players"]),
+        }
+
+    def publish(self, snapshot: ServerSnapshotType) -> int:
+        snapshot["version"] = int(self.red.incr(SNAPSHOT_VERSION_KEY))
+        self.red.set(SNAPSHOT_KEY, pickle.dumps(snapshot), ex=SNAPSHOT_TTL_SEC)
+        return snapshot["version"]
+
+    def run(self):
+        logger.info("Publishing server snapshots every %ss", self.interval)
+        while True:
+            started = time.monotonic()
+            try:
+                version = self.publish(self.take())
+                logger.debug(
+                    "Published snapshot %s in %.3fs",
+                    version,
+                    time.monotonic() - started,
+                )
+            except Exception:
+                logger.exception("Unable to take server snapshot")
+            time.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+
+def get_snapshot(
+    red: redis.StrictRedis | None = None, max_age: float | None = None
+) -> ServerSnapshotType | None:
+    """Return the latest snapshot, None if there is none (younger than `max_age` seconds)"""
+    red = red or get_redis_client(decode_responses=False)
+    raw = red.get(SNAPSHOT_KEY)
+    if raw is None:
+        return None
+
+    snapshot: ServerSnapshotType = pickle.loads(raw)
+    if (
+        max_age is not None
+        and datetime.now(timezone.utc).timestamp() - snapshot["timestamp"] > max_age
+    ):
+        return None
+    return snapshot
+
+
+def run(interval: float = DEFAULT_INTERVAL_SEC):
+    SnapshotProducer(interval=interval).run()
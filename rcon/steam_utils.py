@@ -229,7 +229,12 @@ def fetch_steam_bans_player(player_id: str) -> SteamBansType | None:
         return player.get(player_id)
 
 
-@ttl_cache(60 * 60 * 12, cache_falsy=False, is_method=False)
+def _steam_ids_key(steam_id_64s: Iterable[str], sess: Session | None = None) -> str:
+    # The session is not part of the key and the order of the ids doesn't matter
+    return ",".join(sorted(steam_id_64s))
+
+
+@ttl_cache(60 * 60 * 12, cache_falsy=False, is_method=False, key_func=_steam_ids_key)
 def get_steam_profiles_mult_players(
     steam_id_64s: Iterable[str], sess: Session | None = None
 ) -> dict[str, SteamInfoType | None]:
@@ -255,7 +260,12 @@ def get_steam_profiles_mult_players(
     return profiles
 
 
-@ttl_cache(60 * 60 * 12, cache_falsy=False, is_method=False)
+@ttl_cache(
+    60 * 60 * 12,
+    cache_falsy=False,
+    is_method=False,
+    key_func=lambda steam_id_64, sess=None: steam_id_64,
+)
 def get_steam_profile(
     steam_id_64: str, sess: Session | None = None
 ) -> SteamInfoType | None:
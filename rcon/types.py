@@ -2,7 +2,7 @@ import datetime
 import enum
 import os
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, List, Literal, Optional, Sequence
+from typing import TYPE_CHECKING, Any, List, Literal, Optional, Sequence
 
 # # TODO: On Python 3.11.* specifically, Pydantic requires we use typing_extensions.TypedDict
 # over typing.TypedDict. Once we bump our Python image we can replace this.
@@ -1113,3 +1113,13 @@ class PlayerInfoType(TypedDict):
     eosId: NotRequired[str]
     steamId: NotRequired[str | None]
     worldPosition: WorldPositionType
+
+
+class ServerSnapshotType(TypedDict):
+    """A consistent view of the game server published by rcon.snapshot"""
+
+    version: int
+    timestamp: float
+    gamestate: GameStateType
+    players: GetDetailedPlayers
+    team_view: dict[str, Any]
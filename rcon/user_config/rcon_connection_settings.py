@@ -1,4 +1,4 @@
-from typing import TypedDict
+from typing import NotRequired, TypedDict
 
 from pydantic import Field
 
@@ -7,6 +7,7 @@ from rcon.user_config.utils import BaseUserConfig, key_check, set_user_config
 
 class RconConnectionSettingsType(TypedDict):
     thread_pool_size: int
+    max_connections: NotRequired[int]
     performance_statistics_enabled: bool
     performance_statistics_interval_seconds: int
 
@@ -15,6 +16,7 @@ class RconConnectionSettingsUserConfig(BaseUserConfig):
     # TODO: max open and threadpool seem redundant
     # TODO: been made entirely redundant since RCON V2, remove
     thread_pool_size: int = Field(ge=1, le=100, default=20)
+    max_connections: int = Field(ge=1, le=100, default=10)
     performance_statistics_enabled: bool = Field(default=False)
     performance_statistics_interval_seconds: int = Field(default=30)
 
@@ -28,6 +30,7 @@ class RconConnectionSettingsUserConfig(BaseUserConfig):
 
         validated_conf = RconConnectionSettingsUserConfig(
             thread_pool_size=values.get("thread_pool_size"),
+            max_connections=values.get("max_connections", 10),
             performance_statistics_enabled=values.get("performance_statistics_enabled"),
             performance_statistics_interval_seconds=values.get("performance_statistics_interval_seconds"),
         )
@@ -13,6 +13,7 @@ import redis.exceptions
 
 from rcon.cache_utils import get_redis_pool
 from rcon.game.registry import game_switch
+from rcon.logs.record import LogRecord, serialize_log
 from rcon.models import GameLayout
 from rcon.types import GameEnum, GetDetailedPlayer, MapInfo, PlayerInfoType, PlayerStat, PlayerStatsType, StructuredLogLineWithMetaData
 from rcon.maps import Layer, parse_map_string, LAYERS, Environment, UNKNOWN_MAP_NAME, Team
@@ -76,6 +77,8 @@ REDIS_STREAM_OUT_OF_ORDER = (
     "The ID specified in XADD is equal or smaller than the target stream top item"
 )
 REDIS_STREAM_INVALID_ID = "Invalid stream ID specified as stream command argument"
+# Highest sequence part of a stream ID, to include a whole millisecond in ranges
+MAX_STREAM_SEQUENCE = 2**64 - 1
 
 
 class StreamOlderElement(Exception):
@@ -317,12 +320,17 @@ class FixedLenList(Generic[T]):
     def clear(self) -> None:
         self.red.delete(self.key)
 
-def logs_deserializer(data: bytes | str) -> StructuredLogLineWithMetaData:
+def logs_deserializer(data: bytes | str) -> LogRecord | StructuredLogLineWithMetaData:
     """
     A custom deserializer that ensures conversion of datetime strings
     to datetime.datetime objects
+
+    Logs stored as `LogRecord` arrays are loaded as records, logs stored as
+    dicts before that stay dicts.
     """
     obj = orjson.loads(data)
+    if isinstance(obj, list):
+        return LogRecord.from_compact(obj)
 
     if "event_time" in obj:
         if isinstance(obj["event_time"], (int, float)):
@@ -332,12 +340,242 @@ def logs_deserializer(data: bytes | str) -> StructuredLogLineWithMetaData:
 
     return obj
 
-class LogsHistory(FixedLenList[StructuredLogLineWithMetaData]):
+def stream_id_sequence(id_: StreamID) -> int:
+    """The sequence number of a `LogsHistory` stream ID
+
+    Raise a StreamInvalidID if the ID is not `<timestamp_ms>-<seq>`
+    """
+    try:
+        return int(id_.split("-", 1)[1])
+    except (AttributeError, IndexError, ValueError):
+        raise StreamInvalidID(REDIS_STREAM_INVALID_ID)
+
+
+class LogsHistory:
+    """Most recent logs as a redis stream, with stable IDs
+
+    Each log is stored under the ID `<timestamp_ms>-<seq>`, where `seq` is a
+    monotonic sequence number counted in `seq_key` (the timestamp part is
+    bumped when needed to keep IDs increasing). IDs don't change when older logs
+    are trimmed, so readers keep the ID of the last log they processed and only
+    read what comes after it, or ask for a time window.
+
+    Indexing (`history[0]`, slices, iteration) is newest first.
+    """
+
     def __init__(self, key: str = "logs_history", max_len: int = 100_000):
-        super().__init__(key, max_len, deserializer=logs_deserializer)
+        self.red = redis.StrictRedis(connection_pool=get_redis_pool())
+        self.key = key
+        self.max_len = max_len
+        self.seq_key = f"{key}:seq"
+        self.serializer = serialize_log
+        self.deserializer = logs_deserializer
+
+    def _entries(
+        self, response: list[tuple[bytes, dict[bytes, bytes]]]
+    ) -> list[tuple[StreamID, StructuredLogLineWithMetaData]]:
+        return [
+            (id_.decode(), self.deserializer(fields[b"log"]))
+            for id_, fields in response
+            # Deleted entries come back without fields
+            if fields
+        ]
+
+    def add(self, obj: StructuredLogLineWithMetaData) -> StreamID:
+        return self.add_many([obj])[0]
+
+    def add_many(self, objs: list[StructuredLogLineWithMetaData]) -> list[StreamID]:
+        """Add logs oldest first and return their IDs"""
+        if not objs:
+            return []
+
+        with self.red.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.seq_key, self.key)
+                    seq = int(pipe.get(self.seq_key) or 0)
+                    last = pipe.xrevrange(self.key, count=1)
+                    last_ms = int(last[0][0].split(b"-")[0]) if last else 0
+                    ids = []
+                    for seq, obj in enumerate(objs, seq + 1):
+                        last_ms = max(last_ms, int(obj["timestamp_ms"]))
+                        ids.append(f"{last_ms}-{seq}")
+
+                    pipe.multi()
+                    for id_, obj in zip(ids, objs):
+                        pipe.xadd(
+                            self.key,
+                            {"log": self.serializer(obj)},
+                            id=id_,
+                            maxlen=self.max_len,
+                        )
+                    pipe.set(self.seq_key, seq)
+                    pipe.execute()
+                    return ids
+                except redis.WatchError:
+                    continue
+
+    def sequence(self) -> int:
+        """The sequence number of the newest log, 0 if none was ever added"""
+        return int(self.red.get(self.seq_key) or 0)
+
+    def last_id(self) -> StreamID:
+        last = self.red.xrevrange(self.key, count=1)
+        return last[0][0].decode() if last else None
+
+    def read_since(
+        self, cursor: StreamID, count: int = 1000
+    ) -> tuple[StreamID, list[StructuredLogLineWithMetaData]] | None:
+        """Return up to `count` logs added after the `cursor` ID, oldest first
+
+        Also returns the ID of the last returned log, to be used as the next
+        cursor. Returns None when logs following `cursor` were already trimmed
+        from the history or the history was reset (e.g. redis was flushed), in
+        which case the caller has to resync some other way.
+        """
+        entries = self.entries_after(cursor, count)
+        if not entries:
+            last_id = self.last_id()
+            if last_id is not None and stream_id_sequence(last_id) < stream_id_sequence(cursor):
+                return None
+            return cursor, []
+        if stream_id_sequence(entries[0][0]) != stream_id_sequence(cursor) + 1:
+            return None
+        return entries[-1][0], [log for _, log in entries]
+
+    def entries_after(
+        self, id_: StreamID, count: int | None = None
+    ) -> list[tuple[StreamID, StructuredLogLineWithMetaData]]:
+        """The logs added after `id_` (all of them if None), oldest first, with their IDs"""
+        min_id = "-" if id_ is None else f"({id_}"
+        return self._entries(self.red.xrange(self.key, min_id, count=count))
+
+    def read(
+        self, last_id: StreamID, count: int | None = None, block_ms: int | None = None
+    ) -> list[tuple[StreamID, StructuredLogLineWithMetaData]]:
+        """Same as `entries_after`, waiting up to `block_ms` for new logs if none"""
+        try:
+            response = self.red.xread({self.key: last_id}, count=count, block=block_ms)
+        except redis.exceptions.ResponseError:
+            raise StreamInvalidID(REDIS_STREAM_INVALID_ID)
+        return self._entries(response[0][1]) if response else []
+
+    def range(
+        self,
+        since_ms: int | None = None,
+        until_ms: int | None = None,
+        count: int | None = None,
+        newest_first: bool = False,
+    ) -> list[tuple[StreamID, StructuredLogLineWithMetaData]]:
+        """The logs between two timestamps (inclusive) with their IDs"""
+        min_id = "-" if since_ms is None else f"{int(since_ms)}-0"
+        max_id = "+" if until_ms is None else f"{int(until_ms)}-{MAX_STREAM_SEQUENCE}"
+        if newest_first:
+            return self._entries(self.red.xrevrange(self.key, max_id, min_id, count=count))
+        return self._entries(self.red.xrange(self.key, min_id, max_id, count=count))
+
+    def get_ids(self, ids: Iterable[StreamID]) -> list[StructuredLogLineWithMetaData]:
+        """Return the logs with the given IDs, in the same order
+
+        Logs that were already trimmed from the history are left out.
+        """
+        pipe = self.red.pipeline(transaction=False)
+        for id_ in ids:
+            pipe.xrange(self.key, id_, id_, count=1)
+        return [log for res in pipe.execute() for _, log in self._entries(res)]
+
+    def ensure_group(self, group: str, start_id: StreamID = "$") -> bool:
+        """Create the consumer group if missing, return whether it was created"""
+        try:
+            self.red.xgroup_create(self.key, group, id=start_id, mkstream=True)
+            return True
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" in str(e):
+                return False
+            raise
+
+    def has_group(self, group: str) -> bool:
+        try:
+            groups = self.red.xinfo_groups(self.key)
+        except redis.exceptions.ResponseError:
+            # No history yet
+            return False
+        return any(g["name"].decode() == group for g in groups)
+
+    def read_group(
+        self, group: str, consumer: str, count: int = 1000
+    ) -> list[tuple[StreamID, StructuredLogLineWithMetaData]]:
+        """Logs delivered to `consumer` and not acknowledged yet, else new logs"""
+        pending = self.red.xpending_range(
+            self.key, group, min="-", max="+", count=count, consumername=consumer
+        )
+        if pending:
+            pending_ids = [p["message_id"].decode() for p in pending]
+            raw = self.red.xclaim(self.key, group, consumer, 0, pending_ids)
+            entries = self._entries(raw)
+            # Pending logs trimmed from the history since they were delivered
+            claimed = {id_ for id_, _ in entries}
+            self.ack(group, [id_ for id_ in pending_ids if id_ not in claimed])
+            if entries:
+                return entries
+
+        response = self.red.xreadgroup(group, consumer, {self.key: ">"}, count=count)
+        return self._entries(response[0][1]) if response else []
+
+    def ack(self, group: str, ids: list[StreamID]) -> None:
+        if ids:
+            self.red.xack(self.key, group, *ids)
+
+    def __len__(self) -> int:
+        return self.red.xlen(self.key)
+
+    @overload
+    def __getitem__(self, index: int) -> StructuredLogLineWithMetaData: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[StructuredLogLineWithMetaData]: ...
+
+    def __getitem__(self, index: slice | int):
+        if isinstance(index, slice):
+            if index.step is not None:
+                raise ValueError("Step is not supported")
+            start = index.start or 0
+            count = index.stop if index.stop is not None and index.stop >= 0 else None
+            entries = self._entries(self.red.xrevrange(self.key, count=count))
+            return [log for _, log in entries[start : index.stop]]
+
+        if index < 0:
+            entries = self._entries(self.red.xrange(self.key, count=-index))
+            index = -index - 1
+        else:
+            entries = self._entries(self.red.xrevrange(self.key, count=index + 1))
+        try:
+            return entries[index][1]
+        except IndexError:
+            raise IndexError("Index out of bound")
+
+    def __iter__(self) -> Iterator[StructuredLogLineWithMetaData]:
+        max_id = "+"
+        while True:
+            entries = self._entries(self.red.xrevrange(self.key, max_id, count=1000))
+            yield from (log for _, log in entries)
+            if len(entries) < 1000:
+                return
+            max_id = f"({entries[-1][0]}"
+
+    def clear(self) -> None:
+        self.red.delete(self.key)
 
 
 class MapsHistory(FixedLenList[MapInfo]):
+    """The maps played, most recent first
+
+    The live player stats of a map are not part of its entry but kept in a
+    hash of the player IDs to their stats, the units history of each player
+    is a list next to it. Entries cached before that still hold them in
+    `player_stats`.
+    """
+
     def __init__(self, key="maps_history", max_len=500):
         super().__init__(key, max_len)
 
@@ -347,6 +585,66 @@ class MapsHistory(FixedLenList[MapInfo]):
         except IndexError:
             return None
 
+    def _player_stats_key(self, map_info: MapInfo) -> str | None:
+        if map_info.get("start") is None:
+            return None
+        return f"{self.key}:player_stats:{map_info['start']}"
+
+    def get_player_stats(
+        self, map_info: MapInfo, with_units: bool = True
+    ) -> dict[str, PlayerStat]:
+        """The live stats of the players of the map by player ID
+
+        Without units, the stats hold no units history unless the map entry
+        was cached with its player stats.
+        """
+        key = self._player_stats_key(map_info)
+        raw_stats = self.red.hgetall(key) if key else {}
+        if not raw_stats:
+            return map_info.get("player_stats") or {}
+
+        player_stats: dict[str, PlayerStat] = {
+            player_id.decode(): orjson.loads(stat)
+            for player_id, stat in raw_stats.items()
+        }
+        if with_units:
+            pipe = self.red.pipeline(transaction=False)
+            for player_id in player_stats:
+                pipe.lrange(f"{key}:units:{player_id}", 0, -1)
+            for stat, units in zip(player_stats.values(), pipe.execute()):
+                stat["units"] = [orjson.loads(unit) for unit in units]
+        return player_stats
+
+    def save_player_stats(
+        self, map_info: MapInfo, player_stats: dict[str, PlayerStat]
+    ) -> None:
+        """Store the stats of the given players of the map
+
+        The `units` of the stats are the ones to add to the units history of
+        the player.
+        """
+        key = self._player_stats_key(map_info)
+        if key is None or not player_stats:
+            return
+
+        pipe = self.red.pipeline(transaction=False)
+        for player_id, stat in player_stats.items():
+            stat = stat.copy()
+            units = stat.pop("units", None)
+            if units:
+                pipe.rpush(
+                    f"{key}:units:{player_id}", *(orjson.dumps(u) for u in units)
+                )
+            pipe.hset(key, player_id, orjson.dumps(stat))
+        pipe.execute()
+
+    def clear_player_stats(self, map_info: MapInfo) -> None:
+        key = self._player_stats_key(map_info)
+        if key is None:
+            return
+        player_ids = [player_id.decode() for player_id in self.red.hkeys(key)]
+        self.red.delete(key, *(f"{key}:units:{player_id}" for player_id in player_ids))
+
     def save_map_end(self, old_map: str | None = None, end_timestamp: int | None = None):
         ts = end_timestamp or int(datetime.now(tz=UTC).timestamp())
         logger.info("Saving end of map %s at time %s", old_map, ts)
@@ -374,6 +672,9 @@ class MapsHistory(FixedLenList[MapInfo]):
     ):
         ts = start_timestamp or int(datetime.now(tz=UTC).timestamp())
         logger.info("Saving start of new map %s at time %s", new_map, ts)
+        # The stats of the maps about to be trimmed off go with them
+        for dropped in self[self.max_len - 1 :]:
+            self.clear_player_stats(dropped)
         game_layout = game_layout or GameLayout(requested=[], set=[])
         new = MapInfo(
             name=new_map,
@@ -412,9 +412,10 @@ def watch_killrate(
                 )
 
                 try:
-                    detailed_info = api.get_detailed_player_info(
-                        player_id=player_id
-                    )
+                    # Reuse the snapshot of this tick, the player may have left since
+                    detailed_info = api.get_detailed_players()["players"].get(
+                        player_id
+                    ) or api.get_detailed_player_info(player_id=player_id)
                     player_level: int = detailed_info["level"]
                     player_role: str = detailed_info["role"]
                     player_loadout: str = detailed_info["loadout"]
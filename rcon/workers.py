@@ -5,33 +5,42 @@ import os
 from concurrent.futures import as_completed
 from datetime import UTC, timedelta
 from typing import Any, Optional, Set
-from typing_extensions import TypeIs
 
 from rq import Queue
 from rq.job import Dependency, Job, Retry
 from rq_scheduler import Scheduler
 from sqlalchemy import and_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from typing_extensions import TypeIs
 
 from rcon.cache_utils import get_redis_client
 from rcon.game.registry import GAME_ID
 from rcon.game_logs import get_historical_logs_records
 from rcon.logs.recorder import LogRecorder
-from rcon.models import Maps, PlayerStats, enter_session
-from rcon.player_history import get_player
+from rcon.models import Maps, PlayerID, PlayerStats, enter_session, get_engine
 from rcon.player_stats import TimeWindowStats
 from rcon.rcon import get_rcon
-from rcon.types import MapInfo, MapScore, MapsType, PlayerStat, GameLayout
-from rcon.utils import GAME_LOG_STAT_FIELDS, INDEFINITE_VIP_DATE, TEMP_FIELDS, LogsHistory, MapsHistory, get_server_number, get_temp_default_stats
+from rcon.types import GameLayout, MapInfo, MapScore, MapsType, PlayerStat
+from rcon.utils import (
+    GAME_LOG_STAT_FIELDS,
+    INDEFINITE_VIP_DATE,
+    TEMP_FIELDS,
+    LogsHistory,
+    MapsHistory,
+    get_server_number,
+    get_temp_default_stats,
+)
 
 logger = logging.getLogger("rcon")
 
 
 def update_player_steaminfo_on_connect_worker(player_name: str, player_id: str) -> None:
     """Refresh Steam data outside the synchronous log-loop process."""
+    from rcon import steam_utils
     from rcon.models import enter_session
     from rcon.player_history import _get_set_player
-    from rcon import steam_utils
 
     started = datetime.datetime.now(datetime.UTC)
     try:
@@ -172,8 +181,16 @@ def save_missing_match_logs(map_: MapInfo):
 
         rcon_logs = get_rcon().get_structured_logs(since_min_ago=minutes_from_now)
         rcon_match_logs = [log for log in rcon_logs["logs"] if match_start <= log["event_time"].replace(tzinfo=datetime.UTC) and log["event_time"].replace(tzinfo=datetime.UTC) <= match_end]
-        # 20_000 logs should be enough (90 min warfare full server results in approx 4000 logs)
-        match_redis_logs = [log for log in LogsHistory()[:20000] if match_start <= log["event_time"].replace(tzinfo=datetime.UTC) and log["event_time"].replace(tzinfo=datetime.UTC) <= match_end]
+        # IDs of the logs history are their timestamp, a minute of margin for those cached late
+        history_logs = [
+            log
+            for _, log in LogsHistory().range(
+                since_ms=(match_start.timestamp() - 60) * 1000,
+                until_ms=(match_end.timestamp() + 60) * 1000,
+                newest_first=True,
+            )
+        ]
+        match_redis_logs = [log for log in history_logs if match_start <= log["event_time"].replace(tzinfo=datetime.UTC) and log["event_time"].replace(tzinfo=datetime.UTC) <= match_end]
 
         logger.info("Match start: %s | Match end: %s", match_start, match_end)
         logger.info("HLLSERVER logs count: %d", len(rcon_match_logs))
@@ -253,6 +270,7 @@ def clear_stats_cache(map: Maps, map_info: MapInfo | None):
     map_to_update["player_stats"] = {}
     map_to_update["cap_flips"] = []
     maps_history.update(map_index, map_to_update)
+    maps_history.clear_player_stats(map_to_update)
 
 def _record_stats(map_info: MapInfo):
     raw_start = map_info.get("start")
@@ -365,17 +383,36 @@ def _get_game_logs_stats(session: Session, map: Maps, cached_players: dict[str,
 
 def record_stats_from_map(
     sess: Session, map_: Maps, map_info: MapInfo | None, force: bool = False
-) -> None:
+) -> int:
+    """Save the stats of the players of the map, return how many were saved"""
     if not _are_match_logs_available(sess, map_.server_number, map_.start, map_.end):
         # An exception will automatically re-enqueue the record stats task.
         raise Exception("match logs are not yet available, skipping recording stats")
 
-    temp_stats = map_info.get("player_stats", {}) if map_info else {}
+    temp_stats = MapsHistory().get_player_stats(map_info) if map_info else {}
 
     _save_match_result(sess, map_)
 
+    game_logs_stats = _get_game_logs_stats(sess, map_, temp_stats)
+    # The players and their already recorded stats are loaded at once
+    player_ids = {
+        s["player_id"] for s in game_logs_stats.values() if s.get("player_id")
+    }
+    player_records: dict[str, PlayerID] = {
+        p.player_id: p
+        for p in sess.query(PlayerID).filter(PlayerID.player_id.in_(player_ids))
+    }
+    existing_stats: dict[int, PlayerStats] = {
+        s.player_id_id: s
+        for s in sess.query(PlayerStats).filter(
+            PlayerStats.map_id == map_.id,
+            PlayerStats.player_id_id.in_([p.id for p in player_records.values()]),
+        )
+    }
+
+    rows: list[dict[str, Any]] = []
     seen_players: Set[str] = set()
-    for _, player_game_log_stats in _get_game_logs_stats(sess, map_, temp_stats).items():
+    for _, player_game_log_stats in game_logs_stats.items():
         player_id = player_game_log_stats.get("player_id")
         if not player_id:
             logger.error("Stat object does not contain a player ID: %s", player_game_log_stats)
@@ -387,20 +424,13 @@ def record_stats_from_map(
 
         seen_players.add(player_id)
 
-        player_record = get_player(sess, player_id=player_id)
+        player_record = player_records.get(player_id)
         if not player_record:
             logger.error("Can't find DB record for %s", player_id)
             continue
 
         # Check for any already recorded stats
-        existing: Optional["PlayerStats"] = (
-            sess.query(PlayerStats)
-            .filter(
-                PlayerStats.map_id == map_.id,
-                PlayerStats.player_id_id == player_record.id,
-            )
-            .one_or_none()
-        )
+        existing: Optional["PlayerStats"] = existing_stats.get(player_record.id)
 
         # The stats were already recorded once
         if existing is not None and not force:
@@ -408,20 +438,89 @@ def record_stats_from_map(
 
         player_temp_stats = temp_stats.get(player_id, get_temp_default_stats(existing))
 
-        combined_player_stats = _build_player_stat_dict(
-            player_record.id, map_.id, player_game_log_stats, player_temp_stats
+        rows.append(
+            _build_player_stat_dict(
+                player_record.id, map_.id, player_game_log_stats, player_temp_stats
+            )
         )
 
-        if existing is not None and force:
-            logger.debug("Updating stats for player %s on map %s", player_id, map_.id)
-            for key, value in combined_player_stats.items():
-                if key not in ("player_id_id", "map_id"):
-                    setattr(existing, key, value)
-            continue
-        
-        logger.debug("Saving stats for player %s on map %s", player_id, map_.id)
-        player_stat_record = PlayerStats(**combined_player_stats)
-        sess.add(player_stat_record)
+    return _save_player_stats(sess, rows, existing_stats, force)
+
+
+def _save_player_stats(
+    sess: Session,
+    rows: list[dict[str, Any]],
+    existing_stats: dict[int, PlayerStats],
+    force: bool = False,
+) -> int:
+    """Insert the player stats rows at once, return how many were saved
+
+    The unique_map_player constraint tells the rows already recorded apart,
+    they are overwritten when forced and left untouched otherwise.
+    """
+    if not rows:
+        return 0
+
+    if sess.get_bind().dialect.name != "postgresql":
+        for row in rows:
+            existing = existing_stats.get(row["player_id_id"])
+            if existing is None:
+                sess.add(PlayerStats(**row))
+                continue
+            for key, value in row.items():
+                setattr(existing, key, value)
+        return len(rows)
+
+    statement = postgresql_insert(PlayerStats).values(rows)
+    if force:
+        statement = statement.on_conflict_do_update(
+            constraint="unique_map_player",
+            set_={
+                column.name: statement.excluded[column.name]
+                for column in PlayerStats.__table__.columns
+                if column.name not in ("id", "playersteamid_id", "map_id")
+            },
+        )
+    else:
+        statement = statement.on_conflict_do_nothing(constraint="unique_map_player")
+    logger.debug("Saving stats of %d players", len(rows))
+    return sess.execute(statement).rowcount
+
+
+def init_reprocess_worker() -> None:
+    """Don't reuse the database connections of the parent process after a fork"""
+    get_engine().dispose(close=False)
+
+
+def reprocess_maps(map_ids: list[int], force: bool = False) -> tuple[int, int, int]:
+    """Record again the stats of the given maps, each one in its own transaction
+
+    Returns the number of maps reprocessed, of player stats saved and of maps
+    that failed.
+    """
+    processed = saved = failed = 0
+    with enter_session() as sess:
+        maps = sess.query(Maps).filter(Maps.id.in_(map_ids)).order_by(Maps.start).all()
+        for map_ in maps:
+            try:
+                # TODO we could attempt to find the temporary cached stats in redis for the match
+                saved += record_stats_from_map(sess, map_, None, force=force)
+                sess.commit()
+                processed += 1
+            except IntegrityError as e:
+                sess.rollback()
+                failed += 1
+                logger.error(
+                    "Can't re-process stats of map %s. Probably already exist. Set force flag to override. Error msg: %r",
+                    map_.id,
+                    e,
+                )
+            except Exception:
+                sess.rollback()
+                failed += 1
+                logger.exception("Can't re-process stats of map %s", map_.id)
+    return processed, saved, failed
+
 
 def get_job_results(job_key):
     job = Job.fetch(job_key, connection=get_redis_client())
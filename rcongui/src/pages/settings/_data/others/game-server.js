@@ -1,8 +1,8 @@
 const RconConnectionNotes = `
     {
         /*
-            The number of concurrent connections to the game server CRCON will open for each
-            worker you've set in your .env (NB_API_WORKERS).
+            The number of threads CRCON uses to query the game server concurrently for each
+            worker you've set in your .env (NB_API_WORKERS), they use the connections below.
             This affects things like the game view that uses multiple connections to pull
             information faster so it's less likely to be out of date.
             Unless you're having issues that would be fixed by a reduced pool size
@@ -13,6 +13,15 @@ const RconConnectionNotes = `
             This must be an integer 1 <= x <= 100
         */
         "thread_pool_size": 6,
+
+        /*
+            The maximum number of connections to the game server CRCON keeps open for each
+            worker you've set in your .env (NB_API_WORKERS).
+            They are shared by the thread pool above and the API requests, a request waits
+            for a connection when they are all in use.
+            This must be an integer 1 <= x <= 100
+        */
+        "max_connections": 10,
         
         /*
             Whether Community RCon should track performance metrics for the RCon communication, such as
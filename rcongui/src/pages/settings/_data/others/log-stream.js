@@ -1,13 +1,11 @@
 const logStreamNotes = `
     {
         /*
-            The log_stream is a Redis stream that stores logs from the game server in sequential order on a transient basis (they are not persisted to the database and are cleared on service startup) to support pushing new logs to external tools through a websocket endpoint.
+            The log stream pushes new logs from the game server to external tools through a websocket endpoint. The logs are read from the logs history the log loop already caches in Redis, no separate service is needed.
 
             Parameters :
-            - stream_size: The number of logs the stream will retain before discarding the oldest logs.
-            - startup_since_mins: The number of minutes of logs to request from the game service when the service starts up
-            - refresh_frequency_sec: The poll rate for asking for new logs from the game server
-            - refresh_since_mins The number of minutes of logs to request from the game service each loop
+            - enabled: Accept websocket connections and push new logs to them
+            - stream_size: The most logs sent to a client that reconnects with the ID of the last log it has seen, it is told if it missed more
 
             See https://github.com/MarechJ/hll_rcon_tool/wiki/Developer-Guides-%E2%80%90-Streaming-Logs for a detailed description.
         */
@@ -5,11 +5,11 @@ from typing import Generator, TypedDict
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from django.urls import path
 
-from rcon.logs.stream import LogStream
 from rcon.game_logs import is_action
+from rcon.logs.stream import get_log_stream_fanout
 from rcon.types import AllLogTypes, StructuredLogLineWithMetaData
 from rcon.user_config.log_stream import LogStreamUserConfig
-from rcon.utils import StreamID, StreamInvalidID
+from rcon.utils import StreamID, StreamInvalidID, stream_id_sequence
 
 logger = getLogger(__name__)
 
@@ -81,40 +81,39 @@ class LogStreamConsumer(AsyncJsonWebsocketConsumer):
             size = max(size, 1)
             return (logs[i : i + size] for i in range(0, len(logs), size))
 
-        log_stream = LogStream()
-        while self.connected:
-            config = LogStreamUserConfig.load_from_db()
-
-            if not config.enabled:
+        async def send_logs(
+            logs: list[tuple[StreamID, StructuredLogLineWithMetaData]]
+        ) -> None:
+            json_logs: list[LogStreamObject] = []
+            for id_, log in logs:
+                if send_all or is_action(
+                    actions_filter, log["action"], exact_match=False
+                ):
+                    json_logs.append({"id": id_, "log": log})
+
+            for batch in batch_logs(json_logs):
                 response: LogStreamResponse = {
-                    "error": "Log stream is not enabled in your config",
-                    # TODO: should this be None?
-                    "last_seen_id": None,
-                    "logs": [],
+                    "last_seen_id": batch[-1]["id"],
+                    "logs": batch,
+                    "error": None,
                 }
                 await self.send_json(response)
-                return await self.websocket_disconnect()
 
+        # The new logs are read once for every websocket of this process,
+        # subscribe first so none are missed while catching up
+        fanout = get_log_stream_fanout()
+        queue = fanout.subscribe()
+        try:
             try:
-                logs = log_stream.logs_since(last_seen=last_seen)
-                json_logs: list[LogStreamObject] = []
+                if last_seen is not None:
+                    stream_id_sequence(last_seen)
+                # Catch up with at most stream_size logs, a client that missed
+                # more is told and continues with the new logs
+                logs = await fanout.logs_since(last_seen, config.stream_size)
+                missed_logs = last_seen is not None and len(logs) >= config.stream_size
                 if logs:
-                    for id_, log in logs:
-                        last_seen = id_
-                        if send_all or is_action(
-                            actions_filter, log["action"], exact_match=False
-                        ):
-                            json_logs.append({"id": id_, "log": log})
-
-                    if json_logs:
-                        for batch in batch_logs(json_logs):
-                            response: LogStreamResponse = {
-                                "last_seen_id": batch[-1]["id"],
-                                "logs": batch,
-                                "error": None,
-                            }
-                            await self.send_json(response)
-
+                    last_seen = logs[-1][0]
+                    await send_logs(logs)
             except StreamInvalidID as e:
                 response: LogStreamResponse = {
                     "error": str(e),
@@ -124,7 +123,45 @@ class LogStreamConsumer(AsyncJsonWebsocketConsumer):
                 }
                 await self.send_json(response)
                 raise
-            await asyncio.sleep(0.3)
+
+            if missed_logs:
+                response: LogStreamResponse = {
+                    "error": f"Caught up with the first {config.stream_size} missed logs, "
+                    f"the ones after {last_seen} until now may be missing",
+                    "last_seen_id": last_seen,
+                    "logs": [],
+                }
+                await self.send_json(response)
+
+            while self.connected:
+                try:
+                    logs = await asyncio.wait_for(queue.get(), timeout=1)
+                except asyncio.TimeoutError:
+                    continue
+
+                if logs is None:
+                    response: LogStreamResponse = {
+                        "error": "Log stream is not enabled in your config",
+                        # TODO: should this be None?
+                        "last_seen_id": None,
+                        "logs": [],
+                    }
+                    await self.send_json(response)
+                    return await self.websocket_disconnect()
+
+                # Skip what was already sent while catching up
+                if last_seen is not None:
+                    last_seq = stream_id_sequence(last_seen)
+                    logs = [
+                        (id_, log)
+                        for id_, log in logs
+                        if stream_id_sequence(id_) > last_seq
+                    ]
+                if logs:
+                    last_seen = logs[-1][0]
+                    await send_logs(logs)
+        finally:
+            fanout.unsubscribe(queue)
 
     async def send_json(self, content, close=False):
         return await super().send_json(content, close)
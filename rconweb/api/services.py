@@ -37,7 +37,7 @@ def get_services(request):
     info = {
         "broadcasts": "The automatic broadcasts.",
         "log_event_loop": "Blacklist enforcement, chat/kill forwarding, player history, etc...",
-        "log_stream": "Optionally store game server logs in a redis stream",
+        "snapshot": "Optionally share one view of the server with the automods instead of each polling it",
         "auto_settings": "Applies commands automaticaly based on your rules.",
         "cron": "The scheduler, cleans logs and whatever you added.",
     }
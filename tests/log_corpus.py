@@ -0,0 +1,84 @@
+"""Raw game server log lines (without their time prefix) covering every log type
+
+Used to check the log parser output and measure its throughput.
+"""
+
+from rcon.rcon import Rcon
+from rcon.types import StructuredLogLineWithMetaData
+
+START_TS = 1606340000
+
+RAW_LOG_LINES = [
+    "KILL: Reduktorius(Axis/76561198136839181) -> Loch(Allies/76561198086167606) with FG42 x4",
+    "KILL: Reduktorius(Axis/a21af8b5-59df-5vbr-88gf-ab4239r4g6f4) -> Loch(Allies/76561198086167606) with FG42 x4",
+    "KILL: Reduktorius(Axis/76561198136839181) -> Loch(Allies/a21af8b5-59df-5vbr-88gf-ab4239r4g6f4) with FG42 x4",
+    "KILL: Reduktorius(Axis/a21af8b5-59df-5vbr-88gf-ab4239r4g6fz) -> Loch(Allies/a21af8b5-59df-5vbr-88gf-ab4239r4g6f4) with FG42 x4",
+    "KILL: short(Axis/1234) -> (Axis/76561198136839181) -> Loch(Allies/76561198086167606) with FG42 x4",
+    "KILL: short(Axis/1234) -> (Axis/a21af8b5-59df-5vbr-88gf-ab4239r4g6fz) -> Loch(Allies/76561198086167606) with FG42 x4",
+    "KILL: short(Axis/1234) -> (Axis/76561198136839181) -> Loch(Allies/a21af8b5-59df-5vbr-88gf-ab4239r4g6fz) with FG42 x4",
+    "KILL: short(Axis/1234) -> (Axis/a21af8b5-59df-5vbr-88gf-ab4239r4g6fz) -> Loch(Allies/a21af8b5-59df-5vbr-88gf-ab4239r4g6fx) with FG42 x4",
+    "TEAM KILL: Reduktorius(Axis/76561198136839181) -> Loch(Allies/76561198086167606) with FG42 x4",
+    "TEAM KILL: Reduktorius(Axis/a21af8b5-59df-5vbr-88gf-ab4239r4g6f4) -> Loch(Allies/76561198086167606) with FG42 x4",
+    "TEAM KILL: Reduktorius(Axis/76561198136839181) -> Loch(Allies/a21af8b5-59df-5vbr-88gf-ab4239r4g6f4) with FG42 x4",
+    "TEAM KILL: Reduktorius(Axis/a21af8b5-59df-5vbr-88gf-ab4239r4g6fz) -> Loch(Allies/a21af8b5-59df-5vbr-88gf-ab4239r4g6f4) with FG42 x4",
+    "TEAM KILL: short(Axis/1234) -> (Axis/76561198136839181) -> Loch(Allies/76561198086167606) with FG42 x4",
+    "TEAM KILL: short(Axis/1234) -> (Axis/a21af8b5-59df-5vbr-88gf-ab4239r4g6fz) -> Loch(Allies/76561198086167606) with FG42 x4",
+    "TEAM KILL: short(Axis/1234) -> (Axis/76561198136839181) -> Loch(Allies/a21af8b5-59df-5vbr-88gf-ab4239r4g6fz) with FG42 x4",
+    "TEAM KILL: short(Axis/1234) -> (Axis/a21af8b5-59df-5vbr-88gf-ab4239r4g6fz) -> Loch(Allies/a21af8b5-59df-5vbr-88gf-ab4239r4g6fx) with FG42 x4",
+    "DISCONNECTED The Dandy Man (76561197972905683)",
+    "DISCONNECTED short(Axis/1234) ->  (76561198136839181)",
+    "CONNECTED The Dandy Man (76561197972905683)",
+    "CONNECTED short(Axis/2345) ->  (76561198136839181)",
+    "DISCONNECTED WinstonsDomain (3azzx77e-4ad4-57z3-8gr8-gb9e753e85aq)",
+    "CONNECTED WinstonsDomain (3azzx77e-4ad4-57z3-8gr8-gb9e753e85aq)",
+    "CHAT[Unit][i eat chicken nugget(Allies/76561199004674256)]: were we spawning?",
+    "CHAT[Team][i eat chicken nugget(Allies/76561199004674256)]: were we spawning?",
+    "CHAT[Unit][i eat chicken nugget(Axis/76561199004674256)]: were we spawning?",
+    "CHAT[Team][i eat chicken nugget(Axis/76561199004674256)]: were we spawning?",
+    "CHAT[Unit][WinstonsDomain(Allies/3azzx77e-4ad4-57z3-8gr8-gb9e753e85aq)]: test",
+    "TEAMSWITCH short(Axis/1234) ->  (None > Allies)",
+    "TEAMSWITCH short(Axis/2345) ->  (Allies > None)",
+    "TEAMSWITCH short(Axis/3456) ->  (Axis > None)",
+    "TEAMSWITCH short(Axis/4567) ->  (None > Axis)",
+    "TEAMSWITCH WinstonsDomain (None > Allies)",
+    "KICK: [VegaBond] has been kicked. [BANNED FOR 1 HOURS BY THE ADMINISTRATOR!]",
+    "KICK: [GinPick]ledYak] has been kicked. [PERMANENTLY BANNED BY THE ADMINISTRATOR!]",
+    "BAN: [(WTH) Abusify] has been banned. [BANNED FOR 2 HOURS BY THE ADMINISTRATOR!]",
+    "KICK: [adamtfitz] has been kicked. [YOU WERE KICKED FOR BEING IDLE]",
+    "KICK: [Duolong] has been kicked. [Host closed the connection.]",
+    "KICK: [rowlanjaet] has been kicked. [Anti-Cheat Authentication timed out (1/2)]",
+    "KICK: [-Cosmic-] has been kicked. [KICKED FOR TEAM KILLING!]",
+    "KICK: [RyanJose] has been kicked. [BANNED FOR 2 HOURS FOR TEAM KILLING!]",
+    "KICK: [Elinho] has been kicked. [Kicked for failing auth]",
+    "KICK: [Elinho] has been kicked. [totally new random reason!]",
+    "VOTESYS: Player [Dingbat252] voted [PV_Favour] for VoteID[20]",
+    "VOTESYS: Player [NoodleArms] Started a vote of type (PVR_Kick_Abuse) against [buscÃ´O-sensei]. VoteID: [20]",
+    "VOTESYS: Vote [20] completed. Result: PVR_Passed",
+    "VOTESYS: Vote [10] expired before completion",
+    "VOTESYS: Vote [3] prematurely expired.",
+    "VOTESYS: Vote Kick {buscÃ´O-sensei} successfully passed. [For: 2/1 - Against: 0]",
+    "Player [Fachi (76561198312191879)] Entered Admin Camera",
+    "Player [makL (76561198006123456)] Left Admin Camera",
+    "Player [WinstonsDomain (3azzx77e-4ad4-57z3-8gr8-gb9e753e85aq)] Entered Admin Camera",
+    "Player [WinstonsDomain (3azzx77e-4ad4-57z3-8gr8-gb9e753e85aq)] Left Admin Camera",
+    "Player [short(Axis/1234) ->  (76561198312191879)] Entered Admin Camera",
+    "MATCH START SAINTE-MÈRE-ÉGLISE WARFARE",
+    "MATCH ENDED `CARENTAN WARFARE` ALLIED (0 - 5) AXIS",
+    "MESSAGE: player [Tacsquatch(76561198062837577)], content [Please ignore this just need a message in the RCON logs to test something.]",
+    "MESSAGE: player [WinstonsDomain(3azzx77e-4ad4-57z3-8gr8-gb9e753e85aq)], content [Please ignore this just need a message in the RCON logs to test something.]",
+    "MESSAGE: player [ð\x9d“¼ð\x9d“ºð\x9d“¾ð\x9d“²ð\x9d“\xadð\x9d“\xad [KRKN](76561198370630324)], content [please ignore this\nI just need a multiline message in the RCON logs\nto test something]",
+    "MESSAGE: player [WinstonsDomain(3azzx77e-4ad4-57z3-8gr8-gb9e753e85aq)], content [please ignore this\nI just need a multiline message in the RCON logs\nto test something]",
+    "CHAT[Global][Bob(Allies/76561198000000001)]: not a team or unit chat",
+    "UNKNOWN EVENT something happened",
+    "KILL: malformed kill line",
+]
+
+
+def parsed_logs(count: int) -> list[StructuredLogLineWithMetaData]:
+    """Logs oldest first, 10 per second"""
+    lines = RAW_LOG_LINES * (count // len(RAW_LOG_LINES) + 1)
+    raw = [
+        f"[{i % 60}:00 min ({START_TS + i // 10})] {line}"
+        for i, line in enumerate(lines[:count])
+    ]
+    return list(Rcon.iter_parsed_logs(raw))
@@ -0,0 +1,119 @@
+import datetime
+import os
+import pickle
+
+import fakeredis
+import pytest
+
+os.environ.setdefault("HLL_MAINTENANCE_CONTAINER", "1")
+os.environ.setdefault("SERVER_NUMBER", "1")
+
+from rcon.cache_utils import JSON_CODEC, PICKLE_CODEC, RedisCached, ValueCodec
+from rcon.rcon import Rcon
+
+
+def _noop():
+    pass
+
+
+def make_cached(**kwargs):
+    kwargs.setdefault("serializer", PICKLE_CODEC.dumps)
+    kwargs.setdefault("deserializer", PICKLE_CODEC.loads)
+    return RedisCached(
+        pool=None, red=fakeredis.FakeRedis(), ttl_seconds=60, function=_noop, **kwargs
+    )
+
+
+def legacy_key(cached: RedisCached, *args, **kwargs):
+    """How keys were built before they were hashed"""
+    if cached.is_method:
+        args = args[1:]
+    params = pickle.dumps({"args": args, "kwargs": kwargs})
+    return cached.key_prefix.encode() + b"__" + params
+
+
+def test_keys_are_stable_and_distinct():
+    cached = make_cached()
+
+    assert cached.key() == f"{cached.key_prefix}__"
+    assert cached.key(1, b=2, c="x") == cached.key(1, c="x", b=2)
+    assert cached.key(1) != cached.key(True)
+    assert cached.key(1) != cached.key("1")
+    assert cached.key(["a", "b"]) == cached.key(["a", "b"])
+    assert cached.key(["a", "b"]) != cached.key(["b", "a"])
+    assert len(cached.key("x" * 10_000)) < 100
+
+
+def test_methods_ignore_self_and_key_func_replaces_arguments():
+    method = make_cached(is_method=True)
+    assert method.key(object(), 1) == method.key(object(), 1)
+
+    custom = make_cached(key_func=lambda ids, sess=None: ",".join(sorted(ids)))
+    assert custom.key(["b", "a"], sess=object()) == custom.key(["a", "b"])
+
+
+def test_clear_all_only_clears_its_own_function():
+    red = fakeredis.FakeRedis()
+    get_map = RedisCached(None, 60, _noop, red=red)
+    get_map.function = lambda: None
+    get_map.function.__qualname__ = "Rcon.get_map"
+    red.set("cached_Rcon.get_map__", b"1")
+    red.set("cached_Rcon.get_maps__", b"1")
+
+    get_map.clear_all()
+
+    assert red.keys() == [b"cached_Rcon.get_maps__"]
+
+
+@pytest.mark.parametrize(
+    "codec, value, tag",
+    [
+        (PICKLE_CODEC, {"a": (1, 2)}, ValueCodec.PICKLE),
+        (JSON_CODEC, {"a": [1, 2], "b": None, "c": "d"}, ValueCodec.JSON),
+        # Not JSON safe, falls back to pickle
+        (JSON_CODEC, {"a": datetime.datetime(2024, 1, 1)}, ValueCodec.PICKLE),
+        (JSON_CODEC, {1: "int keys"}, ValueCodec.PICKLE),
+        (ValueCodec(compress_above=100), ["x" * 200], ValueCodec.PICKLE_ZLIB),
+        (ValueCodec(json=True, compress_above=100), ["x" * 200], ValueCodec.JSON_ZLIB),
+        (ValueCodec(compress_above=100), ["small"], ValueCodec.PICKLE),
+    ],
+)
+def test_codec_round_trip(codec, value, tag):
+    data = codec.dumps(value)
+
+    assert data[:1] == tag
+    assert codec.loads(data) == value
+
+
+def test_codec_reads_untagged_pickles_and_rejects_unknown_formats():
+    assert JSON_CODEC.loads(pickle.dumps({"a": 1})) == {"a": 1}
+    with pytest.raises(ValueError):
+        PICKLE_CODEC.loads(b"?garbage")
+
+
+def test_cache_keys_of_rcon_methods_are_shorter_than_legacy_keys():
+    methods = [
+        attr.__wrapped__
+        for attr in vars(Rcon).values()
+        if callable(attr) and hasattr(attr, "cache_clear")
+    ]
+    assert methods
+    cached_methods = [
+        RedisCached(
+            None,
+            60,
+            m,
+            red=fakeredis.FakeRedis(),
+            is_method=True,
+            serializer=pickle.dumps,
+        )
+        for m in methods
+    ]
+    rcon = object()
+    calls = [((rcon,), {}), ((rcon, 5), {"filter_action": "KILL"})]
+
+    for cached in cached_methods:
+        for args, kwargs in calls:
+            key = cached.key(*args, **kwargs)
+            assert key == cached.key(*args, **kwargs)
+            assert len(key) < len(legacy_key(cached, *args, **kwargs))
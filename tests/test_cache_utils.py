@@ -1,11 +1,22 @@
 import os
+import pickle
+import threading
+import time
 from logging import getLogger
 from unittest import mock
 
+import fakeredis
 import redis
 import redis.exceptions
 
-from rcon.cache_utils import RedisCached, ttl_cache
+from rcon.cache_utils import (
+    INVALIDATION_CHANNEL,
+    LOCAL_CACHE_INVALIDATOR,
+    LocalCacheInvalidator,
+    RedisCached,
+    _key_token,
+    ttl_cache,
+)
 
 logger = getLogger(__name__)
 
@@ -25,6 +36,10 @@ def _needs_qual_name():
     pass
 
 
+def _other_qual_name():
+    pass
+
+
 def test_cache_unavailable(monkeypatch):
     cached_func = mock.Mock(spec=_needs_qual_name)
     uncached_func = mock.Mock(spec=_needs_qual_name)
@@ -72,3 +87,203 @@ def test_mem_cache_used(monkeypatch):
     # so we can't isinstance check it
     c = ttl_cache(ttl=1)
     assert not isinstance(c, RedisCached)
+
+
+def _local_cached(red, func, local_ttl_seconds=10):
+    return RedisCached(
+        pool=None,
+        red=red,
+        ttl_seconds=60,
+        function=func,
+        serializer=pickle.dumps,
+        deserializer=pickle.loads,
+        local_ttl_seconds=local_ttl_seconds,
+    )
+
+
+def test_local_cache_skips_redis_on_hit():
+    red = fakeredis.FakeRedis()
+    func = mock.Mock(spec=_needs_qual_name, return_value={"map": "foy"})
+    c = _local_cached(red, func)
+
+    assert c("a") == {"map": "foy"}
+    red.flushall()
+    # Served from the local cache, Redis no longer has it
+    assert c("a") == {"map": "foy"}
+    # Every hit returns a fresh copy
+    assert c("a") is not c("a")
+
+    func.assert_called_once()
+    assert c.stats["misses"] == 1
+    assert c.stats["local_hits"] == 3
+
+
+def test_local_cache_expires_and_falls_back_to_redis():
+    red = fakeredis.FakeRedis()
+    func = mock.Mock(spec=_needs_qual_name, return_value="value")
+    c = _local_cached(red, func, local_ttl_seconds=0.05)
+
+    c()
+    time.sleep(0.1)
+    assert c() == "value"
+
+    func.assert_called_once()
+    assert c.stats["local_stale"] == 1
+    assert c.stats["hits"] == 1
+
+
+def test_clearing_broadcasts_local_invalidations():
+    server = fakeredis.FakeServer()
+    func = mock.Mock(spec=_needs_qual_name, side_effect=["first", "second", "third"])
+    c = _local_cached(fakeredis.FakeRedis(server=server), func)
+    invalidator = LocalCacheInvalidator()
+    invalidator.register(c)
+    threading.Thread(
+        target=invalidator.listen,
+        args=(fakeredis.FakeRedis(server=server),),
+        daemon=True,
+    ).start()
+
+    assert c(1) == "first"
+    assert c(2) == "second"
+
+    other_process = fakeredis.FakeRedis(server=server)
+    deadline = time.monotonic() + 5
+    while not other_process.pubsub_numsub(INVALIDATION_CHANNEL)[0][1]:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    # Another process clears a single key in Redis and broadcasts it
+    key = c.key(1)
+    other_process.delete(key)
+    LOCAL_CACHE_INVALIDATOR.publish(other_process, c.key_prefix, key)
+    deadline = time.monotonic() + 5
+    while _key_token(key) in c.local_cache:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    assert c(1) == "third"
+    assert c(2) == "second"
+
+    invalidator.apply(c.key_prefix + "\n")
+    assert len(c.local_cache) == 0
+
+
+class _StopListening(BaseException):
+    pass
+
+
+def test_idle_invalidation_channel_keeps_local_caches():
+    func = mock.Mock(spec=_needs_qual_name, return_value="value")
+    c = _local_cached(fakeredis.FakeRedis(), func)
+    other = _local_cached(
+        fakeredis.FakeRedis(),
+        mock.Mock(spec=_other_qual_name, return_value="value"),
+    )
+    invalidator = LocalCacheInvalidator()
+    invalidator.register(c)
+    invalidator.register(other)
+    c(1)
+    other(1)
+
+    red = mock.Mock()
+    pubsub = red.pubsub.return_value
+    # A quiet channel only times out the poll, the subscription is kept
+    pubsub.get_message.side_effect = [
+        None,
+        None,
+        {"data": (c.key_prefix + "\n").encode()},
+        _StopListening,
+    ]
+    try:
+        invalidator.listen(red)
+    except _StopListening:
+        pass
+
+    pubsub.subscribe.assert_called_once_with(INVALIDATION_CHANNEL)
+    assert len(c.local_cache) == 0
+    assert len(other.local_cache) == 1
+
+
+def _stale_cached(red, func, ttl_seconds=1, stale_ttl_seconds=5, **kwargs):
+    return RedisCached(
+        pool=None,
+        red=red,
+        ttl_seconds=ttl_seconds,
+        function=func,
+        serializer=pickle.dumps,
+        deserializer=pickle.loads,
+        stale_ttl_seconds=stale_ttl_seconds,
+        **kwargs,
+    )
+
+
+def _wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_stale_value_is_served_while_refreshing_in_background():
+    red = fakeredis.FakeRedis()
+    func = mock.Mock(spec=_needs_qual_name, side_effect=["old", "new"])
+    c = _stale_cached(red, func)
+
+    assert c() == "old"
+    assert 5000 < red.pttl(c.key()) <= 6000
+    time.sleep(1.1)
+
+    assert c() == "old"
+    _wait_until(lambda: func.call_count == 2 and not red.exists(c.lock_key(c.key())))
+    assert c() == "new"
+    assert c.stats["stale_hits"] == 1
+    assert c.stats["background_refreshes"] == 1
+
+
+def test_hot_keys_are_refreshed_ahead_of_expiry():
+    red = fakeredis.FakeRedis()
+    func = mock.Mock(spec=_needs_qual_name, side_effect=["first", "second"])
+    # fakeredis tracks expiry with one second precision, leave enough margin
+    c = _stale_cached(red, func, ttl_seconds=4, stale_ttl_seconds=1, refresh_ahead=0.5)
+
+    assert c() == "first"
+    c(), c()
+    time.sleep(2.1)
+    assert func.call_count == 1
+
+    # Third read within the last half of the TTL
+    assert c() == "first"
+    _wait_until(lambda: func.call_count == 2 and not red.exists(c.lock_key(c.key())))
+    assert c() == "second"
+    assert c.stats["refresh_ahead"] == 1
+
+
+def test_callers_are_woken_up_when_the_refresh_is_stored():
+    server = fakeredis.FakeServer()
+    red = fakeredis.FakeRedis(server=server)
+    func = mock.Mock(spec=_needs_qual_name, return_value="computed")
+    c = RedisCached(
+        pool=None,
+        red=red,
+        ttl_seconds=60,
+        function=func,
+        serializer=pickle.dumps,
+        deserializer=pickle.loads,
+    )
+    # Another process holds the refresh lock
+    red.set(c.lock_key(c.key()), "other")
+    results = []
+    thread = threading.Thread(target=lambda: results.append(c()))
+    thread.start()
+
+    _wait_until(lambda: red.pubsub_numsub(c.refresh_channel(c.key()))[0][1])
+    started = time.monotonic()
+    leader = fakeredis.FakeRedis(server=server)
+    leader.setex(c.key(), 60, pickle.dumps("from leader"))
+    leader.publish(c.refresh_channel(c.key()), "1")
+    thread.join(timeout=5)
+
+    assert results == ["from leader"]
+    assert time.monotonic() - started < 1
+    func.assert_not_called()
@@ -0,0 +1,584 @@
+import asyncio
+import base64
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+os.environ.setdefault("HLL_MAINTENANCE_CONTAINER", "1")
+
+from rcon.connection import (
+    HEADER_FORMAT,
+    MAGIC_HEADER_VALUE,
+    AsyncHLLConnection,
+    ConnectionPool,
+    HLLBrokenConnectionError,
+    HLLCommandError,
+    HLLConnection,
+    PipelinedHLLConnection,
+)
+
+XOR_KEY = b"\x13\x37\xbe\xef"
+HEADER_LEN = struct.calcsize(HEADER_FORMAT)
+
+
+def xor(data: bytes, key: bytes | None) -> bytes:
+    if not key:
+        return data
+    return bytes(b ^ key[i % len(key)] for i, b in enumerate(data))
+
+
+def recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError
+        data += chunk
+    return data
+
+
+class FakeServer:
+    """Minimal game server that answers `batch_size` requests at once in reverse order"""
+
+    def __init__(
+        self,
+        batch_size: int = 1,
+        chunk_size: int | None = None,
+        max_clients: int | None = 1,
+    ) -> None:
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.max_clients = max_clients
+        self.clients = 0
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def reply(self, client, key, request_id, name, content, status=200):
+        body = json.dumps(
+            {
+                "name": name,
+                "version": 2,
+                "statusCode": status,
+                "statusMessage": "",
+                "contentBody": content,
+            }
+        ).encode()
+        header = struct.pack(HEADER_FORMAT, MAGIC_HEADER_VALUE, request_id, len(body))
+        message = header + xor(body, key)
+        if self.chunk_size is None:
+            client.sendall(message)
+            return
+        # Force the client to deal with short reads, including on the header
+        for start in range(0, len(message), self.chunk_size):
+            client.sendall(message[start : start + self.chunk_size])
+            time.sleep(0.001)
+
+    def serve(self):
+        clients = 0
+        while self.max_clients is None or clients < self.max_clients:
+            try:
+                client, _ = self.listener.accept()
+            except OSError:
+                return
+            clients += 1
+            self.clients += 1
+            threading.Thread(target=self.handle, args=(client,), daemon=True).start()
+        self.listener.close()
+
+    def handle(self, client):
+        key = None
+        queued = []
+        try:
+            while True:
+                _, request_id, body_len = struct.unpack(
+                    HEADER_FORMAT, recv_exact(client, HEADER_LEN)
+                )
+                request = json.loads(xor(recv_exact(client, body_len), key))
+                if request["name"] == "ServerConnect":
+                    self.reply(
+                        client,
+                        key,
+                        request_id,
+                        "ServerConnect",
+                        base64.b64encode(XOR_KEY).decode(),
+                    )
+                    key = XOR_KEY
+                elif request["name"] == "Login":
+                    self.reply(client, key, request_id, "Login", "token")
+                else:
+                    queued.append((request_id, request))
+                    if len(queued) < self.batch_size:
+                        continue
+                    for queued_id, queued_request in reversed(queued):
+                        if queued_request["contentBody"] == "fail":
+                            self.reply(
+                                client,
+                                key,
+                                queued_id,
+                                queued_request["name"],
+                                "",
+                                status=400,
+                            )
+                        elif queued_request["contentBody"] == "error":
+                            self.reply(
+                                client,
+                                key,
+                                queued_id,
+                                queued_request["name"],
+                                "",
+                                status=500,
+                            )
+                        else:
+                            self.reply(
+                                client,
+                                key,
+                                queued_id,
+                                queued_request["name"],
+                                queued_request["contentBody"],
+                            )
+                    queued.clear()
+        except (ConnectionError, OSError, struct.error):
+            pass
+        finally:
+            client.close()
+
+
+def test_blocking_connection_caches_out_of_order_responses():
+    server = FakeServer(batch_size=2)
+    conn = HLLConnection()
+    conn.connect("127.0.0.1", server.port, "password")
+
+    first = conn.send("Echo", 2, "first")
+    second = conn.send("Echo", 2, "second")
+
+    assert first.receive().content == "first"
+    assert second.receive().content == "second"
+    conn.close()
+
+
+def test_receive_handles_short_reads_and_reuses_its_buffer():
+    server = FakeServer(chunk_size=5)
+    conn = HLLConnection()
+    conn.connect("127.0.0.1", server.port, "password")
+
+    assert conn.exchange("Echo", 2, "x" * 2000).content == "x" * 2000
+    buffer = conn._recv_buffer
+    assert len(buffer) > 2000
+
+    assert conn.exchange("Echo", 2, "small").content == "small"
+    assert conn.exchange("Echo", 2, "y" * 100).content == "y" * 100
+    assert conn._recv_buffer is buffer
+    conn.close()
+
+
+def test_receive_raises_when_server_closes_mid_frame():
+    listener = socket.create_server(("127.0.0.1", 0))
+    conn = HLLConnection()
+    conn.sock.connect(listener.getsockname())
+    server_side, _ = listener.accept()
+    server_side.sendall(struct.pack(HEADER_FORMAT, MAGIC_HEADER_VALUE, 1, 100)[:6])
+    server_side.close()
+
+    with pytest.raises(HLLBrokenConnectionError):
+        conn.receive(1)
+    conn.close()
+    listener.close()
+
+
+def test_pipelined_connection_demultiplexes_responses():
+    server = FakeServer(batch_size=10)
+    conn = PipelinedHLLConnection()
+    conn.connect("127.0.0.1", server.port, "password")
+    assert conn.auth_token == "token"
+    assert conn.is_alive()
+
+    handles = [conn.send("Echo", 2, f"payload-{i}") for i in range(10)]
+
+    assert [h.receive().content for h in handles] == [f"payload-{i}" for i in range(10)]
+    conn.close()
+    assert not conn.is_alive()
+
+
+def test_pipelined_connection_is_shared_between_threads():
+    server = FakeServer(batch_size=8)
+    conn = PipelinedHLLConnection()
+    conn.connect("127.0.0.1", server.port, "password")
+    results: dict[int, str] = {}
+
+    def worker(i: int):
+        results[i] = conn.exchange("Echo", 2, f"thread-{i}").content
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert results == {i: f"thread-{i}" for i in range(8)}
+    conn.close()
+
+
+def test_pipelined_connection_fails_pending_requests_when_broken():
+    server = FakeServer(batch_size=2)
+    conn = PipelinedHLLConnection()
+    conn.connect("127.0.0.1", server.port, "password")
+
+    handle = conn.send("Echo", 2, "never answered")
+    conn.close()
+
+    with pytest.raises(HLLBrokenConnectionError):
+        handle.receive()
+    with pytest.raises(HLLBrokenConnectionError):
+        conn.send("Echo", 2, "after close")
+
+
+def test_pipelined_connection_keeps_every_request_in_flight():
+    server = FakeServer(batch_size=1500)
+    conn = PipelinedHLLConnection()
+    conn.connect("127.0.0.1", server.port, "password")
+
+    handles = [conn.send("Echo", 2, f"payload-{i}") for i in range(1500)]
+
+    assert [h.receive().content for h in handles] == [
+        f"payload-{i}" for i in range(1500)
+    ]
+    assert not conn._pending
+    conn.close()
+
+
+def make_server_ctl(port: int, **kwargs):
+    from rcon.commands import ServerCtl
+    from rcon.perf_statistics import PerformanceStatistics
+    from rcon.types import ServerInfo
+
+    return ServerCtl(
+        ServerInfo(host="127.0.0.1", port=port, password="password"),
+        PerformanceStatistics("test"),
+        auto_retry=False,
+        **kwargs,
+    )
+
+
+def test_exchange_many_pipelines_a_batch():
+    server = FakeServer(batch_size=3)
+    ctl = make_server_ctl(server.port)
+
+    responses = ctl.exchange_many(
+        [("Echo", 2, "first"), ("Echo", 2, "fail"), ("Echo", 2, "third")]
+    )
+
+    assert responses[0].content == "first"
+    assert responses[1] is None
+    assert responses[2].content == "third"
+    assert ctl.get_pipelined_connection() is ctl.get_pipelined_connection()
+    ctl.get_pipelined_connection().close()
+
+
+def test_exchange_many_handles_an_internal_error_in_a_batch():
+    server = FakeServer(batch_size=3)
+    ctl = make_server_ctl(server.port)
+    commands = [("Echo", 2, "first"), ("Echo", 2, "error"), ("Echo", 2, "third")]
+
+    responses = ctl.exchange_many(commands, ignore_internal_errors=True)
+    assert [r and r.content for r in responses] == ["first", None, "third"]
+
+    with pytest.raises(HLLCommandError):
+        ctl.exchange_many(commands)
+    # The response of the command after the error is not waited for anymore
+    assert ctl.get_pipelined_connection()._pending == {}
+    ctl.get_pipelined_connection().close()
+
+
+def test_exchange_many_resends_when_the_pipelined_connection_breaks():
+    server = FakeServer(max_clients=None)
+    ctl = make_server_ctl(server.port)
+    ctl.auto_retry = 1
+    conn = ctl.get_pipelined_connection()
+    send = conn.send
+
+    def send_then_break(*args):
+        handle = send(*args)
+        conn.close()
+        return handle
+
+    conn.send = send_then_break
+
+    responses = ctl.exchange_many([("Echo", 2, "first"), ("Echo", 2, "second")])
+
+    assert [r.content for r in responses] == ["first", "second"]
+
+
+def test_bulk_message_players_fails_on_a_broken_connection():
+    server = FakeServer()
+    ctl = make_server_ctl(server.port)
+    conn = ctl.get_pipelined_connection()
+    conn.close()
+    ctl.get_pipelined_connection = lambda: conn
+
+    assert ctl.bulk_message_players(["1", "2"], ["a", "b"]) is False
+
+
+def test_async_connection_demultiplexes_responses():
+    server = FakeServer(batch_size=5)
+
+    async def run():
+        conn = AsyncHLLConnection()
+        await conn.connect("127.0.0.1", server.port, "password")
+        futures = [await conn.send("Echo", 2, f"payload-{i}") for i in range(5)]
+        contents = [(await f).content for f in futures]
+        await conn.close()
+        return contents
+
+    assert asyncio.run(run()) == [f"payload-{i}" for i in range(5)]
+
+
+def test_async_server_ctl_fans_out_and_times_out():
+    from rcon.commands import AsyncServerCtl
+    from rcon.types import ServerInfo
+
+    server = FakeServer(batch_size=3)
+    ctl = AsyncServerCtl(
+        ServerInfo(host="127.0.0.1", port=server.port, password="password"),
+        timeout=0.5,
+    )
+
+    async def run():
+        responses = await ctl.exchange_many(
+            [("Echo", 2, "first"), ("Echo", 2, "fail"), ("Echo", 2, "third")]
+        )
+        get_connection = ctl.get_connection
+        ctl.get_connection = Mock(side_effect=get_connection)
+        # The fake server waits for a full batch, so a lone command never completes
+        with pytest.raises(TimeoutError):
+            await ctl.exchange("Echo", 2, "lonely")
+        await ctl.close()
+        return responses
+
+    responses = asyncio.run(run())
+    # Timed out commands are not retried
+    ctl.get_connection.assert_called_once()
+    assert responses[0].content == "first"
+    assert responses[1] is None
+    assert responses[2].content == "third"
+
+
+class FakeConnection:
+    def __init__(self) -> None:
+        self.id = f"fake-{id(self)}"
+        self.alive = True
+        self.closed = False
+
+    def is_alive(self) -> bool:
+        return self.alive and not self.closed
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    stats: dict[str, int] = {}
+    created: list[FakeConnection] = []
+
+    def factory():
+        created.append(FakeConnection())
+        return created[-1]
+
+    def record(metric, value):
+        stats[metric] = stats.get(metric, 0) + value
+
+    kwargs.setdefault("lease_timeout", 0.1)
+    return ConnectionPool(factory, stats=record, **kwargs), created, stats
+
+
+def lease_in_thread(pool: ConnectionPool, stop: threading.Event):
+    """Lease from a thread that lives until `stop` is set, return the connection or the error"""
+    result = []
+    leased = threading.Event()
+
+    def lease():
+        try:
+            result.append(pool.lease())
+        except Exception as e:
+            result.append(e)
+        leased.set()
+        stop.wait(5)
+
+    threading.Thread(target=lease, daemon=True).start()
+    leased.wait(5)
+    return result[0]
+
+
+def test_pool_reuses_released_connections_and_is_bounded():
+    pool, created, stats = make_pool(max_size=2)
+
+    stop = threading.Event()
+    first = pool.lease()
+    pool.release(first)
+    assert pool.lease() is first
+    second = lease_in_thread(pool, stop)
+    assert second is not first
+
+    assert isinstance(lease_in_thread(pool, stop), TimeoutError)
+    stop.set()
+
+    assert len(created) == 2
+    assert pool.size == pool.leased == 2
+    assert stats["connection_established"] == 2
+    assert stats["connection_from_pool"] == 1
+    assert stats["pool_saturated"] == 1
+    assert stats["pool_wait_ms"] >= 100
+
+
+def test_pool_lease_is_reentrant_per_thread():
+    pool, created, stats = make_pool(max_size=1)
+
+    conn = pool.lease()
+    assert pool.lease() is conn
+    pool.release(conn, broken=True)
+    assert pool.leased == 1 and not conn.closed
+
+    pool.release(conn)
+    assert conn.closed and pool.size == 0
+    assert stats["connection_lease_reused"] == 1
+    assert "pool_saturated" not in stats
+
+
+def test_pool_records_stats_outside_its_lock_and_survives_failures():
+    created: list[FakeConnection] = []
+    held_lock = []
+
+    def factory():
+        created.append(FakeConnection())
+        return created[-1]
+
+    def stats(metric, value):
+        held_lock.append(pool._cond._is_owned())
+        raise ConnectionError("redis is down")
+
+    pool = ConnectionPool(factory, max_size=1, lease_timeout=0.1, stats=stats)
+
+    conn = pool.lease()
+    pool.release(conn)
+    assert pool.lease() is conn
+    pool.release(conn)
+
+    assert held_lock and not any(held_lock)
+    assert (pool.size, pool.leased, pool.idle) == (1, 0, 1)
+
+
+def test_pool_hands_over_to_waiting_thread():
+    pool, created, stats = make_pool(max_size=1, lease_timeout=5)
+    conn = pool.lease()
+    leased = []
+
+    waiter = threading.Thread(target=lambda: leased.append(pool.lease()))
+    waiter.start()
+    time.sleep(0.05)
+    pool.release(conn)
+    waiter.join(timeout=5)
+
+    assert leased == [conn]
+    assert stats["pool_saturated"] == 1
+    assert stats["pool_wait_ms"] >= 50
+
+
+def test_pool_replaces_broken_and_dead_connections():
+    pool, created, stats = make_pool(max_size=2)
+
+    conn = pool.lease()
+    pool.release(conn, broken=True)
+    assert conn.closed and pool.size == 0
+
+    conn = pool.lease()
+    pool.release(conn)
+    conn.alive = False
+    replacement = pool.lease()
+
+    assert replacement is not conn
+    assert conn.closed
+    assert stats["connection_probe_failed"] == 1
+    assert stats["connection_closed"] == 2
+
+
+def test_pool_evicts_idle_connections_down_to_min_size():
+    pool, created, stats = make_pool(min_size=1, max_size=3, idle_timeout=0.05)
+    stop = threading.Event()
+    conns = [lease_in_thread(pool, stop) for _ in range(3)]
+    for conn in conns:
+        pool.release(conn)
+    stop.set()
+    assert pool.idle == 3
+
+    time.sleep(0.1)
+    kept = pool.lease()
+
+    assert kept is conns[-1]
+    assert [c.closed for c in conns] == [True, True, False]
+    assert stats["connection_evicted_idle"] == 2
+
+
+def test_pool_reclaims_connections_of_exited_threads():
+    pool, created, stats = make_pool(max_size=1)
+    leaked = []
+    thread = threading.Thread(target=lambda: leaked.append(pool.lease()))
+    thread.start()
+    thread.join()
+
+    conn = pool.lease()
+
+    assert conn is not leaked[0]
+    assert leaked[0].closed
+    assert stats["connection_evicted_dead_thread"] == 1
+    # Releasing a reclaimed connection is a no-op
+    pool.release(leaked[0])
+    assert pool.leased == 1
+
+
+def test_connection_liveness_probe_detects_server_close():
+    listener = socket.create_server(("127.0.0.1", 0))
+    conn = HLLConnection()
+    conn.sock.connect(listener.getsockname())
+    server_side, _ = listener.accept()
+
+    assert conn.is_alive()
+    server_side.close()
+    time.sleep(0.05)
+    assert not conn.is_alive()
+
+    conn.close()
+    assert not conn.is_alive()
+    listener.close()
+
+
+def test_server_ctl_leases_connection_until_response_is_received():
+    server = FakeServer(max_clients=None)
+    ctl = make_server_ctl(server.port, max_connections=2)
+
+    handle = ctl.send("Echo", 2, "held")
+    assert ctl.pool.leased == 1
+    assert ctl.receive(handle).content == "held"
+    assert ctl.pool.leased == 0 and ctl.pool.idle == 1
+
+    results: dict[int, str] = {}
+
+    def worker(i: int):
+        for j in range(5):
+            results[i * 5 + j] = ctl.exchange("Echo", 2, f"{i}-{j}").content
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert results == {i * 5 + j: f"{i}-{j}" for i in range(6) for j in range(5)}
+    assert server.clients <= 2
+    ctl.pool.close()
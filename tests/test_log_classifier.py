@@ -0,0 +1,229 @@
+import re
+from typing import Iterable
+
+import pytest
+
+from rcon.rcon import Rcon
+from rcon.types import StructuredLogLineType
+from tests.log_corpus import RAW_LOG_LINES
+
+
+# Parser prior to the prefix dispatch, kept as a reference
+def legacy_parse_log_line(raw_line: str) -> StructuredLogLineType:
+    """Parse a single raw RCON log event or raise a ValueError"""
+
+    player: str | None = None
+    player2: str | None = None
+    player_id_1: str | None = None
+    player_id_2: str | None = None
+    weapon: str | None = None
+    action: str | None = None
+    content: str = raw_line
+    sub_content: str | None = None
+
+    if raw_line.startswith("KILL") or raw_line.startswith("TEAM KILL"):
+        # KILL: Muctar(Axis/71234567891234567) -> Chris(Allies/71234567891234576) with GEWEHR 43
+        # TEAM KILL: SonofJack(Allies/71234567891234567) -> Joseph Cannon(Allies/71234567891234576) with M1 GARAND
+        action, content = raw_line.split(": ", 1)
+        if match := re.match(Rcon.kill_teamkill_pattern, content):
+            player, player_id_1, player2, player_id_2, weapon = match.groups()
+        else:
+            raise ValueError(f"Unable to parse line: {raw_line}")
+    elif raw_line.startswith("DISCONNECTED") or raw_line.startswith("CONNECTED"):
+        action, name_and_player_id = raw_line.split(" ", 1)
+        if match := re.match(Rcon.connect_disconnect_pattern, name_and_player_id):
+            player, player_id_1 = match.groups()
+            content = name_and_player_id
+        else:
+            raise ValueError(f"Unable to parse line: {raw_line}")
+    elif raw_line.startswith("CHAT"):
+        # CHAT[Team][Azure(Allies/71234567891234567)]: supply truck bot hq for nodes
+        # CHAT[Unit][dominguez1987(Axis/71234567891234567)]: back
+        if match := Rcon.chat_regexp.match(raw_line):
+            scope, player, side, player_id_1, sub_content = match.groups()
+            action = f"CHAT[{side}][{scope}]"
+            content = f"{player}: {sub_content} ({player_id_1})"
+    elif raw_line.upper().startswith("TEAMSWITCH"):
+        # TEAMSWITCH Plebs_23 (Axis > None)
+        # TEAMSWITCH SupremeOneechan (None > Allies)
+        action = "TEAMSWITCH"
+        if match := re.match(Rcon.teamswitch_pattern, raw_line):
+            player, sub_content = match.groups()
+        else:
+            raise ValueError(f"Unable to parse line: {raw_line}")
+    elif raw_line.startswith("KICK") or raw_line.startswith("BAN"):
+        if match := re.match(Rcon.kick_ban_pattern, raw_line):
+            _action, player, sub_content, type_ = match.groups()
+        else:
+            raise ValueError(f"Unable to parse line: {raw_line}")
+
+        if type_ == "PERMANENTLY":
+            type_ = "PERMA BANNED"
+        elif type_ == "YOU":
+            type_ = "IDLE"
+        elif type_ == "Host":
+            type_ = ""
+        elif type_ == "Anti-Cheat":
+            type_ = "ANTI-CHEAT"
+        elif type_ == "KICKED":
+            type_ = "KICKED"
+        elif type_ == "BANNED":
+            type_ = "BANNED"
+        else:
+            type_ = "MISC"
+
+        action = f"ADMIN {type_}".strip()
+
+        if "FOR TEAM KILLING" in raw_line:
+            action = f"TK AUTO {type_}"
+
+        # Reconstruct the log line without the newlines and tack on the trailing ] we lose
+        content = f"{_action}: [{player}] {sub_content}"
+        if content[-1] != "]":
+            content += "]"
+            sub_content = sub_content + "]" if sub_content else ""
+    elif raw_line.startswith("VOTE"):
+        action = "VOTE"
+
+        _, sub_content = raw_line.split("VOTESYS: ", 1)
+        content = sub_content
+
+        # VOTESYS: Player [Dingbat252] voted [PV_Favour] for VoteID[2]
+        if match := re.match(Rcon.vote_pattern, raw_line):
+            player = match.groups()[0]
+        # VOTESYS: Player [NoodleArms] Started a vote of type (PVR_Kick_Abuse) against [buscÃ´O-sensei]. VoteID: [2]
+        elif match := re.match(
+            Rcon.vote_started_pattern,
+            raw_line,
+        ):
+            action = "VOTE STARTED"
+            player, player2 = match.groups()
+        # VOTESYS: Vote [2] completed. Result: PVR_Passed
+        elif match := re.match(Rcon.vote_complete_pattern, raw_line):
+            action = "VOTE COMPLETED"
+        # VOTESYS: Vote [1] expired before completion.
+        elif match := re.match(Rcon.vote_expired_pattern, raw_line):
+            action = "VOTE EXPIRED"
+        # VOTESYS: Vote Kick {buscÃ´O-sensei} successfully passed. [For: 2/1 - Against: 0]
+        elif match := re.match(Rcon.vote_passed_pattern, raw_line):
+            action = "VOTE PASSED"
+            content, player, sub_content = match.groups()
+        else:
+            raise ValueError(f"Unable to parse line: {raw_line}")
+
+    elif raw_line.upper().startswith("PLAYER"):
+        # Player [Fachi (71234567891234567)] Entered Admin Camera
+        action = "CAMERA"
+        _, content = raw_line.split(" ", 1)
+
+        if match := re.match(Rcon.camera_pattern, content):
+            player, player_id_1, sub_content = match.groups()
+        else:
+            raise ValueError(f"Unable to parse line: {raw_line}")
+
+    elif raw_line.upper().startswith("MATCH START"):
+        # MATCH START UTAH BEACH WARFARE
+        action = "MATCH START"
+        _, sub_content = raw_line.split("MATCH START ")
+        content = raw_line
+    elif raw_line.upper().startswith("MATCH ENDED"):
+        # MATCH ENDED `Kharkov WARFARE` ALLIED (0 - 5) AXIS
+        action = "MATCH ENDED"
+        _, sub_content = raw_line.split("MATCH ENDED ")
+    elif raw_line.upper().startswith("MESSAGE"):
+        action = "MESSAGE"
+        raw_line = raw_line.replace("\n", " ")
+        content = raw_line
+        if match := re.match(Rcon.message_pattern, raw_line):
+            player, player_id_1, message_content = match.groups()
+            content = f"{player}({player_id_1}): {message_content}"
+            sub_content = message_content
+        else:
+            raise ValueError(f"Unable to parse line: {raw_line}")
+
+    if action is None:
+        raise ValueError(f"Unknown type line: '{raw_line}'")
+
+    return {
+        "action": action,
+        "player_name_1": player,
+        "player_id_1": player_id_1,
+        "player_name_2": player2,
+        "player_id_2": player_id_2,
+        "weapon": weapon,
+        "message": content,
+        "sub_content": sub_content,
+    }
+
+
+def legacy_split_raw_log_lines(raw_logs: list[str]) -> Iterable[tuple[str, str, str]]:
+    """Split raw game server logs into the relative time, timestamp and content"""
+    for raw_log in raw_logs:
+        log = re.match(r"^(\[.+? \((\d+)\)\]) ([\w\W]*)$", raw_log, flags=re.M)
+        if log is None:
+            continue
+
+        (raw_relative_time, raw_timestamp, raw_log_line) = log.groups()
+        yield raw_relative_time, raw_timestamp, raw_log_line.strip()
+
+
+def parse_or_error(parse, raw_line: str):
+    try:
+        return parse(raw_line)
+    except ValueError as e:
+        return ("error", str(e))
+
+
+@pytest.mark.parametrize("raw_line", RAW_LOG_LINES)
+def test_classifier_matches_reference_parser(raw_line):
+    assert parse_or_error(Rcon.parse_log_line, raw_line) == parse_or_error(
+        legacy_parse_log_line, raw_line
+    )
+
+
+def test_corpus_covers_all_native_log_types():
+    actions = set()
+    for raw_line in RAW_LOG_LINES:
+        try:
+            actions.add(Rcon.parse_log_line(raw_line)["action"].split("[")[0])
+        except ValueError:
+            continue
+    assert {
+        "KILL",
+        "TEAM KILL",
+        "CONNECTED",
+        "DISCONNECTED",
+        "CHAT",
+        "TEAMSWITCH",
+        "ADMIN",
+        "ADMIN BANNED",
+        "ADMIN IDLE",
+        "ADMIN PERMA BANNED",
+        "ADMIN ANTI-CHEAT",
+        "ADMIN MISC",
+        "TK AUTO BANNED",
+        "TK AUTO KICKED",
+        "VOTE",
+        "VOTE STARTED",
+        "VOTE COMPLETED",
+        "VOTE EXPIRED",
+        "VOTE PASSED",
+        "CAMERA",
+        "MATCH START",
+        "MATCH ENDED",
+        "MESSAGE",
+    } <= actions
+
+
+def test_classifier_splits_a_whole_log_like_the_reference():
+    raw_logs = [
+        f"[{i % 60}:00 min (16063{i:05d})] {line}"
+        for i, line in enumerate(RAW_LOG_LINES)
+    ]
+
+    def run(split, parse):
+        return [parse_or_error(parse, line) for _, _, line in split(raw_logs)]
+
+    assert run(Rcon.split_raw_log_lines, Rcon.parse_log_line) == run(
+        legacy_split_raw_log_lines, legacy_parse_log_line
+    )
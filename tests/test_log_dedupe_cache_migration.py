@@ -0,0 +1,50 @@
+import time
+from contextlib import nullcontext
+
+import fakeredis
+
+from rcon.cache_migrations.log_dedupe import LEGACY_DEDUPE_KEY, migrate_log_dedupe
+from rcon.logs.dedupe import BUCKET_SEC, DEFAULT_RETENTION_SEC, LogDedupeIndex
+
+
+def _client() -> fakeredis.FakeRedis:
+    client = fakeredis.FakeRedis()
+    client.lock = lambda *args, **kwargs: nullcontext()
+    return client
+
+
+def test_dedupe_index_buckets_expire_after_retention():
+    client = _client()
+    index = LogDedupeIndex(client, retention_sec=600)
+    now_ms = int(time.time() * 1000)
+
+    assert index.add_ids([(now_ms, "a"), (now_ms, "a"), (now_ms - 120_000, "b")]) == [
+        True,
+        False,
+        True,
+    ]
+    assert index.add_ids([(now_ms, "a")]) == [False]
+
+    ttl = client.ttl(index.bucket_key(now_ms))
+    assert 600 <= ttl <= 600 + BUCKET_SEC
+    assert client.ttl(index.bucket_key(now_ms - 120_000)) <= 600 - 60
+    # Lines already past retention still get a short lived bucket
+    assert index.add_ids([(now_ms - 3_600_000, "old")]) == [True]
+    assert client.ttl(index.bucket_key(now_ms - 3_600_000)) == BUCKET_SEC
+
+
+def test_legacy_set_is_moved_into_buckets():
+    client = _client()
+    now_ms = int(time.time() * 1000)
+    recent = f"{now_ms}|KILL: a -> b"
+    expired = f"{now_ms - (DEFAULT_RETENTION_SEC + 60) * 1000}|KILL: c -> d"
+    client.sadd(LEGACY_DEDUPE_KEY, recent, expired, "garbage")
+
+    assert migrate_log_dedupe(client) == 1
+
+    assert not client.exists(LEGACY_DEDUPE_KEY)
+    index = LogDedupeIndex(client)
+    assert client.smembers(index.bucket_key(now_ms)) == {recent.encode()}
+    assert index.add_ids([(now_ms, recent)]) == [False]
+    # Idempotent once the legacy set is gone
+    assert migrate_log_dedupe(client) == 0
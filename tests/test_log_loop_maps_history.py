@@ -2,6 +2,7 @@ import os
 from datetime import timedelta
 from unittest.mock import Mock, patch
 
+import fakeredis
 import pytest
 
 os.environ.setdefault("HLL_MAINTENANCE_CONTAINER", "1")
@@ -9,6 +10,8 @@ os.environ.setdefault("SERVER_NUMBER", "1")
 
 from rcon.logs.loop import LogLoop
 from rcon.maps import GameMode
+from rcon.types import GameEnum
+from rcon.utils import MapsHistory
 
 
 OFFENSIVE_MAP = "carentan_offensive_us"
@@ -144,3 +147,116 @@ def test_offensive_initial_score_cannot_be_recorded_again(
             "ts": 300,
         },
     ]
+
+
+def make_detailed_player(name, *, combat=0, x=0.0, role="rifleman"):
+    return {
+        "name": name,
+        "level": 10,
+        "world_position": {"x": x, "y": 0.0, "z": 0.0},
+        "combat": combat,
+        "offense": 0,
+        "defense": 0,
+        "support": 0,
+        "vehicle_kills": 0,
+        "vehicles_destroyed": 0,
+        "kills": 0,
+        "deaths": 0,
+        "role": role,
+        "team": "allies",
+        "unit_id": 1,
+    }
+
+
+def make_stats_loop():
+    maps_history = object.__new__(MapsHistory)
+    maps_history.red = fakeredis.FakeRedis()
+    maps_history.key = "maps_history"
+    loop = object.__new__(LogLoop)
+    loop.RECORD_PLAYER_STATS_DELAY = 120
+    loop.now = 2_000
+    loop.rcon = Mock()
+    loop.rcon.game_profile.game = GameEnum.HLL_WW2
+
+    def tick(current_map, players, sec_from_start):
+        """Record the stats once, return the ones written"""
+        with patch(
+            "rcon.logs.loop.MapsHistory", return_value=maps_history
+        ), patch.object(
+            maps_history, "save_player_stats", wraps=maps_history.save_player_stats
+        ) as save:
+            loop.record_player_stats(
+                current_map, sec_from_start, {"players": players, "fail_count": 0}
+            )
+        (_, saved), _ = save.call_args
+        return saved
+
+    return maps_history, tick
+
+
+def test_only_the_changed_player_stats_are_written():
+    maps_history, tick = make_stats_loop()
+    current_map = make_map_info()
+    players = {"a": make_detailed_player("a"), "b": make_detailed_player("b")}
+
+    assert set(tick(current_map, players, 0)) == {"a", "b"}
+    # Both joined a unit
+    assert set(tick(current_map, players, 10)) == {"a", "b"}
+    assert tick(current_map, players, 20) == {}
+    players["a"] = make_detailed_player("a", combat=5, x=1.0)
+    assert set(tick(current_map, players, 30)) == {"a"}
+    players["a"] = make_detailed_player("a", combat=5, x=1.0, role="medic")
+    assert set(tick(current_map, players, 40)) == {"a"}
+
+    stats = maps_history.get_player_stats(current_map)
+    assert stats["a"]["combat"] == 5
+    assert [u["ts"] for u in stats["a"]["units"]] == [10, 40]
+    assert [u["ts"] for u in stats["b"]["units"]] == [10]
+    assert (
+        "units" not in maps_history.get_player_stats(current_map, with_units=False)["a"]
+    )
+    assert current_map["player_stats"] == {}
+
+    maps_history.clear_player_stats(current_map)
+    assert not maps_history.red.keys()
+
+
+def test_player_stats_cached_in_the_map_entry_are_moved():
+    maps_history, tick = make_stats_loop()
+    previous_map = make_map_info()
+    previous_map["start"] = 500
+    tick(previous_map, {"a": make_detailed_player("a")}, 0)
+    current_map = make_map_info()
+    current_map["player_stats"] = maps_history.get_player_stats(previous_map)
+    current_map["player_stats"]["a"]["units"] = [
+        {"ts": 0, "team": 1, "squad": 1, "role": 1}
+    ]
+    assert maps_history.get_player_stats(current_map) == current_map["player_stats"]
+
+    assert set(tick(current_map, {"a": make_detailed_player("a")}, 10)) == {"a"}
+
+    assert current_map["player_stats"] == {}
+    (stats,) = maps_history.get_player_stats(current_map).values()
+    assert [u["ts"] for u in stats["units"]] == [0, 10]
+
+
+def test_unchanged_player_stats_of_the_map_entry_are_moved_too():
+    maps_history, tick = make_stats_loop()
+    players = {"a": make_detailed_player("a"), "b": make_detailed_player("b")}
+    previous_map = make_map_info()
+    previous_map["start"] = 500
+    tick(previous_map, players, 0)
+    tick(previous_map, players, 10)
+    current_map = make_map_info()
+    current_map["player_stats"] = maps_history.get_player_stats(previous_map)
+
+    # Only "a" changed since the stats were cached in the map entry
+    players["a"] = make_detailed_player("a", combat=5, x=1.0)
+    assert set(tick(current_map, players, 20)) == {"a", "b"}
+
+    assert current_map["player_stats"] == {}
+    stats = maps_history.get_player_stats(current_map)
+    assert set(stats) == {"a", "b"}
+    assert stats["a"]["combat"] == 5
+    assert [u["ts"] for u in stats["b"]["units"]] == [10]
+    assert tick(current_map, players, 30) == {}
@@ -0,0 +1,137 @@
+import datetime
+import os
+from unittest.mock import Mock, patch
+
+import fakeredis
+
+os.environ.setdefault("HLL_MAINTENANCE_CONTAINER", "1")
+os.environ.setdefault("SERVER_NUMBER", "1")
+
+from rcon.logs.dedupe import LogDedupeIndex
+from rcon.logs.index import LogsHistoryIndex
+from rcon.logs.loop import LogLoop
+from rcon.utils import LogsHistory
+
+MAP = {"name": "carentan_warfare", "start": 1_000, "end": None, "player_stats": {}}
+
+
+def make_log(ts: int, line: str, player_name=None, player_id=None):
+    return {
+        "timestamp_ms": ts * 1000,
+        "event_time": datetime.datetime.fromtimestamp(ts),
+        "line_without_time": line,
+        "action": "KILL",
+        "message": line,
+        "raw": line,
+        "player_name_1": player_name,
+        "player_id_1": player_id,
+        "player_name_2": None,
+        "player_id_2": None,
+    }
+
+
+def make_loop():
+    red = fakeredis.FakeRedis()
+    loop = object.__new__(LogLoop)
+    loop.red = red
+    loop.dedupe = LogDedupeIndex(red)
+    loop.log_history = LogsHistory()
+    loop.log_history.red = red
+    loop.log_index = LogsHistoryIndex(loop.log_history)
+    loop.log_watermark_ms = None
+    loop.last_log_fetch = 0.0
+    return loop
+
+
+@patch("rcon.logs.loop.MapsHistory")
+def test_record_lines_dedupes_and_pushes_in_order(maps_history_cls):
+    loop = make_loop()
+    first = [make_log(2_000, "a"), make_log(2_001, "b")]
+
+    assert loop.record_lines(first) == first
+    # Duplicates from the previous poll and within the batch are skipped
+    second = [make_log(2_001, "b"), make_log(2_002, "c"), make_log(2_002, "c")]
+    assert [l["raw"] for l in loop.record_lines(second)] == ["c"]
+
+    assert [l["raw"] for l in loop.log_history] == ["c", "b", "a"]
+    assert loop.log_history.sequence() == 3
+    assert loop.red.zrange(loop.log_index.action_key("KILL"), 0, -1) == [
+        b"2000000-1",
+        b"2001000-2",
+        b"2002000-3",
+    ]
+    # No player related log, the current map is never read
+    maps_history_cls.return_value.get_current_map.assert_not_called()
+
+
+@patch("rcon.logs.loop.MapsHistory")
+def test_record_lines_ignores_logs_older_than_the_last_cached(maps_history_cls):
+    loop = make_loop()
+    loop.record_lines([make_log(2_005, "new")])
+
+    recorded = loop.record_lines([make_log(2_001, "old"), make_log(2_006, "newer")])
+    assert [l["raw"] for l in recorded] == ["newer"]
+
+
+@patch("rcon.logs.loop.MapsHistory")
+def test_record_lines_reads_current_map_once(maps_history_cls):
+    maps_history_cls.return_value.get_current_map.return_value = MAP
+    loop = make_loop()
+    name_to_id = {"foo": "123"}
+
+    recorded = loop.record_lines(
+        [make_log(2_000 + i, f"l{i}", player_name="foo") for i in range(5)],
+        name_to_id,
+    )
+
+    assert [l["player_id_1"] for l in recorded] == ["123"] * 5
+    maps_history_cls.return_value.get_current_map.assert_called_once()
+
+
+def test_process_logs_runs_hooks_in_log_order_across_batches():
+    loop = make_loop()
+    loop.GET_LOGS_SINCE_MIN = 5
+    loop.LOG_BATCH_SIZE = 2
+    loop.rcon = Mock()
+    loop.rcon.iter_structured_logs.return_value = iter(
+        [make_log(2_000, "a"), make_log(2_001, "b"), make_log(2_002, "c")]
+    )
+    loop.process_hooks = Mock()
+
+    with patch("rcon.logs.loop.MapsHistory") as maps_history_cls:
+        maps_history_cls.return_value.get_current_map.return_value = None
+        loop.process_logs()
+
+    assert [c.args[0]["raw"] for c in loop.process_hooks.call_args_list] == [
+        "a",
+        "b",
+        "c",
+    ]
+    assert [l["raw"] for l in loop.log_history] == ["c", "b", "a"]
+
+
+def test_process_logs_fetches_only_the_delta_after_the_first_poll():
+    loop = make_loop()
+    loop.GET_LOGS_SINCE_MIN = 180
+    loop.rcon = Mock()
+    loop.rcon.iter_structured_logs.return_value = iter(
+        [make_log(2_000, "a"), make_log(2_001, "b")]
+    )
+    loop.rcon.iter_structured_logs_since.return_value = iter([make_log(2_002, "c")])
+    loop.process_hooks = Mock()
+
+    with patch("rcon.logs.loop.MapsHistory") as maps_history_cls:
+        maps_history_cls.return_value.get_current_map.return_value = None
+        loop.process_logs()
+        loop.process_logs()
+
+    loop.rcon.iter_structured_logs.assert_called_once_with(since_min_ago=180)
+    since_ms, window_sec = loop.rcon.iter_structured_logs_since.call_args.args
+    assert since_ms == 2_001_000
+    assert loop.LOG_FETCH_OVERLAP_SEC <= window_sec < loop.LOG_FETCH_OVERLAP_SEC + 5
+    assert loop.log_watermark_ms == 2_002_000
+    assert [c.args[0]["raw"] for c in loop.process_hooks.call_args_list] == [
+        "a",
+        "b",
+        "c",
+    ]
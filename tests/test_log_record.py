@@ -0,0 +1,127 @@
+import datetime
+import sys
+
+import fakeredis
+import orjson
+
+from rcon.logs.record import LogRecord, log_to_dict, serialize_log
+from rcon.rcon import Rcon
+from rcon.utils import LogsHistory, logs_deserializer
+from tests.log_corpus import RAW_LOG_LINES
+
+HISTORY_SIZE = 500
+
+
+def _parses(line: str) -> bool:
+    try:
+        Rcon.parse_log_line(line)
+    except ValueError:
+        return False
+    return True
+
+
+VALID_LOG_LINES = [line for line in RAW_LOG_LINES if _parses(line)]
+
+
+def raw_logs(count: int) -> list[str]:
+    lines = VALID_LOG_LINES * (count // len(VALID_LOG_LINES) + 1)
+    return [
+        f"[{i % 60}:00 min ({1606340000 + i // 10})] {line}"
+        for i, line in enumerate(lines[:count])
+    ]
+
+
+def deep_size(logs) -> int:
+    """Memory used by the logs and their values, each shared object counted once"""
+    seen = set()
+    size = 0
+    for log in logs:
+        size += sys.getsizeof(log)
+        if isinstance(log, LogRecord):
+            values = [getattr(log, slot) for slot in LogRecord.__slots__]
+        else:
+            values = log.values()
+        for value in values:
+            if id(value) not in seen:
+                seen.add(id(value))
+                size += sys.getsizeof(value)
+    return size
+
+
+def test_records_read_like_the_parsed_dicts():
+    raw = raw_logs(len(VALID_LOG_LINES))
+    dicts = Rcon.parse_logs(raw)["logs"]
+    records = list(Rcon.iter_parsed_logs(raw, newest_first=True))
+
+    assert all(isinstance(log, dict) for log in dicts)
+    for record, log in zip(records, dicts, strict=True):
+        # Relative to the time of parsing
+        record["relative_time_ms"] = log["relative_time_ms"]
+        assert record == log
+        assert dict(record) == log
+        assert {k: record[k] for k in log} == log
+        assert record.get("missing") is None
+        assert LogRecord.from_dict(log) == log
+        assert LogRecord.from_compact(orjson.loads(serialize_log(record))) == log
+
+
+def test_record_keeps_values_it_cannot_derive():
+    event_time = datetime.datetime(2020, 1, 1, 10)
+    log = {
+        "timestamp_ms": 1_000,
+        "event_time": event_time,
+        "raw": "something else",
+        "line_without_time": "KILL: a",
+        "action": "KILL",
+    }
+    record = LogRecord.from_dict(log)
+    assert record["raw"] == "something else"
+    assert record["event_time"] == event_time
+
+    loaded = logs_deserializer(serialize_log(record))
+    assert isinstance(loaded, LogRecord)
+    assert loaded["raw"] == "something else"
+    assert loaded["event_time"] == event_time
+
+    record["player_id_1"] = "123"
+    record["line_without_time"] = "KILL: b"
+    assert record["player_id_1"] == "123"
+    assert record["raw"] == "something else"
+
+
+def test_history_stores_records_and_reads_legacy_dicts():
+    history = LogsHistory()
+    history.red = fakeredis.FakeRedis()
+    legacy, new = Rcon.parse_logs(raw_logs(2))["logs"]
+    history.red.xadd(history.key, {"log": orjson.dumps(legacy)}, id="1-1")
+    history.red.set(history.seq_key, 1)
+    history.add(LogRecord.from_dict(new))
+
+    stored, old = history[:]
+    assert isinstance(stored, LogRecord)
+    assert isinstance(old, dict)
+    assert stored == new
+    assert old == legacy
+    assert [log_to_dict(log) for log in (stored, old)] == [new, legacy]
+
+
+def test_records_take_less_memory_and_space_than_dicts():
+    raw = raw_logs(HISTORY_SIZE)
+
+    dicts = Rcon.parse_logs(raw)["logs"]
+    records = list(Rcon.iter_parsed_logs(raw, newest_first=True))
+    serialized_dicts = [orjson.dumps(log) for log in dicts]
+    serialized_records = [serialize_log(log) for log in records]
+
+    def loaded(serialized):
+        logs = [log_to_dict(logs_deserializer(data)) for data in serialized]
+        # Relative to the time of parsing, which differs between the two runs
+        for log in logs:
+            del log["relative_time_ms"]
+        return logs
+
+    assert loaded(serialized_records) == loaded(serialized_dicts)
+    assert deep_size(records) < deep_size(dicts) * 0.7
+    assert sum(len(data) for data in serialized_records) < sum(
+        len(data) for data in serialized_dicts
+    )
@@ -0,0 +1,100 @@
+import asyncio
+import datetime
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+
+os.environ.setdefault("HLL_MAINTENANCE_CONTAINER", "1")
+os.environ.setdefault("SERVER_NUMBER", "1")
+
+from rcon.logs.stream import LogStream, LogStreamFanout
+from rcon.utils import LogsHistory, StreamInvalidID, stream_id_sequence
+
+
+def make_log(ts: int, line: str):
+    return {
+        "timestamp_ms": ts * 1000,
+        "event_time": datetime.datetime.fromtimestamp(ts),
+        "raw": line,
+        "action": "KILL",
+    }
+
+
+def make_stream(maxlen=100):
+    red = fakeredis.FakeRedis()
+    stream = object.__new__(LogStream)
+    stream.log_history = LogsHistory()
+    stream.log_history.red = red
+    stream.maxlen = maxlen
+    return stream
+
+
+def test_stream_reads_the_logs_history():
+    stream = make_stream(maxlen=2)
+    assert stream.logs_since() == []
+
+    stream.log_history.add_many([make_log(1, "a"), make_log(2, "b")])
+    (tail,) = stream.logs_since()
+    assert tail == ("2000-2", {**tail[1], "raw": "b"})
+    # Logs are sent as JSON
+    assert tail[1]["event_time"] == datetime.datetime.fromtimestamp(2).isoformat()
+
+    stream.log_history.add_many([make_log(3, "c"), make_log(4, "d"), make_log(5, "e")])
+    logs = stream.logs_since("2000-2", block_ms=None)
+    assert [(id_, log["raw"]) for id_, log in logs] == [
+        ("3000-3", "c"),
+        ("4000-4", "d"),
+    ]
+    assert [log["raw"] for _, log in stream.logs_since("4000-4", block_ms=None)] == [
+        "e"
+    ]
+    assert stream.logs_since("5000-5", block_ms=1) == []
+
+
+def test_fanout_catches_up_with_a_bounded_number_of_logs():
+    stream = make_stream()
+    stream.log_history.add_many([make_log(ts, str(ts)) for ts in range(1, 6)])
+    fanout = LogStreamFanout(log_stream_fn=lambda: stream)
+
+    logs = asyncio.run(fanout.logs_since("1000-1", 2))
+    assert [id_ for id_, _ in logs] == ["2000-2", "3000-3"]
+
+
+@pytest.mark.parametrize("id_", ["1000", "1000-a", "", None, 1000])
+def test_invalid_stream_ids_are_rejected(id_):
+    with pytest.raises(StreamInvalidID):
+        stream_id_sequence(id_)
+
+
+def test_fanout_shares_one_reader_between_subscribers():
+    stream = make_stream()
+    stream.log_history.add(make_log(1, "a"))
+    fanout = LogStreamFanout(log_stream_fn=lambda: stream, block_ms=10)
+    config = SimpleNamespace(enabled=True)
+
+    async def run():
+        first, second = fanout.subscribe(), fanout.subscribe()
+        assert [id_ for id_, _ in await fanout.logs_since(None)] == ["1000-1"]
+        # Let the reader start after the logs already there
+        await asyncio.sleep(0.05)
+        stream.log_history.add_many([make_log(2, "b"), make_log(3, "c")])
+        batches = [await asyncio.wait_for(q.get(), 1) for q in (first, second)]
+
+        config.enabled = False
+        disabled = [await asyncio.wait_for(q.get(), 1) for q in (first, second)]
+        await asyncio.wait_for(fanout._task, 1)
+        return batches, disabled
+
+    with patch("rcon.logs.stream.LogStreamUserConfig.load_from_db", lambda: config):
+        batches, disabled = asyncio.run(run())
+
+    assert batches[0] is batches[1]
+    assert [(id_, log["raw"]) for id_, log in batches[0]] == [
+        ("2000-2", "b"),
+        ("3000-3", "c"),
+    ]
+    assert disabled == [None, None]
+    assert not fanout._queues
@@ -1091,3 +1091,44 @@ to test something]""",
 )
 def test_player_messages(raw_log_line, expected):
     assert Rcon.parse_log_line(raw_log_line) == expected
+
+
+def test_parse_logs_skips_lines_older_than_since():
+    raw_logs = [
+        "[10:00 min (1606340677)] CONNECTED A (76561198000000001)",
+        "[9:59 min (1606340678)] CONNECTED B (76561198000000002)",
+        "[9:58 min (1606340679)] CONNECTED C (76561198000000003)",
+    ]
+
+    parsed = Rcon.parse_logs(raw_logs, since_ms=1606340678_000)
+
+    assert [log["player_name_1"] for log in parsed["logs"]] == ["C", "B"]
+    assert parsed["players"] and "A" not in parsed["players"]
+
+
+def test_iter_parsed_logs_is_lazy_and_aggregates_on_demand():
+    raw_logs = [
+        "[10:00 min (1606340677)] CONNECTED A (76561198000000001)",
+        "[9:59 min (1606340678)] not a log line",
+        "[9:58 min (1606340679)] KILL: B(Axis/76561198000000002) -> C(Allies/76561198000000003) with MP40",
+    ]
+    players: set[str] = set()
+    actions: set[str] = set()
+
+    logs = Rcon.iter_parsed_logs(raw_logs, players=players, actions=actions)
+    assert next(logs)["player_name_1"] == "A"
+    assert players == {"A"}
+    assert next(logs)["action"] == "KILL"
+    assert players == {"A", "B", "C"} and actions == {"CONNECTED", "KILL"}
+
+    newest_first = Rcon.iter_parsed_logs(raw_logs, newest_first=True)
+    assert [log["action"] for log in newest_first] == ["KILL", "CONNECTED"]
+
+    def without_relative_time(logs):
+        return [
+            {k: v for k, v in log.items() if k != "relative_time_ms"} for log in logs
+        ]
+
+    assert without_relative_time(
+        Rcon.parse_logs(raw_logs)["logs"]
+    ) == without_relative_time(Rcon.iter_parsed_logs(raw_logs, newest_first=True))
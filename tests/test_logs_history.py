@@ -0,0 +1,134 @@
+import os
+from unittest.mock import MagicMock
+
+import fakeredis
+
+os.environ.setdefault("HLL_MAINTENANCE_CONTAINER", "1")
+os.environ.setdefault("SERVER_NUMBER", "1")
+
+from rcon.logs.recorder import RECORDER_GROUP, LogRecorder
+from rcon.utils import LogsHistory
+
+
+def make_history(max_len=100):
+    history = LogsHistory(max_len=max_len)
+    history.red = fakeredis.FakeRedis()
+    return history
+
+
+def log(i: int):
+    return {"timestamp_ms": i * 1000, "raw": f"log {i}"}
+
+
+def empty_db_session():
+    sess = MagicMock()
+    sess.query.return_value.filter.return_value.order_by.return_value.limit.return_value.one_or_none.return_value = (
+        None
+    )
+    return sess
+
+
+def test_logs_get_stable_increasing_ids():
+    history = make_history()
+    assert history.add_many([log(1), log(2)]) == ["1000-1", "2000-2"]
+    # Older or same time logs still get increasing ids
+    assert history.add_many([log(2), log(1)]) == ["2000-3", "2000-4"]
+
+    assert history.sequence() == 4
+    assert history.last_id() == "2000-4"
+    assert len(history) == 4
+    assert [l["raw"] for l in history] == ["log 1", "log 2", "log 2", "log 1"]
+    assert history[0]["raw"] == "log 1"
+    assert history[-1]["raw"] == "log 1"
+    assert [l["raw"] for l in history[1:3]] == ["log 2", "log 2"]
+    assert [l["raw"] for l in history.get_ids(["1000-1", "2000-3", "5-5"])] == [
+        "log 1",
+        "log 2",
+    ]
+    assert [id_ for id_, _ in history.range(since_ms=1500, until_ms=2000)] == [
+        "2000-2",
+        "2000-3",
+        "2000-4",
+    ]
+
+
+def test_read_since_returns_new_logs_oldest_first_in_chunks():
+    history = make_history()
+    for i in range(1, 6):
+        history.add(log(i))
+
+    assert history.read_since("5000-5") == ("5000-5", [])
+
+    cursor, logs = history.read_since("1000-1", count=2)
+    assert cursor == "3000-3"
+    assert [l["raw"] for l in logs] == ["log 2", "log 3"]
+
+    cursor, logs = history.read_since(cursor, count=2)
+    assert cursor == "5000-5"
+    assert [l["raw"] for l in logs] == ["log 4", "log 5"]
+
+
+def test_read_since_detects_trimmed_or_reset_history():
+    history = make_history(max_len=3)
+    for i in range(1, 6):
+        history.red.xadd(
+            history.key,
+            {"log": history.serializer(log(i))},
+            id=f"{i}000-{i}",
+            maxlen=3,
+            approximate=False,
+        )
+
+    # Logs 2 and 3 were trimmed
+    assert history.read_since("1000-1") is None
+    assert [l["raw"] for l in history.read_since("2000-2")[1]] == [
+        "log 3",
+        "log 4",
+        "log 5",
+    ]
+    # Cursor ahead of the history
+    assert history.read_since("9000-10") is None
+
+
+def test_recorder_resyncs_then_reads_from_its_consumer_group():
+    history = make_history()
+    for i in range(1, 4):
+        history.add(log(i))
+    recorder = LogRecorder(log_history_fn=lambda: history, chunk_size=2)
+    sess = empty_db_session()
+
+    # No consumer group yet, the whole history is scanned
+    assert len(recorder._get_new_logs(sess)) == 3
+    assert not history.red.xinfo_groups(history.key)
+    recorder._acknowledge()
+    assert history.red.xinfo_groups(history.key)[0]["last-delivered-id"] == b"3000-3"
+
+    for i in range(4, 7):
+        history.add(log(i))
+    sess.reset_mock()
+
+    logs = recorder._get_new_logs(sess)
+    assert [l["raw"] for l in logs] == ["log 4", "log 5"]
+    assert recorder._has_more
+    recorder._acknowledge()
+
+    logs = recorder._get_new_logs(sess)
+    assert [l["raw"] for l in logs] == ["log 6"]
+    assert not recorder._has_more
+    recorder._acknowledge()
+    assert history.red.xpending(history.key, RECORDER_GROUP)["pending"] == 0
+    # Reading from the consumer group never queries the database
+    sess.query.assert_not_called()
+
+
+def test_recorder_reads_unacknowledged_logs_again():
+    history = make_history()
+    history.ensure_group(RECORDER_GROUP, "0")
+    history.add(log(1))
+    recorder = LogRecorder(log_history_fn=lambda: history)
+
+    assert len(recorder._get_new_logs(empty_db_session())) == 1
+    # The save failed, the same logs are read again
+    assert len(recorder._get_new_logs(empty_db_session())) == 1
+    recorder._acknowledge()
+    assert recorder._get_new_logs(empty_db_session()) == []
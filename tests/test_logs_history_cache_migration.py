@@ -0,0 +1,62 @@
+from contextlib import nullcontext
+
+import fakeredis
+import orjson
+
+from rcon.cache_migrations.logs_history import (
+    LEGACY_LOG_STREAM_KEY,
+    LEGACY_RECORDER_CURSOR_KEY,
+    LOGS_HISTORY_KEY,
+    LOGS_HISTORY_SEQ_KEY,
+    RECORDER_GROUP,
+    migrate_logs_history,
+)
+
+
+def _client() -> fakeredis.FakeRedis:
+    client = fakeredis.FakeRedis()
+    client.lock = lambda *args, **kwargs: nullcontext()
+    return client
+
+
+def test_list_is_moved_into_a_stream_keeping_sequence_numbers():
+    client = _client()
+    dict_log = orjson.dumps({"timestamp_ms": 1000, "raw": "a"})
+    record_log = orjson.dumps([1, 3000, None, "", "b", "KILL"])
+    out_of_order_log = orjson.dumps({"timestamp_ms": 2000, "raw": "c"})
+    client.lpush(LOGS_HISTORY_KEY, dict_log, record_log, out_of_order_log)
+    client.set(LOGS_HISTORY_SEQ_KEY, 12)
+    client.set(LEGACY_RECORDER_CURSOR_KEY, 11)
+    client.xadd(LEGACY_LOG_STREAM_KEY, {"a": "b"})
+    client.zadd(f"{LOGS_HISTORY_KEY}:idx:action:KILL", {"12": 12})
+
+    assert migrate_logs_history(client) == 3
+
+    assert client.type(LOGS_HISTORY_KEY) == b"stream"
+    assert client.xrange(LOGS_HISTORY_KEY) == [
+        (b"1000-10", {b"log": dict_log}),
+        (b"3000-11", {b"log": record_log}),
+        (b"3000-12", {b"log": out_of_order_log}),
+    ]
+    assert int(client.get(LOGS_HISTORY_SEQ_KEY)) == 12
+    (group,) = client.xinfo_groups(LOGS_HISTORY_KEY)
+    assert group["name"] == RECORDER_GROUP.encode()
+    assert group["last-delivered-id"] == b"3000-11"
+    assert not client.exists(
+        LEGACY_RECORDER_CURSOR_KEY,
+        LEGACY_LOG_STREAM_KEY,
+        f"{LOGS_HISTORY_KEY}:idx:action:KILL",
+    )
+    # Idempotent once the list is gone
+    assert migrate_logs_history(client) == 0
+
+
+def test_logs_cached_before_the_sequence_number_are_numbered():
+    client = _client()
+    client.rpush(LOGS_HISTORY_KEY, orjson.dumps({"timestamp_ms": 2000}), b"garbage")
+
+    assert migrate_logs_history(client) == 2
+
+    assert [id_ for id_, _ in client.xrange(LOGS_HISTORY_KEY)] == [b"0-1", b"2000-2"]
+    assert int(client.get(LOGS_HISTORY_SEQ_KEY)) == 2
+    assert not client.xinfo_groups(LOGS_HISTORY_KEY)
@@ -0,0 +1,72 @@
+import os
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+os.environ.setdefault("HLL_MAINTENANCE_CONTAINER", "1")
+os.environ.setdefault("SERVER_NUMBER", "1")
+
+from rcon.rcon import Rcon
+
+
+def make_rcon():
+    rcon = object.__new__(Rcon)
+    rcon.pool_size = 4
+    rcon.perf_stats = Mock()
+    return rcon
+
+
+def test_fetch_concurrently_runs_sources_in_parallel():
+    rcon = make_rcon()
+    # Only passed once all three sources run at the same time
+    barrier = threading.Barrier(3, timeout=5)
+
+    def concurrent(value):
+        barrier.wait()
+        return value
+
+    result = rcon.fetch_concurrently(
+        {
+            "first": lambda: concurrent(1),
+            "second": lambda: concurrent(2),
+            "third": lambda: concurrent(3),
+        }
+    )
+
+    assert result == {"first": 1, "second": 2, "third": 3}
+    metrics = [c.args[0] for c in rcon.perf_stats.increment.call_args_list]
+    assert sorted(metrics) == sorted(
+        f"fetch_{name}_{kind}"
+        for name in ("first", "second", "third")
+        for kind in ("ms", "count")
+    )
+    rcon.thread_pool.shutdown()
+
+
+def test_fetch_concurrently_runs_inline_on_pool_threads():
+    rcon = make_rcon()
+    rcon.pool_size = 1
+
+    def nested():
+        return rcon.fetch_concurrently(
+            {"thread": lambda: threading.current_thread().name}
+        )
+
+    # With a single worker this would deadlock if the nested fetch was queued
+    result = rcon.thread_pool.submit(nested).result(timeout=5)
+
+    assert result["thread"].startswith("rcon-pool")
+    rcon.thread_pool.shutdown()
+
+
+def test_fetch_concurrently_propagates_errors():
+    rcon = make_rcon()
+
+    def broken():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        rcon.fetch_concurrently({"ok": lambda: 1, "broken": broken})
+    rcon.perf_stats.increment.assert_any_call("fetch_broken_count")
+    rcon.thread_pool.shutdown()
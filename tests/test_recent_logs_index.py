@@ -0,0 +1,173 @@
+import os
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+
+os.environ.setdefault("HLL_MAINTENANCE_CONTAINER", "1")
+os.environ.setdefault("SERVER_NUMBER", "1")
+
+from rcon import game_logs
+from rcon.logs.index import LogsHistoryIndex
+from rcon.utils import LogsHistory, batched
+from tests.log_corpus import START_TS, parsed_logs
+
+
+def make_history(logs, max_len=100_000, batch_size=37):
+    history = LogsHistory(max_len=max_len)
+    history.red = fakeredis.FakeRedis()
+    index = LogsHistoryIndex(history)
+    for batch in batched(logs, batch_size):
+        ids = history.add_many(list(batch))
+        index.add_logs(zip(ids, batch))
+    return history, index
+
+
+def query(history, **kwargs):
+    with patch.object(game_logs.LogLoop, "get_log_history_list", return_value=history):
+        return game_logs.get_recent_logs(**kwargs)
+
+
+def scan(history, **kwargs):
+    # Same as `query` with a history that is not indexed
+    history.red.delete(f"{history.key}:idx:from")
+    try:
+        return query(history, **kwargs)
+    finally:
+        history.red.set(f"{history.key}:idx:from", 1)
+
+
+@pytest.fixture(scope="module")
+def history():
+    history, _ = make_history(parsed_logs(2_000))
+    return history
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"end": 50},
+        {"start": 30, "end": 200},
+        {"player_search": "Loch"},
+        {"player_search": ["loch", "dandy"]},
+        {"player_search": "Loch", "exact_player_match": True},
+        {"player_search": "loch", "exact_player_match": True},
+        {"action_filter": ["KILL"]},
+        {"action_filter": ["KILL"], "exact_action": True},
+        {"action_filter": ["chat", "VOTE"], "inclusive_filter": False},
+        {"player_search": "Reduktorius", "action_filter": ["TEAM KILL"]},
+        {
+            "player_search": "Reduktorius",
+            "action_filter": ["KILL"],
+            "exact_action": True,
+        },
+        {
+            "player_search": "Reduktorius",
+            "action_filter": ["KILL"],
+            "inclusive_filter": False,
+        },
+        {"player_search": "Loch", "start": 10, "end": 300},
+        {"min_timestamp": START_TS + 120.5},
+        {"min_timestamp": START_TS + 120.5, "action_filter": ["CHAT"]},
+        {"min_timestamp": START_TS + 10_000},
+    ],
+)
+def test_indexed_query_returns_what_a_full_scan_returns(history, kwargs):
+    indexed = query(history, **kwargs)
+    scanned = scan(history, **kwargs)
+
+    assert [dict(log) for log in indexed["logs"]] == [
+        dict(log) for log in scanned["logs"]
+    ]
+    assert indexed["actions"] == scanned["actions"]
+    if not kwargs.get("start"):
+        assert sorted(indexed["players"]) == sorted(scanned["players"])
+
+
+def test_index_follows_the_trimmed_history():
+    logs = parsed_logs(500)
+    history, index = make_history(logs, max_len=100)
+
+    result = query(
+        history, player_search="Loch", action_filter=["KILL"], exact_action=True
+    )
+    assert result["logs"]
+    assert all(
+        log["timestamp_ms"] >= logs[-100]["timestamp_ms"] for log in result["logs"]
+    )
+    assert (
+        result["logs"]
+        == scan(
+            history, player_search="Loch", action_filter=["KILL"], exact_action=True
+        )["logs"]
+    )
+    # Postings and names of trimmed logs are dropped as new logs come in
+    assert (
+        min(
+            score
+            for _, score in history.red.zrange(
+                index.action_key("KILL"), 0, -1, withscores=True
+            )
+        )
+        > 400
+    )
+    assert (
+        min(
+            score
+            for _, score in history.red.zrange(
+                index.players_key, 0, -1, withscores=True
+            )
+        )
+        > 400
+    )
+
+
+def test_rebuild_indexes_logs_cached_before_the_index():
+    logs = parsed_logs(300)
+    history, index = make_history(logs)
+    expected = query(history, player_search="dandy", action_filter=["CONNECTED"])
+
+    index.clear()
+    assert not index.covers(1)
+    index.rebuild()
+
+    assert index.covers(1)
+    assert (
+        query(history, player_search="dandy", action_filter=["CONNECTED"]) == expected
+    )
+
+
+def test_names_leaving_the_history_drop_their_postings():
+    logs = parsed_logs(300)
+    history, index = make_history(logs, max_len=100)
+    assert history.red.exists(index.player_key("Loch"))
+
+    # Only one player chatting from now on
+    chat = next(log for log in logs if log["action"].startswith("CHAT"))
+    more = [chat] * 150
+    index.add_logs(zip(history.add_many(more), more))
+
+    assert not history.red.exists(index.player_key("Loch"))
+    assert not history.red.exists(index.action_key("KILL"))
+    assert "Loch" not in index.players_since(1)
+    assert query(history, player_search="Loch")["logs"] == []
+
+
+def test_missing_postings_fall_back_to_a_scan():
+    history, index = make_history(parsed_logs(300))
+    kwargs = {"player_search": "Loch", "action_filter": ["KILL"]}
+    expected = query(history, **kwargs)["logs"]
+    assert expected
+
+    # e.g. evicted by Redis
+    history.red.delete(index.player_key("Loch"))
+    assert index.ids_for_players(["Loch"], 1, 300) is None
+    assert query(history, **kwargs)["logs"] == expected
+
+    history.red.delete(index.action_key("KILL"))
+    assert query(history, **kwargs)["logs"] == expected
+    assert (
+        query(history, action_filter=["KILL"])["logs"]
+        == scan(history, action_filter=["KILL"])["logs"]
+    )
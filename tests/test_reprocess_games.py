@@ -0,0 +1,57 @@
+import os
+from contextlib import nullcontext
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+os.environ.setdefault("HLL_MAINTENANCE_CONTAINER", "1")
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+
+from rcon import workers
+
+
+def test_reprocess_maps_commits_each_map_and_counts_failures(monkeypatch):
+    maps = [SimpleNamespace(id=i) for i in range(1, 5)]
+    sess = MagicMock()
+    sess.query.return_value.filter.return_value.order_by.return_value.all.return_value = (
+        maps
+    )
+    monkeypatch.setattr(workers, "enter_session", lambda: nullcontext(sess))
+
+    def record_stats(sess, map_, map_info, force=False):
+        if map_.id == 2:
+            raise IntegrityError("insert", {}, Exception("duplicate"))
+        if map_.id == 3:
+            raise Exception("match logs are not yet available")
+        return 10 * map_.id
+
+    monkeypatch.setattr(workers, "record_stats_from_map", record_stats)
+
+    assert workers.reprocess_maps([1, 2, 3, 4]) == (2, 50, 2)
+    assert sess.commit.call_count == 2
+    assert sess.rollback.call_count == 2
+
+
+def test_player_stats_are_upserted_in_one_statement():
+    sess = MagicMock()
+    sess.get_bind.return_value.dialect.name = "postgresql"
+    sess.execute.return_value.rowcount = 2
+    rows = [
+        {"player_id_id": player_id_id, "map_id": 7, "name": "a", "kills": 3}
+        for player_id_id in (1, 2)
+    ]
+
+    assert workers._save_player_stats(sess, rows, {}, force=True) == 2
+
+    (statement,), _ = sess.execute.call_args
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert sql.count("INSERT INTO player_stats") == 1
+    assert "ON CONFLICT ON CONSTRAINT unique_map_player DO UPDATE" in sql
+    assert "kills = excluded.kills" in sql
+    assert "map_id = excluded.map_id" not in sql
+
+    workers._save_player_stats(sess, rows, {}, force=False)
+    (statement,), _ = sess.execute.call_args
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT ON CONSTRAINT unique_map_player DO NOTHING" in sql
@@ -0,0 +1,51 @@
+import os
+from datetime import timedelta
+from unittest.mock import Mock
+
+import fakeredis
+
+os.environ.setdefault("HLL_MAINTENANCE_CONTAINER", "1")
+os.environ.setdefault("SERVER_NUMBER", "1")
+
+from rcon.snapshot import SnapshotProducer, get_snapshot
+
+GAMESTATE = {"allied_score": 2, "axis_score": 3, "time_remaining": timedelta(minutes=5)}
+PLAYERS = {"players": {"1": {"name": "a", "team": "allies"}}, "fail_count": 0}
+
+
+def make_producer(red):
+    rcon = Mock()
+    rcon.fetch_concurrently.side_effect = lambda sources: {
+        name: source() for name, source in sources.items()
+    }
+    rcon.get_gamestate.return_value = GAMESTATE
+    rcon.get_detailed_players.return_value = PLAYERS
+    rcon.build_team_view.side_effect = lambda dp: {"allies": list(dp["players"])}
+    return SnapshotProducer(rcon=rcon, red=red, interval=0.01)
+
+
+def test_published_snapshots_are_versioned():
+    red = fakeredis.FakeRedis()
+    producer = make_producer(red)
+
+    assert get_snapshot(red) is None
+    assert producer.publish(producer.take()) == 1
+    assert producer.publish(producer.take()) == 2
+
+    snapshot = get_snapshot(red)
+    assert snapshot["version"] == 2
+    assert snapshot["gamestate"] == GAMESTATE
+    assert snapshot["players"] == PLAYERS
+    assert snapshot["team_view"] == {"allies": ["1"]}
+    producer.rcon.build_team_view.assert_called_with(PLAYERS)
+
+
+def test_stale_snapshots_are_ignored_with_max_age():
+    red = fakeredis.FakeRedis()
+    producer = make_producer(red)
+    snapshot = producer.take()
+    snapshot["timestamp"] -= 60
+    producer.publish(snapshot)
+
+    assert get_snapshot(red)["version"] == 1
+    assert get_snapshot(red, max_age=10) is None
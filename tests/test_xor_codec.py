@@ -0,0 +1,65 @@
+import array
+import os
+import random
+
+import pytest
+
+os.environ.setdefault("HLL_MAINTENANCE_CONTAINER", "1")
+
+from rcon.connection import HLLConnection, xor_bytes, xor_overwrite
+
+
+def reference_xor(msg, key) -> bytes:
+    """The original byte by byte implementation of HLLConnection._xor"""
+    n = []
+    for i in range(len(msg)):
+        n.append(msg[i] ^ key[i % len(key)])
+
+    return array.array("B", n).tobytes()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_xor_matches_reference_implementation(seed):
+    rng = random.Random(seed)
+    key = rng.randbytes(rng.randint(1, 64))
+    data = rng.randbytes(
+        rng.choice([1, 7, len(key), len(key) + 1, rng.randint(0, 100_000)])
+    )
+
+    assert xor_bytes(data, key) == reference_xor(data, key)
+
+    buffer = bytearray(data)
+    xor_overwrite(buffer, key)
+    assert buffer == reference_xor(data, key)
+
+    buffer = bytearray(data)
+    xor_overwrite(memoryview(buffer), key)
+    assert buffer == reference_xor(data, key)
+
+
+def test_xor_edge_cases():
+    assert xor_bytes(b"", b"key") == b""
+    assert xor_bytes(b"payload", b"") == b"payload"
+    # Leading zero bytes must survive the integer round trip
+    assert xor_bytes(b"\x00\x00\x01", b"\x00") == b"\x00\x00\x01"
+    assert xor_bytes(xor_bytes(b"roundtrip", b"k3y"), b"k3y") == b"roundtrip"
+
+
+def test_connection_uses_codec():
+    conn = HLLConnection()
+    assert conn._xor(b"plain") == b"plain"
+
+    conn.xorkey = b"\x01\x02"
+    assert conn._xor(b"\x00\x00\x00") == b"\x01\x02\x01"
+    buffer = bytearray(b"\x00\x00\x00")
+    conn._xor_overwrite(buffer)
+    assert buffer == b"\x01\x02\x01"
+    conn.close()
+
+
+def test_xor_matches_reference_on_a_log_sized_response():
+    rng = random.Random(0)
+    key = rng.randbytes(32)
+    data = rng.randbytes(256 * 1024)
+
+    assert xor_bytes(data, key) == reference_xor(data, key)